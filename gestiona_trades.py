@@ -3,6 +3,8 @@ gestiona_trades.py — Punto de entrada principal del sistema de trading.
 
 Uso:
     python gestiona_trades.py [--config config.yaml]
+    python gestiona_trades.py --config config.yaml --dedupe-events
+    python gestiona_trades.py --config config.yaml --archive
 
 Secuencia de arranque:
     1. Cargar config.yaml, inicializar logging
@@ -10,7 +12,7 @@ Secuencia de arranque:
     3. Conectar a Binance REST, verificar credenciales y balance
     4. Configurar leverage y margin type (isolated) para los pares activos
     5. Cargar trades activos de la DB
-    6. Inicializar TradeEngine y WSManager
+    6. Inicializar TradeEngine, WSManager y el WS de mercado
     7. Reconciliar trades activos con el estado real en Binance
     8. Iniciar WebSocket User Data Stream
     9. Iniciar TradeEngine (timeout checker y reconcile checker)
@@ -23,7 +25,7 @@ Graceful shutdown:
     - Detener Dashboard
     - Detener TradeEngine (cancela timeout checker; los trades OPEN siguen
       vigentes en Binance con sus TP/SL)
-    - Detener WSManager
+    - Detener WSManager y el WS de mercado
     - Cerrar OrderManager (sesión HTTP)
     - Cerrar DB
     - Log SHUTDOWN
@@ -47,16 +49,22 @@ import yaml
 from src.config        import Config
 from src.dashboard     import DashboardServer
 from src.logger        import get_logger, setup_logging
+from src.market_stream import MarketStreamManager
 from src.models        import Event, EventType, Trade, TradeStatus
 from src.notifier      import NOTIFIER_VERSION, Notifier
 from src.order_manager import BinanceError, OrderManager
 from src.paper_trade_engine import PAPER_TRADE_ENGINE_VERSION, PaperTradeEngine
+from src.rate_limiter  import Priority, background_requests
 from src.signal_watcher import SignalWatcher
 from src.state         import StateDB
 from src.trade_engine  import TradeEngine
 from src.ws_manager    import WSManager
 
-APP_VERSION = "1.01"
+APP_VERSION = "1.08"
+# Antigüedad tolerada de las posiciones para dashboard/avisos de huérfanas:
+# con el User Data Stream conectado la foto la mantienen los ACCOUNT_UPDATE
+_ORPHAN_POSITIONS_MAX_AGE_S = 15.0
+_ORPHAN_POSITIONS_LIVE_MAX_AGE_S = 900.0
 
 log = get_logger("main")
 
@@ -70,6 +78,7 @@ class App:
         self._db:      StateDB        = None  # type: ignore
         self._om:      OrderManager   = None  # type: ignore
         self._ws_mgr:  WSManager      = None  # type: ignore
+        self._market_ws: MarketStreamManager | None = None
         self._engine:  TradeEngine    = None  # type: ignore
         self._paper_engine: PaperTradeEngine = None  # type: ignore
         self._watcher: SignalWatcher  = None  # type: ignore
@@ -82,6 +91,7 @@ class App:
         self._notify_task: asyncio.Task | None = None
         self._ws_disconnected_since: datetime | None = None
         self._ws_disconnect_alert_sent = False
+        self._circuit_alert_sent = False
         self._orphans_alert_active = False
         self._last_orphan_alert_at: datetime | None = None
         self._last_summary_at: datetime | None = None
@@ -179,8 +189,15 @@ class App:
                 ]
                 await asyncio.gather(*tasks)
 
-            # 6. Iniciar WSManager
+            # 6. Iniciar WSManager y el WS de mercado (precios de los pares activos)
             await self._ws_mgr.start()
+            if self._cfg.market_stream_enabled:
+                self._market_ws = MarketStreamManager(
+                    cfg              = self._cfg,
+                    prices           = self._om.prices,
+                    symbols_provider = self._active_pairs,
+                )
+                await self._market_ws.start()
 
             # 7. Iniciar TradeEngine (timeout checker y reconciliador)
             await self._engine.start()
@@ -287,11 +304,21 @@ class App:
     # on_signal: configurar par y delegar al engine
     # ──────────────────────────────────────────────────────────────────
 
+    def _active_pairs(self) -> set[str]:
+        """Pares con trades reales o paper vivos (para el WS de mercado)."""
+        trades = self._engine.get_active_trades() if self._engine else []
+        if self._paper_engine:
+            trades = trades + self._paper_engine.get_active_trades()
+        return {t.pair for t in trades if t.pair}
+
     async def _on_signal(self, signal):
         if self._paper_finish_in_progress:
             log.info(f"Senal ignorada para {signal.pair}: fin_paper_trading en curso")
             return
 
+        if self._market_ws and (self._cfg.paper_trading or not self._cfg.real_trading_solo_cerrando):
+            self._market_ws.watch(signal.pair)
+
         if self._cfg.paper_trading:
             await self._paper_engine.on_signal(signal)
             return
@@ -313,6 +340,7 @@ class App:
     # ──────────────────────────────────────────────────────────────────
 
     async def _on_event(self, event: Event):
+        """Único punto de persistencia de eventos y de fan-out a dashboard/notifier."""
         try:
             await self._db.save_event(event)
         except Exception as e:
@@ -380,23 +408,17 @@ class App:
             log.warning(f"No se pudieron cargar trades activos para unrealized PnL: {exc}")
             return 0.0, 0.0
 
+        pairs = {t.pair for t in real_trades + paper_trades if t.pair}
+        if not pairs:
+            return 0.0, 0.0
+
         try:
-            items = await self._om._get("/fapi/v1/premiumIndex")
+            with background_requests(Priority.BEST_EFFORT):
+                mark_prices = await self._om.get_mark_prices(pairs)
         except Exception as exc:
             log.warning(f"No se pudieron cargar mark prices para unrealized PnL: {exc}")
             return 0.0, 0.0
 
-        mark_prices: dict[str, float] = {}
-        if isinstance(items, list):
-            for item in items:
-                symbol = str(item.get("symbol") or "").strip()
-                if not symbol:
-                    continue
-                try:
-                    mark_prices[symbol] = float(item.get("markPrice", 0) or 0)
-                except (TypeError, ValueError):
-                    continue
-
         def _sum_unrealized(trades: list[Trade]) -> float:
             total = 0.0
             for trade in trades:
@@ -494,6 +516,23 @@ class App:
                 await self._safe_notify("WS Binance desconectado", lines)
                 self._ws_disconnect_alert_sent = True
 
+        circuits = status.get("circuit_breakers") or {}
+        degraded = {name: c for name, c in circuits.items() if c.get("state") != "closed"}
+        if degraded:
+            if self._cfg.notify_circuit_breaker and not self._circuit_alert_sent:
+                lines = [
+                    f"{name}: {c.get('state')} ({c.get('last_error') or 'sin detalle'})"
+                    for name, c in degraded.items()
+                ]
+                lines.append("solo salen órdenes protectoras (SL/TP, cancelaciones, cierres)")
+                lines.extend(await self._build_status_lines(status))
+                await self._safe_notify("Binance REST degradado", lines)
+                self._circuit_alert_sent = True
+        elif self._circuit_alert_sent:
+            if self._cfg.notify_circuit_breaker:
+                await self._safe_notify("Binance REST recuperado", await self._build_status_lines(status))
+            self._circuit_alert_sent = False
+
         orphan_count = int(status.get("orphan_count", 0) or 0)
         if orphan_count <= 0:
             if self._orphans_alert_active and self._cfg.notify_orphans:
@@ -544,7 +583,15 @@ class App:
         }
 
         try:
-            all_positions = await self._om.get_all_positions()
+            # LOW y no BEST_EFFORT: un descarte se leería como "sin huérfanas"
+            with background_requests():
+                all_positions = await self._om.get_all_positions(
+                    max_age_s=(
+                        _ORPHAN_POSITIONS_LIVE_MAX_AGE_S
+                        if self._om.account.live
+                        else _ORPHAN_POSITIONS_MAX_AGE_S
+                    )
+                )
         except Exception as e:
             log.warning(f"No se pudieron obtener posiciones Binance para dashboard: {e}")
             return []
@@ -588,7 +635,8 @@ class App:
 
         if self._om:
             try:
-                balance_usdt = await self._om.get_balance()
+                with background_requests(Priority.BEST_EFFORT):
+                    balance_usdt = await self._om.get_balance()
             except Exception as e:
                 log.warning(f"No se pudo obtener balance para dashboard: {e}")
 
@@ -668,6 +716,12 @@ class App:
             "quantitative_rules_violation_is_locked": quantitative_rules_guard.get("is_locked", False),
             "quantitative_rules_violation_planned_recover_time": quantitative_rules_guard.get("planned_recover_time"),
             "quantitative_rules_violation_indicators": quantitative_rules_guard.get("indicators", []),
+            "rate_limit":       self._om.governor.snapshot() if self._om else None,
+            "http_latency":     self._om.http_metrics() if self._om else None,
+            "binance_time_offset_ms": round(self._om.time_offset_ms) if self._om else None,
+            "account_snapshot": self._om.account.snapshot() if self._om else None,
+            "circuit_breakers": self._om.circuits.snapshot() if self._om else None,
+            "market_stream":    self._market_ws.snapshot() if self._market_ws else None,
         }
 
     async def _finish_paper_trading(self) -> dict:
@@ -869,6 +923,7 @@ class App:
             )
             try:
                 await self._db.save_event(ev)
+                await self._db.flush()
             except Exception:
                 pass
 
@@ -913,6 +968,8 @@ class App:
                 await asyncio.wait_for(self._ws_mgr.stop(), timeout=5.0)
             except asyncio.TimeoutError:
                 log.warning("WSManager.stop() excedió 5s de timeout, continuando apagado.")
+        if self._market_ws:
+            await self._market_ws.stop()
 
         # 5. OrderManager (cierra sesión HTTP)
         if self._om:
@@ -940,9 +997,44 @@ def _parse_args() -> argparse.Namespace:
         default="config.yaml",
         help="Ruta al archivo de configuración (default: config.yaml)",
     )
+    p.add_argument(
+        "--dedupe-events",
+        action="store_true",
+        help="Elimina eventos duplicados de la DB, compacta el fichero y sale "
+             "(ejecutar con el bot parado)",
+    )
+    p.add_argument(
+        "--archive",
+        action="store_true",
+        help="Archiva ya los trades cerrados antiguos (database.archive_after_days), "
+             "compacta la DB y sale (ejecutar con el bot parado)",
+    )
     return p.parse_args()
 
 
+async def _dedupe_events(cfg: Config) -> None:
+    db = StateDB(cfg)
+    await db.init()
+    try:
+        removed = await db.collapse_duplicate_events()
+        log.info(f"Limpieza de eventos completada: {removed} duplicados eliminados")
+    finally:
+        await db.close()
+
+
+async def _archive_now(cfg: Config) -> None:
+    db = StateDB(cfg)
+    await db.init()
+    try:
+        if not db.archive_enabled:
+            log.warning("Archivado desactivado: configura database.archive_after_days > 0")
+            return
+        moved = await db.archive_closed_trades(vacuum=True)
+        log.info(f"Archivado completado: {moved}")
+    finally:
+        await db.close()
+
+
 async def _main():
     args = _parse_args()
 
@@ -950,6 +1042,13 @@ async def _main():
     cfg = Config(args.config)
     setup_logging(cfg)
 
+    if args.dedupe_events:
+        await _dedupe_events(cfg)
+        return
+    if args.archive:
+        await _archive_now(cfg)
+        return
+
     app = App(cfg)
 
     # Capturar señales del SO para shutdown graceful
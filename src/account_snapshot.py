@@ -0,0 +1,298 @@
+"""
+account_snapshot.py - Espejo local de posiciones y órdenes abiertas.
+
+positionRisk, openOrders y openAlgoOrders sin símbolo son las consultas más
+pesadas que hace el bot, y varias rutas las pedían por su cuenta
+(reconciliación, chequeo de recuento, dashboard, capacidad de SL). Aquí se
+guarda la última respuesta de cada una con su versión y hora, y cada
+consumidor indica cuánta antigüedad tolera (max_age_s). Las descargas
+simultáneas se agrupan en una sola.
+
+Con el User Data Stream conectado (live) la foto es un espejo vivo:
+
+  ORDER_TRADE_UPDATE  añade o actualiza la orden (NEW, PARTIALLY_FILLED) y la
+                      quita al terminar (FILLED, CANCELED...).
+  ALGO_UPDATE         lo mismo para las órdenes algo.
+  ACCOUNT_UPDATE      actualiza o añade las posiciones y quita las que quedan
+                      a 0.
+  REST propio         las órdenes que coloca o cancela el bot se aplican con
+                      la respuesta de Binance, sin esperar al evento.
+
+Los cambios que llegan mientras hay una descarga en curso se vuelven a
+aplicar sobre su resultado, y los ids ya terminados se recuerdan para que un
+evento o respuesta atrasados no resuciten una orden. Sin WS, cada orden del
+bot invalida la foto entera y la siguiente lectura vuelve a descargar.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .logger import get_logger
+
+log = get_logger("account_snapshot")
+ACCOUNT_SNAPSHOT_VERSION = "0.02"
+
+POSITIONS = "positions"
+OPEN_ORDERS = "open_orders"
+ALGO_ORDERS = "algo_orders"
+
+_TERMINAL_ORDER_STATUSES = {"FILLED", "CANCELED", "EXPIRED", "EXPIRED_IN_MATCH", "REJECTED"}
+_TERMINAL_ALGO_STATUSES = {"CANCELED", "TRIGGERED", "FINISHED", "EXPIRED", "REJECTED"}
+_ID_KEYS = {OPEN_ORDERS: "orderId", ALGO_ORDERS: "algoId"}
+_GONE_KEPT = 2000
+
+Change = Callable[[List[dict]], List[dict]]
+
+
+class _Entry:
+    __slots__ = ("data", "fetched_at", "version", "invalidations",
+                 "inflight", "inflight_invalidations", "buffers", "gone")
+
+    def __init__(self):
+        self.data: Optional[List[dict]] = None
+        self.fetched_at = 0.0          # monotonic; 0 = inválida
+        self.version = 0
+        self.invalidations = 0
+        self.inflight: Optional[asyncio.Task] = None
+        self.inflight_invalidations = 0
+        self.buffers: List[List[Change]] = []   # cambios durante cada descarga en curso
+        self.gone: Dict[int, None] = {}         # ids terminados recientes (orden de llegada)
+
+
+class AccountSnapshot:
+    def __init__(self, fetchers: Dict[str, Callable[[], Awaitable[List[dict]]]]):
+        self._fetchers = fetchers
+        self._entries: Dict[str, _Entry] = {kind: _Entry() for kind in fetchers}
+        self.live = False              # lo activa WSManager mientras está conectado
+        self.hits = 0
+        self.fetches = 0
+
+    # ──────────────────────────────────────────────────────────────────
+    # Lectura
+    # ──────────────────────────────────────────────────────────────────
+
+    async def get(self, kind: str, max_age_s: float = 0.0) -> List[dict]:
+        """
+        Lista de kind con antigüedad <= max_age_s. Con 0 siempre descarga (o
+        se une a una descarga en curso si nada la ha invalidado desde que
+        empezó). Devuelve una copia superficial.
+        """
+        entry = self._entries[kind]
+        if (max_age_s > 0 and entry.data is not None and entry.fetched_at
+                and time.monotonic() - entry.fetched_at <= max_age_s):
+            self.hits += 1
+            return list(entry.data)
+        if (entry.inflight is None or entry.inflight.done()
+                or entry.inflight_invalidations != entry.invalidations):
+            # El buffer se registra ya: los cambios que lleguen antes de que
+            # arranque la tarea también se aplican sobre su resultado
+            buffer: List[Change] = []
+            entry.buffers.append(buffer)
+            entry.inflight = asyncio.create_task(
+                self._fetch(kind, entry.invalidations, buffer)
+            )
+            entry.inflight.add_done_callback(lambda _: entry.buffers.remove(buffer))
+            entry.inflight_invalidations = entry.invalidations
+        return list(await asyncio.shield(entry.inflight))
+
+    async def _fetch(self, kind: str, invalidations: int, buffer: List[Change]) -> List[dict]:
+        entry = self._entries[kind]
+        started = time.monotonic()
+        data = list(await self._fetchers[kind]())
+        self.fetches += 1
+        for change in buffer:
+            data = change(data)
+        entry.data = data
+        # Invalidada durante la descarga: se sirve, pero no se da por fresca
+        entry.fetched_at = started if entry.invalidations == invalidations else 0.0
+        entry.version += 1
+        return entry.data
+
+    def age_s(self, kind: str) -> Optional[float]:
+        entry = self._entries[kind]
+        if entry.data is None or not entry.fetched_at:
+            return None
+        return time.monotonic() - entry.fetched_at
+
+    # ──────────────────────────────────────────────────────────────────
+    # Cambios
+    # ──────────────────────────────────────────────────────────────────
+
+    def invalidate(self, *kinds: str):
+        for kind in kinds or tuple(self._entries):
+            entry = self._entries[kind]
+            entry.fetched_at = 0.0
+            entry.version += 1
+            entry.invalidations += 1
+
+    def apply_ws_event(self, msg: dict):
+        """Aplica un evento del User Data Stream (ver docstring del módulo)."""
+        event_type = msg.get("e")
+        if event_type == "ORDER_TRADE_UPDATE":
+            order = msg.get("o") or {}
+            self._apply_order(OPEN_ORDERS, _order_from_ws(order), order.get("X"))
+        elif event_type == "ALGO_UPDATE":
+            order = msg.get("o") or {}
+            self._apply_order(ALGO_ORDERS, _algo_from_ws(order), order.get("X"))
+        elif event_type == "ACCOUNT_UPDATE":
+            self._apply_account_update(msg.get("a") or {})
+
+    def apply_rest_order(self, kind: str, order: dict, removed: bool = False):
+        """
+        Respuesta de Binance a una orden colocada o cancelada por el bot. Sin
+        WS no se puede seguir lo que pasa después: invalida la foto entera.
+        """
+        if not self.live:
+            self.invalidate()
+            return
+        status = order.get("status") or order.get("algoStatus")
+        if kind == ALGO_ORDERS and "algoId" in order and "orderId" not in order:
+            order = dict(order, orderId=order["algoId"])
+        self._apply_order(kind, order, "CANCELED" if removed else status)
+
+    def _apply_order(self, kind: str, order: dict, status: Optional[str]):
+        key = _ID_KEYS[kind]
+        target = _as_int(order.get(key))
+        if not target:
+            self.invalidate(kind)
+            return
+        entry = self._entries[kind]
+        terminal = _TERMINAL_ALGO_STATUSES if kind == ALGO_ORDERS else _TERMINAL_ORDER_STATUSES
+        if status in terminal:
+            entry.gone[target] = None
+            while len(entry.gone) > _GONE_KEPT:
+                del entry.gone[next(iter(entry.gone))]
+            self._change(kind, _remover(key, target))
+        elif target not in entry.gone:
+            self._change(kind, _upserter(key, target, order))
+
+    def _apply_account_update(self, account: dict):
+        for update in account.get("P") or []:
+            if update.get("ps", "BOTH") != "BOTH":
+                continue
+            symbol = update.get("s")
+            amount = _as_float(update.get("pa"))
+            if not symbol or amount is None:
+                continue
+            self._change(POSITIONS, _position_updater(symbol, amount, update))
+
+    def _change(self, kind: str, change: Change):
+        entry = self._entries[kind]
+        for buffer in entry.buffers:
+            buffer.append(change)
+        if entry.data is None:
+            return
+        updated = change(entry.data)
+        if updated is not entry.data:
+            entry.data = updated
+            entry.version += 1
+
+    def snapshot(self) -> dict:
+        out = {"live": self.live, "hits": self.hits, "fetches": self.fetches}
+        for kind, entry in self._entries.items():
+            age = self.age_s(kind)
+            out[kind] = {
+                "count": len(entry.data) if entry.data is not None else None,
+                "age_s": round(age, 1) if age is not None else None,
+                "version": entry.version,
+            }
+        return out
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Cambios sobre las listas (devuelven la misma lista si no cambia nada)
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _remover(key: str, target: int) -> Change:
+    def change(data: List[dict]) -> List[dict]:
+        remaining = [o for o in data if _as_int(o.get(key)) != target]
+        return remaining if len(remaining) != len(data) else data
+    return change
+
+
+def _upserter(key: str, target: int, order: dict) -> Change:
+    def change(data: List[dict]) -> List[dict]:
+        out, merged = [], None
+        for o in data:
+            if _as_int(o.get(key)) == target:
+                merged = {**o, **{k: v for k, v in order.items() if v is not None}}
+                out.append(merged)
+            else:
+                out.append(o)
+        if merged is None:
+            out.append({k: v for k, v in order.items() if v is not None})
+        return out
+    return change
+
+
+def _position_updater(symbol: str, amount: float, update: dict) -> Change:
+    def change(data: List[dict]) -> List[dict]:
+        current = next(
+            (p for p in data
+             if p.get("symbol") == symbol and p.get("positionSide", "BOTH") == "BOTH"),
+            None,
+        )
+        if amount == 0:
+            return [p for p in data if p is not current] if current is not None else data
+        updated = dict(current or {"symbol": symbol, "positionSide": "BOTH"})
+        updated["positionAmt"] = update.get("pa")
+        for ws_key, key in (("ep", "entryPrice"), ("bep", "breakEvenPrice"),
+                            ("up", "unRealizedProfit"), ("iw", "isolatedWallet"),
+                            ("mt", "marginType")):
+            if ws_key in update:
+                updated[key] = update[ws_key]
+        mark = _as_float(updated.get("markPrice"))
+        if not mark:
+            # Posición nueva: ACCOUNT_UPDATE no trae mark price; sale del PnL
+            entry_price = _as_float(update.get("ep")) or 0.0
+            pnl = _as_float(update.get("up")) or 0.0
+            mark = entry_price + pnl / amount if entry_price else 0.0
+            updated["markPrice"] = str(mark)
+        if mark:
+            updated["notional"] = str(amount * mark)
+        if current is None:
+            return data + [updated]
+        return [updated if p is current else p for p in data]
+    return change
+
+
+def _order_from_ws(o: dict) -> dict:
+    """Payload "o" de ORDER_TRADE_UPDATE con los nombres de openOrders."""
+    return {
+        "orderId": _as_int(o.get("i")), "symbol": o.get("s"), "status": o.get("X"),
+        "clientOrderId": o.get("c"), "price": o.get("p"), "avgPrice": o.get("ap"),
+        "origQty": o.get("q"), "executedQty": o.get("z"), "timeInForce": o.get("f"),
+        "type": o.get("o"), "origType": o.get("ot"), "side": o.get("S"),
+        "positionSide": o.get("ps"), "reduceOnly": o.get("R"),
+        "closePosition": o.get("cp"), "stopPrice": o.get("sp"),
+        "workingType": o.get("wt"), "priceMatch": o.get("pm"), "updateTime": o.get("T"),
+    }
+
+
+def _algo_from_ws(o: dict) -> dict:
+    """Payload "o" de ALGO_UPDATE con los nombres de openAlgoOrders."""
+    algo_id = _as_int(o.get("aid"))
+    return {
+        "algoId": algo_id, "orderId": algo_id, "clientAlgoId": o.get("caid"),
+        "algoType": o.get("at"), "orderType": o.get("o"), "symbol": o.get("s"),
+        "side": o.get("S"), "positionSide": o.get("ps"), "timeInForce": o.get("f"),
+        "quantity": o.get("q"), "algoStatus": o.get("X"), "triggerPrice": o.get("tp"),
+        "price": o.get("p"), "workingType": o.get("wt"), "priceMatch": o.get("pm"),
+        "closePosition": o.get("cp"), "reduceOnly": o.get("R"),
+    }
+
+
+def _as_int(value: Any) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _as_float(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,96 @@
+"""
+archive.py - Nivel frio de persistencia (archivo mensual).
+
+StateDB mueve aqui los trades terminales antiguos y sus eventos. Cada mes es
+un fichero SQLite independiente (<archive_dir>/archive_YYYY-MM.db) con el
+mismo esquema que la DB principal, de modo que la DB caliente se mantiene
+pequena y cada mes archivado se puede copiar, comprimir o borrar por separado.
+
+Las conexiones se abren bajo demanda y se reutilizan hasta close().
+"""
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import aiosqlite
+
+from .logger import get_logger
+
+log = get_logger("archive")
+ARCHIVE_VERSION = "0.01"
+
+_FILE_PREFIX = "archive_"
+_MONTH_RE = re.compile(r"^archive_(\d{4}-\d{2})\.db$")
+
+
+class TradeArchive:
+    def __init__(self,
+                 archive_dir: str,
+                 schema: Sequence[str],
+                 columns: Dict[str, List[Tuple[str, str]]] | None = None):
+        self._dir = Path(archive_dir)
+        self._schema = list(schema)
+        # Columnas añadidas por migraciones de la DB caliente: se crean si faltan
+        self._columns = dict(columns or {})
+        self._conns: Dict[str, aiosqlite.Connection] = {}
+
+    def months(self) -> List[str]:
+        """Meses archivados en disco (YYYY-MM), ordenados."""
+        if not self._dir.is_dir():
+            return []
+        months = []
+        for path in self._dir.iterdir():
+            match = _MONTH_RE.match(path.name)
+            if match:
+                months.append(match.group(1))
+        return sorted(months)
+
+    def path_for(self, month: str) -> Path:
+        return self._dir / f"{_FILE_PREFIX}{month}.db"
+
+    async def write(self, month: str, statements: Iterable[Tuple[str, list]]):
+        """Ejecuta (sql, filas) con executemany y confirma en una transaccion."""
+        conn = await self._conn(month)
+        try:
+            for sql, rows in statements:
+                if rows:
+                    await conn.executemany(sql, rows)
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            raise
+
+    async def fetch(self, month: str, sql: str, params: Sequence = ()) -> list:
+        conn = await self._conn(month)
+        async with conn.execute(sql, params) as cur:
+            return await cur.fetchall()
+
+    async def close(self):
+        for conn in self._conns.values():
+            try:
+                await conn.close()
+            except Exception as e:
+                log.debug(f"Error cerrando archivo: {e}")
+        self._conns = {}
+
+    async def _conn(self, month: str) -> aiosqlite.Connection:
+        conn = self._conns.get(month)
+        if conn is not None:
+            return conn
+        self._dir.mkdir(parents=True, exist_ok=True)
+        conn = await aiosqlite.connect(self.path_for(month))
+        conn.row_factory = aiosqlite.Row
+        await conn.execute("PRAGMA journal_mode=WAL")
+        for stmt in self._schema:
+            await conn.execute(stmt)
+        for table, columns in self._columns.items():
+            async with conn.execute(f"PRAGMA table_info({table})") as cur:
+                existing = {row[1] for row in await cur.fetchall()}
+            for name, decl in columns:
+                if name not in existing:
+                    await conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+        await conn.commit()
+        self._conns[month] = conn
+        return conn
@@ -0,0 +1,169 @@
+"""
+circuit_breaker.py - Cortacircuitos por clase de endpoint para la API REST.
+
+Cuando Binance está degradado (timeouts, 5xx), cada llamador reintentaba por
+su cuenta con esperas crecientes y las tareas se apilaban. Con un
+cortacircuitos por clase de endpoint:
+
+  closed     normal; cuenta fallos consecutivos.
+  open       tras failure_threshold fallos seguidos. Las peticiones no
+             protectoras fallan al momento con CircuitOpen durante open_s.
+  half_open  pasado open_s, deja pasar una sola petición de prueba; si va
+             bien se cierra, si falla vuelve a open.
+
+Las órdenes protectoras (SL/TP, cancelaciones, cierres reduceOnly) nunca se
+cortan: son el carril reservado mientras dura la incidencia. Su resultado
+sí cuenta para abrir o cerrar el circuito.
+
+Solo cuentan como fallo los errores de red, timeouts y HTTP 5xx; un rechazo
+de negocio de Binance (-2011, filtros...) demuestra que la API responde.
+"""
+from __future__ import annotations
+
+import time
+from collections import deque
+from typing import Deque, Dict, Mapping, Optional
+
+from .logger import get_logger
+
+log = get_logger("circuit_breaker")
+CIRCUIT_BREAKER_VERSION = "0.01"
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_ORDER_PATHS = {
+    "/fapi/v1/order",
+    "/fapi/v1/algoOrder",
+    "/fapi/v1/batchOrders",
+    "/fapi/v1/allOpenOrders",
+}
+_MARKET_PATHS = {
+    "/fapi/v1/ticker/bookTicker",
+    "/fapi/v1/premiumIndex",
+    "/fapi/v1/klines",
+    "/fapi/v1/exchangeInfo",
+    "/fapi/v1/ping",
+    "/fapi/v1/time",
+}
+_TRANSITIONS_KEPT = 20
+
+
+class CircuitOpen(Exception):
+    """Petición descartada sin enviarla: el circuito de su endpoint está abierto."""
+
+
+def endpoint_class(method: str, path: str) -> str:
+    """orders (colocar/cancelar), market (datos públicos) o account (el resto)."""
+    if method != "GET" and path in _ORDER_PATHS:
+        return "orders"
+    if path in _MARKET_PATHS:
+        return "market"
+    return "account"
+
+
+def is_protective(method: str, path: str, params: Optional[Mapping] = None) -> bool:
+    """Órdenes que reducen riesgo: cancelaciones, TP/SL algo y cierres reduceOnly."""
+    if path not in _ORDER_PATHS:
+        return False
+    if method == "DELETE":
+        return True
+    if method != "POST":
+        return False
+    if path == "/fapi/v1/algoOrder":
+        return True
+    params = params or {}
+    return (str(params.get("reduceOnly", "")).lower() == "true"
+            or str(params.get("closePosition", "")).lower() == "true")
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 5, open_s: float = 30.0):
+        self.name = name
+        self._threshold = max(1, failure_threshold)
+        self._open_s = open_s
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.last_error = ""
+        self.transitions: Deque[dict] = deque(maxlen=_TRANSITIONS_KEPT)
+
+    def allow(self, protective: bool = False) -> bool:
+        """True si la petición puede salir. En half_open reserva la prueba."""
+        if protective or self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self._open_s:
+                return False
+            self._set_state(HALF_OPEN)
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def record_success(self):
+        self._probe_in_flight = False
+        self._failures = 0
+        if self.state != CLOSED:
+            self._set_state(CLOSED)
+
+    def record_failure(self, error: str):
+        self._probe_in_flight = False
+        self._failures += 1
+        self.last_error = error[:200]
+        if self.state == HALF_OPEN or (self.state == CLOSED and self._failures >= self._threshold):
+            self._opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    def release_probe(self):
+        """La prueba terminó sin resultado útil (p.ej. cancelada)."""
+        self._probe_in_flight = False
+
+    @property
+    def retry_in_s(self) -> float:
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self._open_s - (time.monotonic() - self._opened_at))
+
+    def _set_state(self, state: str):
+        previous, self.state = self.state, state
+        self.transitions.append({"at": time.time(), "from": previous, "to": state})
+        if state == OPEN:
+            log.error(
+                f"Circuito REST '{self.name}' ABIERTO tras {self._failures} fallo(s): "
+                f"{self.last_error} → solo órdenes protectoras durante {self._open_s:.0f}s"
+            )
+        elif state == CLOSED:
+            log.warning(f"Circuito REST '{self.name}' cerrado: Binance responde de nuevo")
+        else:
+            log.info(f"Circuito REST '{self.name}' semiabierto: enviando petición de prueba")
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self._failures,
+            "retry_in_s": round(self.retry_in_s, 1),
+            "last_error": self.last_error,
+            "last_change": self.transitions[-1]["at"] if self.transitions else None,
+        }
+
+
+class CircuitBreakers:
+    """Un CircuitBreaker por clase de endpoint."""
+
+    def __init__(self, failure_threshold: int = 5, open_s: float = 30.0):
+        self._breakers: Dict[str, CircuitBreaker] = {
+            name: CircuitBreaker(name, failure_threshold, open_s)
+            for name in ("orders", "account", "market")
+        }
+
+    def for_request(self, method: str, path: str) -> CircuitBreaker:
+        return self._breakers[endpoint_class(method, path)]
+
+    def any_open(self) -> bool:
+        return any(b.state != CLOSED for b in self._breakers.values())
+
+    def snapshot(self) -> Dict[str, dict]:
+        return {name: b.snapshot() for name, b in self._breakers.items()}
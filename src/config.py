@@ -228,11 +228,91 @@ class Config:
 
     @property
     def ws_base_url(self) -> str:
+        configured = self._get("binance", "ws_base_url", default="")
+        if configured:
+            return str(configured).rstrip("/")
         # wss://fstream.binance.com para producción
         if "fapi.binance.com" in self.base_url:
             return "wss://fstream.binance.com"
         return "wss://stream.binancefuture.com"   # testnet
 
+    @property
+    def exchange_info_path(self) -> str:
+        configured = self._get("binance", "exchange_info_path", default="")
+        if configured:
+            return str(configured)
+
+        db_path = Path(self.db_path)
+        if db_path.suffix:
+            return str(db_path.with_suffix(".exchange_info.json"))
+        return str(db_path.parent / f"{db_path.name}.exchange_info.json")
+
+    @property
+    def exchange_info_refresh_minutes(self) -> float:
+        return max(1.0, float(self._get("binance", "exchange_info_refresh_minutes", default=60)))
+
+    @property
+    def market_data_ttl_ms(self) -> float:
+        return max(0.0, float(self._get("binance", "market_data_ttl_ms", default=200)))
+
+    @property
+    def market_stream_enabled(self) -> bool:
+        return self._as_bool(self._get("binance", "market_stream", "enabled", default=True), default=True)
+
+    @property
+    def market_stream_max_age_ms(self) -> float:
+        return max(0.0, float(self._get("binance", "market_stream", "max_age_ms", default=3000)))
+
+    @property
+    def recv_window_ms(self) -> int:
+        return min(60000, max(0, int(self._get("binance", "recv_window_ms", default=5000))))
+
+    @property
+    def time_sync_minutes(self) -> float:
+        return max(1.0, float(self._get("binance", "time_sync_minutes", default=10)))
+
+    # Conexiones HTTP con Binance
+    @property
+    def http_pool_size(self) -> int: return max(1, int(self._get("binance", "http", "pool_size", default=50)))
+    @property
+    def http_pool_size_per_host(self) -> int: return max(0, int(self._get("binance", "http", "pool_size_per_host", default=20)))
+    @property
+    def http_keepalive_s(self) -> float: return max(1.0, float(self._get("binance", "http", "keepalive_s", default=60)))
+    @property
+    def http_dns_cache_ttl_s(self) -> int: return max(0, int(self._get("binance", "http", "dns_cache_ttl_s", default=300)))
+    @property
+    def http_tcp_nodelay(self) -> bool:
+        return self._as_bool(self._get("binance", "http", "tcp_nodelay", default=True), default=True)
+    @property
+    def http_prewarm_connections(self) -> int: return max(0, int(self._get("binance", "http", "prewarm_connections", default=4)))
+    @property
+    def http_request_timeout_s(self) -> float:
+        return max(1.0, float(self._get("binance", "http", "request_timeout_s", default=10)))
+    @property
+    def http_hedged_reads(self) -> bool:
+        return self._as_bool(self._get("binance", "http", "hedged_reads", default=False), default=False)
+    @property
+    def http_hedge_min_ms(self) -> float: return max(1.0, float(self._get("binance", "http", "hedge_min_ms", default=25)))
+    @property
+    def http_hedge_max_ms(self) -> float:
+        return max(self.http_hedge_min_ms, float(self._get("binance", "http", "hedge_max_ms", default=300)))
+
+    # Cortacircuitos REST por clase de endpoint
+    @property
+    def circuit_failure_threshold(self) -> int:
+        return max(1, int(self._get("binance", "circuit_breaker", "failure_threshold", default=5)))
+    @property
+    def circuit_open_s(self) -> float:
+        return max(1.0, float(self._get("binance", "circuit_breaker", "open_s", default=30)))
+
+    # Límites de Binance que aplica el gobernador de peticiones
+    @property
+    def rate_limit_weight_1m(self) -> int: return int(self._get("binance", "rate_limit", "weight_1m", default=2400))
+    @property
+    def rate_limit_orders_10s(self) -> int: return int(self._get("binance", "rate_limit", "orders_10s", default=300))
+    @property
+    def rate_limit_orders_1m(self) -> int: return int(self._get("binance", "rate_limit", "orders_1m", default=1200))
+
     # ──────────────────────────────────────────────────────────────────────
     # Strategy
     # ──────────────────────────────────────────────────────────────────────
@@ -595,6 +675,13 @@ class Config:
             default=True,
         )
 
+    @property
+    def notify_circuit_breaker(self) -> bool:
+        return self._as_bool(
+            self._get("notifications", "rules", "notify_circuit_breaker", default=True),
+            default=True,
+        )
+
     @property
     def notify_summary(self) -> bool:
         return self._as_bool(
@@ -664,6 +751,18 @@ class Config:
 
     @property
     def db_path(self) -> str: return self._get("database", "path", default="data/trades.db")
+    @property
+    def db_write_batch_ms(self) -> float: return float(self._get("database", "write_batch_ms", default=50))
+    @property
+    def db_write_batch_max(self) -> int: return int(self._get("database", "write_batch_max", default=200))
+    @property
+    def db_read_connections(self) -> int: return max(0, int(self._get("database", "read_connections", default=2)))
+    @property
+    def db_archive_after_days(self) -> int: return max(0, int(self._get("database", "archive_after_days", default=0)))
+    @property
+    def db_archive_dir(self) -> str: return str(self._get("database", "archive_dir", default="data/archive"))
+    @property
+    def db_archive_interval_hours(self) -> float: return max(0.1, float(self._get("database", "archive_interval_hours", default=6)))
 
     # ──────────────────────────────────────────────────────────────────────
     # Public config dict (sin keys)
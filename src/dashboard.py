@@ -8,6 +8,8 @@ Endpoints REST:
   GET  /api/events?limit=N  → últimos N eventos
   GET  /api/config          → config activa (sin API keys)
   POST /api/trades/{id}/close → cierre manual de emergencia
+  GET  /api/history_data    → histórico en NDJSON paginado por cursor
+                               (?source=real|paper|both&pair=&from=&to=&cursor=&limit=)
 
 WebSocket:
   ws://host:port/ws  → push de eventos en tiempo real
@@ -35,6 +37,8 @@ from .state import StateDB
 log = get_logger("dashboard")
 
 _STATIC_DIR = Path(__file__).parent.parent / "static"
+_HISTORY_DB_PAGE = 500
+_HISTORY_SOURCES = ("real", "paper", "both")
 
 
 def _trade_to_dict(t: Trade) -> dict:
@@ -74,6 +78,19 @@ def _event_to_dict(ev: Event) -> dict:
     }
 
 
+def _encode_history_cursor(key: tuple) -> str:
+    return f"{key[0]}|{key[1]}"
+
+
+def _decode_history_cursor(raw: str | None) -> tuple | None:
+    if not raw:
+        return None
+    created_at, sep, trade_id = raw.partition("|")
+    if not sep or not created_at or not trade_id:
+        raise ValueError(f"cursor inválido: {raw}")
+    return (created_at, trade_id)
+
+
 class DashboardServer:
     def __init__(self,
                  cfg:         Config,
@@ -228,14 +245,59 @@ class DashboardServer:
             return web.FileResponse(html_path)
         return web.Response(text="Dashboard histórico no encontrado", status=404)
 
-    async def _handle_history_data(self, request: web.Request) -> web.Response:
+    async def _handle_history_data(self, request: web.Request) -> web.StreamResponse:
+        """
+        Histórico en NDJSON (un trade por línea), leído de la DB por páginas
+        sin materializarlo entero. Con ?limit=N, si quedan más trades la última
+        línea es {"next_cursor": "..."} para pedir la siguiente página.
+        """
+        query = request.rel_url.query
+        source = query.get("source", "both")
+        pair = (query.get("pair") or "").strip().upper() or None
+        date_from = query.get("from") or None
+        date_to = query.get("to") or None
+        try:
+            if source not in _HISTORY_SOURCES:
+                raise ValueError(f"source inválido: {source}")
+            for day in (date_from, date_to):
+                if day:
+                    datetime.strptime(day, "%Y-%m-%d")
+            after = _decode_history_cursor(query.get("cursor"))
+            limit = max(0, int(query.get("limit", 0)))
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+
+        resp = web.StreamResponse(headers={"Content-Type": "application/x-ndjson; charset=utf-8"})
+        await resp.prepare(request)
+        sent = 0
         try:
-            # Utilizamos todo el repositorio para calcular trades concurrentes
-            trades = await self._db.get_all_history_trades()
-            return web.json_response([_trade_to_dict(t) for t in trades])
+            while True:
+                page_size = _HISTORY_DB_PAGE if not limit else min(_HISTORY_DB_PAGE, limit - sent)
+                trades = await self._db.get_history_page(
+                    source=source,
+                    pair=pair,
+                    date_from=date_from,
+                    date_to=date_to,
+                    after=after,
+                    limit=page_size,
+                )
+                if trades:
+                    await resp.write("".join(
+                        json.dumps(_trade_to_dict(t)) + "\n" for t in trades
+                    ).encode("utf-8"))
+                    sent += len(trades)
+                    after = (trades[-1].created_at, trades[-1].trade_id)
+                if len(trades) < page_size:
+                    break
+                if limit and sent >= limit:
+                    cursor = _encode_history_cursor(after)
+                    await resp.write((json.dumps({"next_cursor": cursor}) + "\n").encode("utf-8"))
+                    break
         except Exception as e:
             log.error(f"Error exportando historia: {e}", exc_info=True)
-            return web.json_response({"error": str(e)}, status=500)
+            await resp.write((json.dumps({"error": str(e)}) + "\n").encode("utf-8"))
+        await resp.write_eof()
+        return resp
 
     async def _handle_ws(self, request: web.Request) -> web.WebSocketResponse:
         ws = web.WebSocketResponse(heartbeat=30)
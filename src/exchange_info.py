@@ -0,0 +1,199 @@
+"""
+exchange_info.py - Registro de filtros por símbolo de Binance Futures.
+
+/fapi/v1/exchangeInfo devuelve todos los símbolos (~1 MB). Este registro lo
+descarga una sola vez, se queda con los filtros que usa el bot (tickSize,
+stepSize, minQty, minNotional) para TODOS los símbolos y lo guarda en disco,
+de modo que un reinicio arranca con la tabla cargada sin esperar a la red.
+
+Se refresca:
+  - periódicamente en segundo plano (refresh_interval_s),
+  - bajo demanda cuando Binance rechaza una orden por un filtro
+    (request_refresh(), con un intervalo mínimo para no martillear),
+  - al pedir un símbolo desconocido (p.ej. un listado nuevo).
+
+Las descargas concurrentes se agrupan en una sola petición.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+
+from .logger import get_logger
+
+log = get_logger("exchange_info")
+EXCHANGE_INFO_VERSION = "0.01"
+
+# Intervalo mínimo entre refrescos forzados por errores de filtro
+_MIN_FORCED_REFRESH_S = 60.0
+# Reintento del bucle si la descarga falla
+_RETRY_AFTER_ERROR_S = 60.0
+_FORMAT_VERSION = 1
+
+
+def parse_symbol_filters(symbol_data: dict) -> dict:
+    """Extrae tickSize, stepSize, minQty y minNotional de un símbolo de exchangeInfo."""
+    filters = {f["filterType"]: f for f in symbol_data.get("filters", [])}
+    return {
+        "tick_size":    float(filters.get("PRICE_FILTER", {}).get("tickSize",    "0.0001")),
+        "step_size":    float(filters.get("LOT_SIZE",     {}).get("stepSize",    "0.001")),
+        "min_qty":      float(filters.get("LOT_SIZE",     {}).get("minQty",      "0.001")),
+        "min_notional": float(filters.get("MIN_NOTIONAL", {}).get("notional",    "5")),
+    }
+
+
+class ExchangeInfoRegistry:
+    def __init__(self,
+                 path: str,
+                 fetch: Callable[[], Awaitable[dict]],
+                 refresh_interval_s: float = 3600.0):
+        self._path = Path(path) if path else None
+        self._fetch = fetch
+        self._refresh_interval_s = refresh_interval_s
+        self._symbols: Dict[str, dict] = {}
+        self._updated_at = 0.0                       # epoch de la última descarga
+        self._inflight: Optional[asyncio.Task] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self._last_forced = 0.0
+
+    # ──────────────────────────────────────────────────────────────────
+    # Consulta
+    # ──────────────────────────────────────────────────────────────────
+
+    def get(self, symbol: str) -> Optional[dict]:
+        return self._symbols.get(symbol)
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+    @property
+    def age_s(self) -> float:
+        return time.time() - self._updated_at if self._updated_at else float("inf")
+
+    # ──────────────────────────────────────────────────────────────────
+    # Ciclo de vida
+    # ──────────────────────────────────────────────────────────────────
+
+    async def start(self):
+        """Carga la copia en disco y descarga si no hay o está caducada."""
+        self._load_from_disk()
+        if not self._symbols:
+            try:
+                await self.refresh()
+            except Exception as e:
+                # Sin tabla: get_exchange_info() lo reintentará bajo demanda
+                log.warning(f"ExchangeInfo: descarga inicial fallida: {e}")
+        elif self.age_s >= self._refresh_interval_s:
+            self._wake.set()
+        self._loop_task = asyncio.create_task(self._refresh_loop(), name="exchange_info_refresh")
+
+    async def stop(self):
+        for task in (self._loop_task, self._inflight):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._loop_task = None
+        self._inflight = None
+
+    # ──────────────────────────────────────────────────────────────────
+    # Refresco
+    # ──────────────────────────────────────────────────────────────────
+
+    async def refresh(self):
+        """Descarga exchangeInfo completo. Las llamadas concurrentes comparten la descarga."""
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.create_task(self._do_refresh())
+        await asyncio.shield(self._inflight)
+
+    def request_refresh(self, reason: str = ""):
+        """Pide un refresco en segundo plano (p.ej. orden rechazada por un filtro)."""
+        now = time.monotonic()
+        if now - self._last_forced < _MIN_FORCED_REFRESH_S:
+            return
+        self._last_forced = now
+        log.info(f"ExchangeInfo: refresco solicitado{f' ({reason})' if reason else ''}")
+        self._wake.set()
+
+    async def _do_refresh(self):
+        t0 = time.time()
+        data = await self._fetch()
+        symbols = {
+            s["symbol"]: parse_symbol_filters(s)
+            for s in data.get("symbols", [])
+            if s.get("symbol")
+        }
+        if not symbols:
+            raise ValueError("exchangeInfo sin símbolos")
+        changed = sum(1 for sym, info in symbols.items() if self._symbols.get(sym) != info)
+        self._symbols = symbols
+        self._updated_at = time.time()
+        log.info(
+            f"ExchangeInfo: {len(symbols)} símbolos ({changed} nuevos/cambiados) "
+            f"en {round((time.time() - t0) * 1000)}ms"
+        )
+        await asyncio.get_running_loop().run_in_executor(None, self._save_to_disk)
+
+    async def _refresh_loop(self):
+        while True:
+            timeout = max(0.0, self._refresh_interval_s - self.age_s)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning(f"ExchangeInfo: refresco fallido: {e}")
+                await asyncio.sleep(_RETRY_AFTER_ERROR_S)
+
+    # ──────────────────────────────────────────────────────────────────
+    # Persistencia
+    # ──────────────────────────────────────────────────────────────────
+
+    def _load_from_disk(self):
+        if self._path is None or not self._path.exists():
+            return
+        try:
+            payload = json.loads(self._path.read_text(encoding="utf-8"))
+            if payload.get("version") != _FORMAT_VERSION:
+                return
+            self._symbols = dict(payload.get("symbols") or {})
+            self._updated_at = float(payload.get("updated_at") or 0.0)
+        except Exception as exc:
+            log.warning(f"No se pudo cargar exchangeInfo de {self._path}: {exc}")
+            self._symbols = {}
+            self._updated_at = 0.0
+            return
+        log.info(
+            f"ExchangeInfo: {len(self._symbols)} símbolos cargados de {self._path} "
+            f"(antigüedad {self.age_s / 60:.0f} min)"
+        )
+
+    def _save_to_disk(self):
+        if self._path is None:
+            return
+        try:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._path.with_suffix(f"{self._path.suffix}.tmp")
+            tmp_path.write_text(
+                json.dumps(
+                    {"version": _FORMAT_VERSION,
+                     "updated_at": self._updated_at,
+                     "symbols": self._symbols},
+                    separators=(",", ":"),
+                ),
+                encoding="utf-8",
+            )
+            tmp_path.replace(self._path)
+        except Exception as exc:
+            log.warning(f"No se pudo guardar exchangeInfo en {self._path}: {exc}")
@@ -0,0 +1,117 @@
+"""
+http_metrics.py - Histogramas de latencia de las peticiones REST a Binance.
+
+Cada endpoint ("METHOD /path") acumula sus latencias en cubetas de límites
+fijos (ms), de modo que registrar es O(1) y la memoria no crece con el
+tiempo. Los percentiles p50/p95/p99 se interpolan dentro de la cubeta, lo
+cual es suficiente para ver dónde se van los milisegundos.
+
+También cuenta errores (HTTP >= 400 o excepción de red), reintentos y
+peticiones duplicadas (hedge) junto con cuántas de ellas ganaron.
+"""
+from __future__ import annotations
+
+import bisect
+from typing import Dict, List, Optional
+
+HTTP_METRICS_VERSION = "0.02"
+
+# Límites superiores de cada cubeta en ms; la última es abierta
+_BUCKETS_MS: List[float] = [
+    1, 2, 3, 5, 7, 10, 15, 20, 30, 40, 50, 75, 100, 150, 200, 300,
+    500, 750, 1000, 1500, 2000, 3000, 5000, 10000,
+]
+
+
+class _EndpointStats:
+    __slots__ = ("counts", "total", "sum_ms", "max_ms", "errors", "retries",
+                 "hedges", "hedge_wins")
+
+    def __init__(self):
+        self.counts = [0] * (len(_BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+        self.errors = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(_BUCKETS_MS, ms)] += 1
+        self.total += 1
+        self.sum_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, q: float) -> float:
+        if not self.total:
+            return 0.0
+        rank = q * self.total
+        seen = 0
+        for idx, count in enumerate(self.counts):
+            if not count:
+                continue
+            if seen + count >= rank:
+                lower = _BUCKETS_MS[idx - 1] if idx > 0 else 0.0
+                upper = _BUCKETS_MS[idx] if idx < len(_BUCKETS_MS) else self.max_ms
+                upper = min(upper, self.max_ms)
+                frac = (rank - seen) / count
+                return lower + (max(upper, lower) - lower) * frac
+            seen += count
+        return self.max_ms
+
+
+class HttpMetrics:
+    def __init__(self):
+        self._stats: Dict[str, _EndpointStats] = {}
+
+    def _get(self, key: str) -> _EndpointStats:
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = _EndpointStats()
+        return stats
+
+    def observe(self, key: str, ms: float, error: bool = False):
+        stats = self._get(key)
+        stats.observe(ms)
+        if error:
+            stats.errors += 1
+
+    def error(self, key: str):
+        """Fallo sin latencia útil (timeout, conexión rechazada...)."""
+        self._get(key).errors += 1
+
+    def retry(self, key: str):
+        self._get(key).retries += 1
+
+    def hedge(self, key: str, won: bool = False):
+        stats = self._get(key)
+        if won:
+            stats.hedge_wins += 1
+        else:
+            stats.hedges += 1
+
+    def percentile(self, key: str, q: float, min_count: int = 1) -> Optional[float]:
+        """Percentil q del endpoint, o None si aún no hay min_count muestras."""
+        stats = self._stats.get(key)
+        if stats is None or stats.total < min_count:
+            return None
+        return stats.percentile(q)
+
+    def snapshot(self) -> Dict[str, dict]:
+        out: Dict[str, dict] = {}
+        for key, stats in sorted(self._stats.items()):
+            out[key] = {
+                "count": stats.total,
+                "p50_ms": round(stats.percentile(0.50), 1),
+                "p95_ms": round(stats.percentile(0.95), 1),
+                "p99_ms": round(stats.percentile(0.99), 1),
+                "avg_ms": round(stats.sum_ms / stats.total, 1) if stats.total else 0.0,
+                "max_ms": round(stats.max_ms, 1),
+                "errors": stats.errors,
+                "retries": stats.retries,
+                "hedges": stats.hedges,
+                "hedge_wins": stats.hedge_wins,
+            }
+        return out
@@ -0,0 +1,141 @@
+"""
+market_data.py - Caché corta y agrupación de peticiones de mercado (REST).
+
+Bid/ask (/fapi/v1/ticker/bookTicker) y mark price (/fapi/v1/premiumIndex) se
+piden muy seguidos desde varios sitios (cascadas, capacidad de SL, paper).
+Este módulo:
+
+  - sirve el último valor si tiene menos de ttl_ms,
+  - agrupa peticiones idénticas simultáneas en una sola (single-flight),
+  - usa la variante de todos los símbolos cuando se piden varios mark prices
+    a la vez, y con ella rellena la caché de todos.
+
+Las peticiones en vuelo solo se comparten entre llamadas con la misma
+prioridad (rate_limiter): una consulta del dashboard que se descarte no
+arrastra a una del flujo de órdenes.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from .logger import get_logger
+from .rate_limiter import request_priority
+
+log = get_logger("market_data")
+MARKET_DATA_VERSION = "0.01"
+
+_BOOK_PATH = "/fapi/v1/ticker/bookTicker"
+_MARK_PATH = "/fapi/v1/premiumIndex"
+# A partir de cuántos símbolos compensa la variante de todos los símbolos
+_BULK_MIN_SYMBOLS = 3
+
+
+class MarketDataCache:
+    def __init__(self,
+                 get: Callable[..., Awaitable[Any]],
+                 ttl_ms: float = 200.0):
+        self._get = get
+        self._ttl_s = max(0.0, ttl_ms) / 1000.0
+        self._books: Dict[str, Tuple[float, float, float]] = {}   # symbol → (bid, ask, t)
+        self._marks: Dict[str, Tuple[float, float]] = {}          # symbol → (mark, t)
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+
+    # ──────────────────────────────────────────────────────────────────
+    # Bid / ask
+    # ──────────────────────────────────────────────────────────────────
+
+    async def book(self, symbol: str) -> Tuple[float, float]:
+        cached = self._books.get(symbol)
+        if cached and self._fresh(cached[2]):
+            self.hits += 1
+            return cached[0], cached[1]
+        self.misses += 1
+        await self._single_flight((_BOOK_PATH, symbol), lambda: self._fetch_books(symbol))
+        bid, ask, _ = self._books[symbol]
+        return bid, ask
+
+    async def _fetch_books(self, symbol: str):
+        data = await self._get(_BOOK_PATH, {"symbol": symbol})
+        now = time.monotonic()
+        for item in data if isinstance(data, list) else [data]:
+            sym = item.get("symbol")
+            if sym:
+                self._books[sym] = (float(item["bidPrice"]), float(item["askPrice"]), now)
+
+    # ──────────────────────────────────────────────────────────────────
+    # Mark price
+    # ──────────────────────────────────────────────────────────────────
+
+    async def mark(self, symbol: str) -> float:
+        cached = self._marks.get(symbol)
+        if cached and self._fresh(cached[1]):
+            self.hits += 1
+            return cached[0]
+        self.misses += 1
+        await self._single_flight((_MARK_PATH, symbol), lambda: self._fetch_marks(symbol))
+        return self._marks[symbol][0]
+
+    async def marks(self, symbols: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """Mark prices de los símbolos pedidos (o de todos si symbols es None)."""
+        if symbols is None:
+            self.misses += 1
+            await self._single_flight((_MARK_PATH, None), lambda: self._fetch_marks(None))
+            return {s: v[0] for s, v in self._marks.items()}
+        wanted = list(dict.fromkeys(symbols))
+        missing = [s for s in wanted if not self._fresh_mark(s)]
+        if len(missing) >= _BULK_MIN_SYMBOLS:
+            self.misses += 1
+            await self._single_flight((_MARK_PATH, None), lambda: self._fetch_marks(None))
+        else:
+            await asyncio.gather(*(self.mark(s) for s in missing))
+        return {s: self._marks[s][0] for s in wanted if s in self._marks}
+
+    async def _fetch_marks(self, symbol: Optional[str]):
+        params = {"symbol": symbol} if symbol else {}
+        data = await self._get(_MARK_PATH, params)
+        now = time.monotonic()
+        for item in data if isinstance(data, list) else [data]:
+            sym = item.get("symbol")
+            if not sym:
+                continue
+            try:
+                self._marks[sym] = (float(item["markPrice"]), now)
+            except (KeyError, TypeError, ValueError):
+                continue
+
+    def _fresh_mark(self, symbol: str) -> bool:
+        cached = self._marks.get(symbol)
+        return bool(cached) and self._fresh(cached[1])
+
+    # ──────────────────────────────────────────────────────────────────
+    # Helpers
+    # ──────────────────────────────────────────────────────────────────
+
+    def _fresh(self, ts: float) -> bool:
+        return time.monotonic() - ts < self._ttl_s
+
+    async def _single_flight(self, key: tuple, factory: Callable[[], Awaitable[None]]):
+        key = key + (request_priority("GET", key[0]),)
+        task = self._inflight.get(key)
+        if task is None or task.done():
+            task = asyncio.create_task(factory())
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._forget, key))
+        await asyncio.shield(task)
+
+    def _forget(self, key: tuple, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "books": len(self._books),
+            "marks": len(self._marks),
+        }
@@ -0,0 +1,211 @@
+"""
+market_stream.py - WebSocket de datos de mercado (stream combinado de Binance).
+
+Mantiene una conexión a <ws_base_url>/stream y, por cada par con trades vivos
+o pendientes, los streams markPrice@1s, bookTicker y kline_5m. Los mensajes
+se vuelcan en el PriceBook de OrderManager (price_book.py), que los sirve en
+lugar de la API REST mientras estén frescos.
+
+Qué pares se siguen:
+
+  - los que devuelve symbols_provider (trades reales y paper activos),
+  - los marcados con watch() en los últimos _PIN_S segundos: una señal nueva
+    se suscribe antes de abrir su trade.
+
+Las suscripciones se ajustan con SUBSCRIBE/UNSUBSCRIBE sobre la misma
+conexión, en lotes y espaciadas para no pasar de los 10 mensajes por segundo
+que Binance admite por conexión. Al reconectar se vacía el PriceBook y se
+vuelve a suscribir todo; si el ajuste de suscripciones falla, se cierra la
+conexión para no seguir con una lista congelada. Reconexión automática con
+backoff exponencial.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+import websockets
+
+from .config import Config
+from .logger import get_logger
+from .price_book import PriceBook
+
+log = get_logger("market_stream")
+MARKET_STREAM_VERSION = "0.02"
+
+_STREAM_SUFFIXES = ("@markPrice@1s", "@bookTicker", "@kline_5m")
+_MAX_STREAMS = 1024              # límite de Binance por conexión
+_PARAMS_PER_MESSAGE = 60
+_MESSAGE_SPACING_S = 0.25
+_SYNC_INTERVAL_S = 5.0
+_PIN_S = 120.0
+
+SymbolsProvider = Callable[[], Iterable[str]]
+
+
+class MarketStreamManager:
+    def __init__(self, cfg: Config, prices: PriceBook, symbols_provider: SymbolsProvider):
+        self._cfg = cfg
+        self._prices = prices
+        self._symbols_provider = symbols_provider
+        self._pinned: Dict[str, float] = {}          # symbol → monotonic de watch()
+        self._subscribed: Set[str] = set()           # símbolos suscritos en la conexión actual
+        self._wake = asyncio.Event()
+        self._request_id = 0
+        self._connected = False
+        self._task: Optional[asyncio.Task] = None
+        self._capped_logged = False
+        self.messages = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._connected
+
+    def watch(self, symbol: str):
+        """Suscribe el símbolo ya (señal nueva), aunque aún no tenga trade."""
+        new = symbol not in self._pinned and symbol not in self._subscribed
+        self._pinned[symbol] = time.monotonic()
+        if new:
+            self._wake.set()
+
+    # ──────────────────────────────────────────────────────────────────
+    # Ciclo principal
+    # ──────────────────────────────────────────────────────────────────
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run_loop(), name="market_stream")
+        log.info("MarketStreamManager iniciado")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._connected = False
+        self._prices.clear()
+        log.info("MarketStreamManager detenido")
+
+    async def _run_loop(self):
+        backoff = 1.0
+        while True:
+            try:
+                await self._connect()
+                backoff = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning(f"WS mercado desconectado: {e}. Reconectando en {backoff:.0f}s...")
+            finally:
+                self._connected = False
+                self._subscribed.clear()
+                self._prices.clear()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+
+    async def _connect(self):
+        url = f"{self._cfg.ws_base_url}/stream"
+        log.info(f"WS mercado conectando: {url}")
+        async with websockets.connect(url, ping_interval=20, ping_timeout=10) as ws:
+            self._connected = True
+            log.info("WS mercado conectado ✓")
+            sync_task = asyncio.create_task(self._sync_loop(ws), name="market_stream_sync")
+            sync_task.add_done_callback(lambda task: self._on_sync_done(task, ws))
+            try:
+                async for raw in ws:
+                    self._handle_message(raw)
+            finally:
+                sync_task.cancel()
+            if sync_task.done() and not sync_task.cancelled() and sync_task.exception():
+                raise sync_task.exception()
+
+    @staticmethod
+    def _on_sync_done(task: asyncio.Task, ws):
+        """Si las suscripciones dejan de ajustarse, se reconecta y se resuscribe todo."""
+        if task.cancelled() or task.exception() is None:
+            return
+        log.warning(f"WS mercado: fallo ajustando suscripciones: {task.exception()!r}")
+        asyncio.ensure_future(ws.close())
+
+    async def _sync_loop(self, ws):
+        while True:
+            self._wake.clear()
+            wanted = self._wanted_symbols()
+            added = sorted(wanted - self._subscribed)
+            removed = sorted(self._subscribed - wanted)
+            if removed:
+                await self._send(ws, "UNSUBSCRIBE", removed)
+                self._subscribed.difference_update(removed)
+                for symbol in removed:
+                    self._prices.forget(symbol)
+            if added:
+                await self._send(ws, "SUBSCRIBE", added)
+                self._subscribed.update(added)
+            if added or removed:
+                log.debug(
+                    f"WS mercado: +{len(added)} -{len(removed)} símbolos "
+                    f"({len(self._subscribed)} suscritos)"
+                )
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=_SYNC_INTERVAL_S)
+            except asyncio.TimeoutError:
+                pass
+
+    def _wanted_symbols(self) -> Set[str]:
+        now = time.monotonic()
+        for symbol in [s for s, t in self._pinned.items() if now - t > _PIN_S]:
+            del self._pinned[symbol]
+        wanted = set(self._symbols_provider()) | set(self._pinned)
+        max_symbols = _MAX_STREAMS // len(_STREAM_SUFFIXES)
+        if len(wanted) > max_symbols:
+            if not self._capped_logged:
+                log.warning(
+                    f"WS mercado: {len(wanted)} pares superan el límite de "
+                    f"{max_symbols} por conexión; el resto irá por REST"
+                )
+                self._capped_logged = True
+            # Conservar los ya suscritos para no rotar suscripciones
+            keep = sorted(wanted & self._subscribed) + sorted(wanted - self._subscribed)
+            wanted = set(keep[:max_symbols])
+        else:
+            self._capped_logged = False
+        return wanted
+
+    async def _send(self, ws, method: str, symbols: List[str]):
+        params = [f"{s.lower()}{suffix}" for s in symbols for suffix in _STREAM_SUFFIXES]
+        for i in range(0, len(params), _PARAMS_PER_MESSAGE):
+            self._request_id += 1
+            await ws.send(json.dumps({
+                "method": method,
+                "params": params[i:i + _PARAMS_PER_MESSAGE],
+                "id": self._request_id,
+            }))
+            await asyncio.sleep(_MESSAGE_SPACING_S)
+
+    # ──────────────────────────────────────────────────────────────────
+    # Procesado de mensajes
+    # ──────────────────────────────────────────────────────────────────
+
+    def _handle_message(self, raw: str):
+        try:
+            msg = json.loads(raw)
+        except json.JSONDecodeError:
+            log.warning(f"WS mercado: mensaje no JSON: {raw[:200]}")
+            return
+        data = msg.get("data")
+        if isinstance(data, dict):
+            self.messages += 1
+            self._prices.apply(data)
+        elif msg.get("error"):
+            log.warning(f"WS mercado: petición {msg.get('id')} rechazada: {msg['error']}")
+
+    def snapshot(self) -> dict:
+        return {
+            "connected": self._connected,
+            "subscribed": len(self._subscribed),
+            "messages": self.messages,
+            **self._prices.snapshot(),
+        }
@@ -117,10 +117,41 @@ class Trade:
     timeout_triggered: bool           = False
     reconciled:        bool           = False
     source:            str            = "real"
+    # Tabla en la que ya existe la fila (los saves siguientes son UPDATE parciales)
+    persisted_in:      Optional[str]  = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "_dirty", set())
+
+    def __setattr__(self, name: str, value: Any):
+        # Una vez persistido, se anotan los campos que cambian de valor
+        d = self.__dict__
+        if (name not in _TRADE_UNTRACKED_FIELDS
+                and d.get("persisted_in") is not None
+                and d.get(name, _UNSET) != value):
+            d["_dirty"].add(name)
+        object.__setattr__(self, name, value)
 
     def touch(self):
         self.updated_at = _now_iso()
 
+    def dirty_fields(self) -> frozenset:
+        """Campos modificados desde el último persist."""
+        return frozenset(self.__dict__.get("_dirty", ()))
+
+    def mark_persisted(self, table: str):
+        object.__setattr__(self, "persisted_in", table)
+        self.__dict__["_dirty"].clear()
+
+    def mark_unpersisted(self):
+        """Fuerza que el siguiente save escriba la fila completa."""
+        object.__setattr__(self, "persisted_in", None)
+        self.__dict__["_dirty"].clear()
+
+
+_UNSET = object()
+_TRADE_UNTRACKED_FIELDS = frozenset({"persisted_in", "source"})
+
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Event (log de auditoría)
@@ -17,6 +17,43 @@ Ambas órdenes se colocan vía /fapi/v1/algoOrder con algoType="CONDITIONAL"
 (requerido para cuentas migradas al servicio Algo de Binance).
 cancel_order() intenta primero /fapi/v1/order y, si recibe -2011 (orden
 no encontrada), reintenta con /fapi/v1/algoOrder usando algoId.
+cancel_orders() hace lo mismo para varias órdenes de un símbolo, agrupando las
+regulares en /fapi/v1/batchOrders (10 por petición).
+Para evitar ese primer intento fallido, el manager recuerda el tipo de cada
+orden (regular / algo) al colocarla y al leer las órdenes abiertas, y cancela
+directamente en el endpoint correcto cuando lo conoce.
+
+Los filtros de cada símbolo (tick/step/minQty/minNotional) salen de un
+registro local de exchangeInfo (exchange_info.py) cargado al arrancar, así
+que los cálculos de precio y cantidad no esperan a la red.
+
+Todas las peticiones pasan por RequestGovernor (rate_limiter.py), que reserva
+el peso de cada una según su prioridad y se sincroniza con las cabeceras
+X-MBX-USED-WEIGHT-1M / X-MBX-ORDER-COUNT-* antes de llegar a un 429/418.
+
+Las peticiones firmadas llevan timestamp corregido con el desfase respecto al
+reloj de Binance (/fapi/v1/time, al arrancar y cada binance.time_sync_minutes)
+y el recvWindow configurado. Un -1021 (timestamp fuera de ventana) fuerza una
+resincronización inmediata y un único reintento.
+
+Posiciones y órdenes abiertas de toda la cuenta pasan por AccountSnapshot
+(account_snapshot.py): cada consumidor indica la antigüedad que tolera, el
+User Data Stream la mantiene al día y las órdenes que coloca o cancela el bot
+se aplican con la respuesta de Binance (sin WS, la invalidan).
+
+Cada clase de endpoint (órdenes, cuenta, mercado) tiene un cortacircuitos
+(circuit_breaker.py): con Binance caído, las lecturas fallan al momento con
+CircuitOpen en lugar de acumular reintentos, y solo las órdenes protectoras
+(SL/TP, cancelaciones, cierres reduceOnly) siguen saliendo.
+
+Bid/ask y mark price pasan por MarketDataCache (market_data.py): caché de
+milisegundos, peticiones idénticas agrupadas y variantes de todos los
+símbolos cuando se piden varios pares. Con binance.http.hedged_reads, la
+consulta de un solo símbolo en el flujo de un trade se duplica si la primera
+respuesta tarda más que el p95 del endpoint, y se usa la que llegue antes.
+Antes de todo eso se mira el PriceBook (price_book.py), que alimentan los
+streams de mercado por WebSocket: mientras el símbolo esté fresco no se
+consulta REST, tampoco para la última vela cerrada de 5m.
 """
 from __future__ import annotations
 
@@ -24,21 +61,57 @@ import asyncio
 import decimal
 import hashlib
 import hmac
+import json
+import re
+import socket
 import time
-from typing import Any, Dict, Optional
-from urllib.parse import urlencode
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import quote_plus, urlencode, urlsplit
 
 import aiohttp
 
+from .account_snapshot import ALGO_ORDERS, OPEN_ORDERS, POSITIONS, AccountSnapshot
+from .circuit_breaker import CLOSED, CircuitBreaker, CircuitBreakers, CircuitOpen, is_protective
 from .config import Config
+from .exchange_info import ExchangeInfoRegistry
+from .http_metrics import HttpMetrics
 from .logger import get_logger
+from .market_data import MarketDataCache
+from .price_book import PriceBook
+from .rate_limiter import Priority, RequestGovernor, background_requests, request_priority
 
 log = get_logger("order_manager")
 
 _RETRY_CODES = {429, 500, 502, 503, 504}
+_RATE_LIMIT_STATUSES = {418, 429}
 _MAX_RETRIES = 3
 _BACKOFF_BASE = 1.5          # segundos
-ORDER_MANAGER_VERSION = "1.00"
+# Rechazos por filtros del símbolo: la tabla local puede estar desfasada
+_FILTER_ERROR_CODES = {-1013, -1111, -4003, -4014, -4023, -4164}
+# Límite de /fapi/v1/batchOrders (cancelación)
+_BATCH_CANCEL_MAX = 10
+# Tipo de orden según el endpoint de colocación
+_ORDER_KIND_BY_PATH = {"/fapi/v1/order": "regular", "/fapi/v1/algoOrder": "algo"}
+_ORDER_KINDS_MAX = 5000
+# Peticiones (no GET) que cambian órdenes/posiciones: invalidan AccountSnapshot
+_ACCOUNT_MUTATING_PATHS = {
+    "/fapi/v1/order",
+    "/fapi/v1/algoOrder",
+    "/fapi/v1/batchOrders",
+    "/fapi/v1/allOpenOrders",
+}
+_PREWARM_PATH = "/fapi/v1/ping"
+# Muestras necesarias antes de fiarse del p95 para el plazo del hedge
+_HEDGE_MIN_SAMPLES = 20
+# Valores que urlencode deja tal cual (no hace falta quote_plus)
+_QS_SAFE = re.compile(r"[A-Za-z0-9_.~-]*")
+# Sincronización con el reloj del servidor
+_TIME_PATH = "/fapi/v1/time"
+_TIMESTAMP_ERROR_CODE = -1021
+_TIME_SYNC_SAMPLES = 3       # se queda con la muestra de menor RTT
+_TIME_OFFSET_ALPHA = 0.3     # suavizado exponencial entre sincronizaciones
+_TIME_OFFSET_WARN_MS = 1000
+ORDER_MANAGER_VERSION = "1.14"
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -64,6 +137,13 @@ def _to_binance_str(value: Any) -> str:
     Convierte floats/decimals a texto decimal plano sin notación científica.
     Binance rechaza parámetros como 2.75e-05 en price/triggerPrice.
     """
+    if value.__class__ is float:
+        # repr ya es la forma más corta; si no trae exponente (ni inf/nan)
+        # coincide con la conversión vía Decimal y es mucho más barata
+        text = repr(value)
+        if "e" not in text and "n" not in text:
+            text = text.rstrip("0").rstrip(".")
+            return text or "0"
     text = format(decimal.Decimal(str(value)), "f")
     if "." in text:
         text = text.rstrip("0").rstrip(".")
@@ -84,6 +164,73 @@ def _normalize_binance_value(value: Any) -> Any:
     return value
 
 
+def _all_str(params: dict) -> bool:
+    for value in params.values():
+        if value.__class__ is not str:
+            return False
+    return True
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Firma
+# ──────────────────────────────────────────────────────────────────────────────
+
+class RequestSigner:
+    """
+    Firma HMAC-SHA256 de Binance. La clave se procesa una sola vez y cada firma
+    parte de una copia del HMAC ya inicializado. Los parámetros planos (str,
+    int, float, Decimal) se codifican sin pasar por urlencode ni por
+    _normalize_binance_value; cualquier otro tipo usa el camino general.
+    El resultado (query y firma) es idéntico en ambos caminos.
+    """
+
+    def __init__(self, secret: str):
+        self._hmac = hmac.new(secret.encode("utf-8"), digestmod=hashlib.sha256)
+
+    def sign(self, params: dict, timestamp_ms: Optional[int] = None,
+             recv_window_ms: Optional[int] = None) -> dict:
+        """Devuelve una copia de params (valores str) con timestamp y signature."""
+        if timestamp_ms is None:
+            timestamp_ms = int(time.time() * 1000)
+        out = _encode_flat(params)
+        if out is None:
+            out = _normalize_binance_value(dict(params))
+            if recv_window_ms and "recvWindow" not in out:
+                out["recvWindow"] = recv_window_ms
+            out["timestamp"] = timestamp_ms
+            qs = urlencode(out)
+        else:
+            if recv_window_ms and "recvWindow" not in out:
+                out["recvWindow"] = str(recv_window_ms)
+            out["timestamp"] = str(timestamp_ms)
+            qs = "&".join(
+                f"{key}={value}" if _QS_SAFE.fullmatch(value) else f"{key}={quote_plus(value)}"
+                for key, value in out.items()
+            )
+        mac = self._hmac.copy()
+        mac.update(qs.encode("utf-8"))
+        out["signature"] = mac.hexdigest()
+        return out
+
+
+def _encode_flat(params: dict) -> Optional[dict]:
+    """Params con valores ya convertidos a texto, o None si hay tipos no planos."""
+    out = {}
+    for key, value in params.items():
+        cls = value.__class__
+        if cls is str:
+            out[key] = value
+        elif cls is int:
+            out[key] = str(value)
+        elif cls is float or cls is decimal.Decimal:
+            out[key] = _to_binance_str(value)
+        else:
+            return None
+        if not _QS_SAFE.fullmatch(key):
+            return None
+    return out
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # OrderManager
 # ──────────────────────────────────────────────────────────────────────────────
@@ -92,16 +239,139 @@ class OrderManager:
     def __init__(self, cfg: Config):
         self._cfg     = cfg
         self._session: Optional[aiohttp.ClientSession] = None
-        self._exinfo_cache: Dict[str, dict] = {}   # symbol → exchange info filters
+        self._signer = RequestSigner(cfg.api_secret)
+        self._time_offset_ms = 0.0          # reloj Binance - reloj local
+        self._time_synced = False
+        self._time_sync_task: Optional[asyncio.Task] = None
+        self._time_loop_task: Optional[asyncio.Task] = None
+        self._exinfo = ExchangeInfoRegistry(
+            cfg.exchange_info_path,
+            self._fetch_exchange_info,
+            refresh_interval_s=cfg.exchange_info_refresh_minutes * 60,
+        )
+        self._governor = RequestGovernor(
+            weight_limit_1m=cfg.rate_limit_weight_1m,
+            order_limit_10s=cfg.rate_limit_orders_10s,
+            order_limit_1m=cfg.rate_limit_orders_1m,
+        )
+        self._market = MarketDataCache(self._market_get, ttl_ms=cfg.market_data_ttl_ms)
+        self._prices = PriceBook(max_age_ms=cfg.market_stream_max_age_ms)
+        self._account = AccountSnapshot({
+            POSITIONS:   self._fetch_all_positions,
+            OPEN_ORDERS: self._fetch_all_open_orders,
+            ALGO_ORDERS: self._fetch_all_open_algo_orders,
+        })
+        self._order_kinds: Dict[int, str] = {}   # orderId/algoId → "regular" | "algo"
+        self._metrics = HttpMetrics()
+        self._circuits = CircuitBreakers(
+            failure_threshold=cfg.circuit_failure_threshold,
+            open_s=cfg.circuit_open_s,
+        )
+        self._keepwarm_task: Optional[asyncio.Task] = None
+        self._last_request_at = 0.0
+
+    @property
+    def governor(self) -> RequestGovernor:
+        return self._governor
+
+    @property
+    def account(self) -> AccountSnapshot:
+        return self._account
+
+    @property
+    def prices(self) -> PriceBook:
+        return self._prices
+
+    @property
+    def circuits(self) -> CircuitBreakers:
+        return self._circuits
+
+    def http_metrics(self) -> Dict[str, dict]:
+        """Latencia p50/p95/p99, errores y reintentos por endpoint."""
+        return self._metrics.snapshot()
 
     async def init(self):
         self._session = aiohttp.ClientSession(
             headers={"X-MBX-APIKEY": self._cfg.api_key},
-            connector=aiohttp.TCPConnector(limit=50),
+            connector=self._build_connector(),
+            timeout=aiohttp.ClientTimeout(total=self._cfg.http_request_timeout_s),
+        )
+        try:
+            await self.sync_time()
+        except Exception as e:
+            log.warning(f"No se pudo sincronizar con el reloj de Binance: {e}")
+        self._time_loop_task = asyncio.create_task(self._time_sync_loop(), name="binance_time_sync")
+        await self._exinfo.start()
+        await self._prewarm()
+        if self._cfg.http_prewarm_connections > 0:
+            self._keepwarm_task = asyncio.create_task(self._keepwarm_loop(), name="http_keepwarm")
+        log.info(
+            f"OrderManager v{ORDER_MANAGER_VERSION} inicializado "
+            f"({len(self._exinfo)} símbolos en exchangeInfo)"
+        )
+
+    def _build_connector(self) -> aiohttp.TCPConnector:
+        cfg = self._cfg
+        kwargs: Dict[str, Any] = {
+            "limit": cfg.http_pool_size,
+            "limit_per_host": cfg.http_pool_size_per_host,
+            "ttl_dns_cache": cfg.http_dns_cache_ttl_s,
+            "use_dns_cache": True,
+            "keepalive_timeout": cfg.http_keepalive_s,
+        }
+        if cfg.http_tcp_nodelay:
+            # asyncio ya activa TCP_NODELAY en sockets TCP; con aiohttp >= 3.12
+            # se fija también explícitamente al crear el socket.
+            try:
+                import inspect
+                if "socket_factory" in inspect.signature(aiohttp.TCPConnector).parameters:
+                    kwargs["socket_factory"] = _nodelay_socket
+            except (TypeError, ValueError):
+                pass
+        return aiohttp.TCPConnector(**kwargs)
+
+    async def _prewarm(self):
+        """Abre N conexiones keep-alive (TCP + TLS) antes de la primera orden."""
+        n = self._cfg.http_prewarm_connections
+        if n <= 0:
+            return
+        t0 = time.perf_counter()
+        results = await asyncio.gather(
+            *(self._get(_PREWARM_PATH) for _ in range(n)),
+            return_exceptions=True,
+        )
+        failed = sum(1 for r in results if isinstance(r, Exception))
+        log.info(
+            f"HTTP: {n - failed}/{n} conexiones precalentadas en "
+            f"{(time.perf_counter() - t0) * 1000:.0f}ms"
         )
-        log.info(f"OrderManager v{ORDER_MANAGER_VERSION} inicializado")
+
+    async def _keepwarm_loop(self):
+        """Si no hay tráfico, repite el precalentado antes de que caduque el keep-alive."""
+        interval = max(5.0, self._cfg.http_keepalive_s * 0.8)
+        while True:
+            await asyncio.sleep(interval)
+            if time.monotonic() - self._last_request_at < interval:
+                continue
+            try:
+                await self._prewarm()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.debug(f"HTTP keep-warm: {e}")
 
     async def close(self):
+        for task in (self._keepwarm_task, self._time_loop_task, self._time_sync_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._keepwarm_task = None
+        self._time_loop_task = None
+        self._time_sync_task = None
+        await self._exinfo.stop()
         if self._session:
             await self._session.close()
             self._session = None
@@ -111,59 +381,232 @@ class OrderManager:
     # ──────────────────────────────────────────────────────────────────
 
     def _sign(self, params: dict) -> dict:
-        params = _normalize_binance_value(dict(params))
-        params["timestamp"] = int(time.time() * 1000)
-        qs = urlencode(params)
-        sig = hmac.new(
-            self._cfg.api_secret.encode("utf-8"),
-            qs.encode("utf-8"),
-            hashlib.sha256,
-        ).hexdigest()
-        params["signature"] = sig
-        return params
+        return self._signer.sign(
+            params,
+            int(time.time() * 1000 + self._time_offset_ms),
+            self._cfg.recv_window_ms,
+        )
 
-    async def _get(self, path: str, params: dict = None, signed: bool = False) -> Any:
-        params = params or {}
-        if signed:
-            params = self._sign(params)
+    async def _send(self, method: str, path: str, params: dict, signed: bool,
+                    field: str = "params") -> Any:
+        if method != "GET" and path in _ACCOUNT_MUTATING_PATHS:
+            try:
+                result = await self._send_once(method, path, params, signed, field)
+            except BaseException:
+                # Un error puede ocultar una orden ya ejecutada
+                self._account.invalidate()
+                raise
+            self._note_account_change(method, path, result)
+            return result
+        return await self._send_once(method, path, params, signed, field)
+
+    def _note_account_change(self, method: str, path: str, result: Any):
+        """Aplica al espejo de cuenta la respuesta de una orden colocada o cancelada."""
+        if not isinstance(result, dict):
+            self._account.invalidate()
+        elif path == "/fapi/v1/order":
+            self._account.apply_rest_order(OPEN_ORDERS, result)
+        elif path == "/fapi/v1/algoOrder":
+            self._account.apply_rest_order(ALGO_ORDERS, result, removed=(method == "DELETE"))
+        else:
+            # Lotes y cancelaciones masivas: se vuelve a descargar
+            self._account.invalidate()
+
+    async def _send_once(self, method: str, path: str, params: dict, signed: bool,
+                         field: str) -> Any:
         url = self._cfg.base_url + path
-        return await self._request("GET", url, params=params)
+        if not signed:
+            return await self._request(method, url, **{field: params})
+        try:
+            return await self._request(method, url, sign=field, **{field: params})
+        except BinanceError as e:
+            if e.code != _TIMESTAMP_ERROR_CODE:
+                raise
+            # Binance ha rechazado la petición sin ejecutarla: es seguro repetirla
+            log.warning(f"{method} {path}: {e.msg} → resincronizando reloj y reintentando")
+            await self.sync_time(force=True)
+            return await self._request(method, url, sign=field, **{field: params})
+
+    async def _get(self, path: str, params: dict = None, signed: bool = False) -> Any:
+        return await self._send("GET", path, params or {}, signed)
+
+    async def _market_get(self, path: str, params: dict) -> Any:
+        """GET de MarketDataCache: duplicado (hedge) si es un símbolo en el flujo de un trade."""
+        if (self._cfg.http_hedged_reads
+                and params.get("symbol")
+                and request_priority("GET", path) <= Priority.NORMAL):
+            return await self._hedged_get(path, params)
+        return await self._get(path, params)
+
+    async def _hedged_get(self, path: str, params: dict) -> Any:
+        """
+        GET idempotente con petición de respaldo: si la primera no ha respondido
+        en el p95 del endpoint (acotado a hedge_min_ms..hedge_max_ms), lanza una
+        segunda por otra conexión del pool y devuelve la primera que acabe bien.
+        Ambas pasan por el gobernador de peso. La perdedora termina en segundo
+        plano para no cerrar su conexión keep-alive.
+        """
+        key = f"GET {path}"
+        primary = asyncio.ensure_future(self._get(path, params))
+        backup: Optional[asyncio.Future] = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self._hedge_delay_s(key))
+            if done:
+                return primary.result()
+            self._metrics.hedge(key)
+            backup = asyncio.ensure_future(self._get(path, params))
+            pending = {primary, backup}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self._metrics.hedge(key, won=True)
+                        for loser in pending:
+                            loser.add_done_callback(_discard_result)
+                        return task.result()
+            # Las dos han fallado: se propaga el error de la original
+            return primary.result()
+        except asyncio.CancelledError:
+            for task in (primary, backup):
+                if task is not None and not task.done():
+                    task.cancel()
+            raise
+
+    def _hedge_delay_s(self, key: str) -> float:
+        cfg = self._cfg
+        p95 = self._metrics.percentile(key, 0.95, min_count=_HEDGE_MIN_SAMPLES)
+        delay_ms = cfg.http_hedge_max_ms if p95 is None else p95
+        return min(max(delay_ms, cfg.http_hedge_min_ms), cfg.http_hedge_max_ms) / 1000.0
 
     async def _post(self, path: str, params: dict, signed: bool = True) -> Any:
-        if signed:
-            params = self._sign(params)
-        url = self._cfg.base_url + path
-        return await self._request("POST", url, data=params)
+        result = await self._send("POST", path, params, signed, field="data")
+        kind = _ORDER_KIND_BY_PATH.get(path)
+        if kind and isinstance(result, dict):
+            self._remember_order_kind(result.get("algoId") or result.get("orderId"), kind)
+        return result
 
     async def _delete(self, path: str, params: dict, signed: bool = True) -> Any:
-        if signed:
-            params = self._sign(params)
-        url = self._cfg.base_url + path
-        return await self._request("DELETE", url, params=params)
+        return await self._send("DELETE", path, params, signed)
 
     async def _put(self, path: str, params: dict, signed: bool = True) -> Any:
-        if signed:
-            params = self._sign(params)
-        url = self._cfg.base_url + path
-        return await self._request("PUT", url, params=params)
-
-    async def _request(self, method: str, url: str, **kwargs) -> Any:
-        if "params" in kwargs and kwargs["params"] is not None:
-            kwargs["params"] = _normalize_binance_value(kwargs["params"])
-        if "data" in kwargs and kwargs["data"] is not None:
-            kwargs["data"] = _normalize_binance_value(kwargs["data"])
-        t0 = time.time()
+        return await self._send("PUT", path, params, signed)
+
+    # ──────────────────────────────────────────────────────────────────
+    # Reloj del servidor
+    # ──────────────────────────────────────────────────────────────────
+
+    @property
+    def time_offset_ms(self) -> float:
+        return self._time_offset_ms
+
+    async def sync_time(self, force: bool = False) -> float:
+        """
+        Mide el desfase con /fapi/v1/time. Las llamadas concurrentes comparten
+        la medición. Con force (tras un -1021) se aplica el desfase medido sin
+        suavizar.
+        """
+        if self._time_sync_task is None or self._time_sync_task.done():
+            self._time_sync_task = asyncio.create_task(self._do_sync_time())
+        sample = await asyncio.shield(self._time_sync_task)
+        if force:
+            self._time_offset_ms = sample
+        return self._time_offset_ms
+
+    async def _do_sync_time(self) -> float:
+        """Mide y aplica (suavizado) el desfase. Devuelve la muestra sin suavizar."""
+        best_rtt = None
+        sample = 0.0
+        for _ in range(_TIME_SYNC_SAMPLES):
+            t0 = time.time()
+            p0 = time.perf_counter()
+            data = await self._get(_TIME_PATH)
+            rtt_ms = (time.perf_counter() - p0) * 1000
+            if best_rtt is None or rtt_ms < best_rtt:
+                best_rtt = rtt_ms
+                # La hora del servidor corresponde aprox. a la mitad del viaje
+                sample = float(data["serverTime"]) - (t0 * 1000 + rtt_ms / 2)
+        if not self._time_synced:
+            self._time_offset_ms = sample
+        else:
+            self._time_offset_ms += _TIME_OFFSET_ALPHA * (sample - self._time_offset_ms)
+        self._time_synced = True
+        level = log.warning if abs(self._time_offset_ms) >= _TIME_OFFSET_WARN_MS else log.debug
+        level(
+            f"Reloj Binance: desfase {self._time_offset_ms:+.0f}ms "
+            f"(muestra {sample:+.0f}ms, RTT {best_rtt:.0f}ms)"
+        )
+        return sample
+
+    async def _time_sync_loop(self):
+        interval = self._cfg.time_sync_minutes * 60
+        with background_requests():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self.sync_time()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    log.warning(f"Sincronización de reloj fallida: {e}")
+
+    async def _request(self, method: str, url: str, sign: Optional[str] = None,
+                       **kwargs) -> Any:
+        # sign: campo ("params"/"data") que se firma justo antes de cada envío,
+        # tras la espera del gobernador, para que el timestamp no envejezca en
+        # la cola y caduque el recvWindow (-1021).
+        unsigned = kwargs.get(sign) if sign else None
+        for field in ("params", "data"):
+            value = kwargs.get(field)
+            if field == sign:
+                continue
+            if value is not None and not (isinstance(value, dict) and _all_str(value)):
+                kwargs[field] = _normalize_binance_value(value)
+        path = urlsplit(url).path
+        metric_key = f"{method} {path}"
+        self._last_request_at = time.monotonic()
+        weight_params = kwargs.get("params") or kwargs.get("data")
+        breaker = self._circuits.for_request(method, path)
+        protective = is_protective(method, path, weight_params)
         last_exc = None
         for attempt in range(1, _MAX_RETRIES + 1):
+            if attempt > 1:
+                self._metrics.retry(metric_key)
+            if not breaker.allow(protective):
+                raise CircuitOpen(
+                    f"{method} {path}: circuito '{breaker.name}' abierto "
+                    f"(prueba en {breaker.retry_in_s:.0f}s)"
+                )
+            # Fuera del try: RateLimitShed no se reintenta
+            try:
+                await self._governor.acquire(method, path, weight_params)
+            except BaseException:
+                breaker.release_probe()
+                raise
+            if sign:
+                kwargs[sign] = self._sign(unsigned)
+            t0 = time.perf_counter()
             try:
                 async with self._session.request(method, url, **kwargs) as resp:
-                    elapsed = round((time.time() - t0) * 1000)
+                    self._governor.update_from_headers(resp.headers)
                     body = await resp.json(content_type=None)
+                    elapsed = (time.perf_counter() - t0) * 1000
+                    self._metrics.observe(metric_key, elapsed, error=resp.status >= 400)
                     log.debug(
                         f"[HTTP] {method} {url.split('?')[0]} "
-                        f"status={resp.status} {elapsed}ms"
+                        f"status={resp.status} {elapsed:.0f}ms"
                     )
+                    if resp.status >= 500:
+                        breaker.record_failure(f"HTTP {resp.status}")
+                    elif resp.status in _RATE_LIMIT_STATUSES:
+                        # Límite de peso, no avería: lo gestiona el gobernador
+                        breaker.release_probe()
+                        self._governor.on_rate_limited(resp.status, resp.headers)
+                    else:
+                        breaker.record_success()
                     if resp.status in _RETRY_CODES:
+                        if not self._should_retry(attempt, breaker, protective):
+                            break
                         wait = _BACKOFF_BASE ** attempt
                         log.warning(f"HTTP {resp.status} → reintento {attempt} en {wait:.1f}s")
                         await asyncio.sleep(wait)
@@ -171,17 +614,55 @@ class OrderManager:
                     if resp.status >= 400:
                         code = body.get("code", resp.status) if isinstance(body, dict) else resp.status
                         msg  = body.get("msg",  str(body))   if isinstance(body, dict) else str(body)
+                        if code in _FILTER_ERROR_CODES:
+                            self._exinfo.request_refresh(f"error {code}")
                         raise BinanceError(code, msg)
                     return body
             except BinanceError:
                 raise
+            except asyncio.CancelledError:
+                breaker.release_probe()
+                raise
             except Exception as e:
                 last_exc = e
+                self._metrics.error(metric_key)
+                breaker.record_failure(f"{type(e).__name__}: {e}")
+                if not self._should_retry(attempt, breaker, protective):
+                    break
                 wait = _BACKOFF_BASE ** attempt
                 log.warning(f"Request error (attempt {attempt}): {e} → retry in {wait:.1f}s")
                 await asyncio.sleep(wait)
         raise last_exc or RuntimeError(f"Request falló tras {_MAX_RETRIES} intentos")
 
+    @staticmethod
+    def _should_retry(attempt: int, breaker: CircuitBreaker, protective: bool) -> bool:
+        """Sin reintentos tras el último intento ni, salvo protectoras, con el circuito abierto."""
+        if attempt >= _MAX_RETRIES:
+            return False
+        return protective or breaker.state == CLOSED
+
+    # ──────────────────────────────────────────────────────────────────
+    # Registro de tipo de orden (regular / algo)
+    # ──────────────────────────────────────────────────────────────────
+
+    def _remember_order_kind(self, order_id: Any, kind: str):
+        try:
+            oid = int(order_id)
+        except (TypeError, ValueError):
+            return
+        self._order_kinds.pop(oid, None)
+        self._order_kinds[oid] = kind
+        if len(self._order_kinds) > _ORDER_KINDS_MAX:
+            # Las más antiguas primero (orden de inserción)
+            for old in list(self._order_kinds)[:len(self._order_kinds) - _ORDER_KINDS_MAX]:
+                del self._order_kinds[old]
+
+    def _remember_order_kinds(self, orders: list, kind: str) -> list:
+        for o in orders:
+            if isinstance(o, dict):
+                self._remember_order_kind(o.get("algoId") or o.get("orderId"), kind)
+        return orders
+
     # ──────────────────────────────────────────────────────────────────
     # Account / Info
     # ──────────────────────────────────────────────────────────────────
@@ -206,24 +687,23 @@ class OrderManager:
         return data if isinstance(data, dict) else {}
 
     async def get_exchange_info(self, symbol: str) -> dict:
-        """Retorna tickSize, stepSize, minQty, minNotional para el símbolo."""
-        if symbol in self._exinfo_cache:
-            return self._exinfo_cache[symbol]
-        data = await self._get("/fapi/v1/exchangeInfo")
-        for s in data.get("symbols", []):
-            if s["symbol"] != symbol:
-                continue
-            filters = {f["filterType"]: f for f in s.get("filters", [])}
-            info = {
-                "tick_size":    float(filters.get("PRICE_FILTER", {}).get("tickSize",    "0.0001")),
-                "step_size":    float(filters.get("LOT_SIZE",     {}).get("stepSize",    "0.001")),
-                "min_qty":      float(filters.get("LOT_SIZE",     {}).get("minQty",      "0.001")),
-                "min_notional": float(filters.get("MIN_NOTIONAL", {}).get("notional",    "5")),
-            }
-            self._exinfo_cache[symbol] = info
-            log.debug(f"ExchangeInfo {symbol}: {info}")
+        """
+        Retorna tickSize, stepSize, minQty, minNotional para el símbolo desde
+        el registro local. Solo descarga exchangeInfo si el símbolo no está
+        (listado nuevo o registro vacío).
+        """
+        info = self._exinfo.get(symbol)
+        if info is not None:
             return info
-        raise ValueError(f"Símbolo {symbol} no encontrado en exchangeInfo")
+        log.info(f"ExchangeInfo: {symbol} no está en el registro, refrescando")
+        await self._exinfo.refresh()
+        info = self._exinfo.get(symbol)
+        if info is None:
+            raise ValueError(f"Símbolo {symbol} no encontrado en exchangeInfo")
+        return info
+
+    async def _fetch_exchange_info(self) -> dict:
+        return await self._get("/fapi/v1/exchangeInfo")
 
     async def set_leverage(self, symbol: str, leverage: int) -> dict:
         log.info(f"Configurando leverage {leverage}x para {symbol}")
@@ -241,24 +721,53 @@ class OrderManager:
             else:
                 raise
 
+    async def get_book(self, symbol: str) -> Tuple[float, float]:
+        """(bid, ask) del símbolo: del stream si está fresco, si no de REST/caché."""
+        quote = self._prices.book(symbol)
+        if quote is not None:
+            return quote
+        return await self._market.book(symbol)
+
     async def get_best_bid(self, symbol: str) -> float:
-        data = await self._get("/fapi/v1/ticker/bookTicker", {"symbol": symbol})
-        return float(data["bidPrice"])
+        return (await self.get_book(symbol))[0]
 
     async def get_best_ask(self, symbol: str) -> float:
-        data = await self._get("/fapi/v1/ticker/bookTicker", {"symbol": symbol})
-        return float(data["askPrice"])
+        return (await self.get_book(symbol))[1]
 
     async def get_mark_price(self, symbol: str) -> float:
-        data = await self._get("/fapi/v1/premiumIndex", {"symbol": symbol})
-        return float(data["markPrice"])
+        mark = self._prices.mark(symbol)
+        if mark is not None:
+            return mark
+        return await self._market.mark(symbol)
+
+    async def get_mark_prices(self, symbols: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """Mark prices de varios símbolos (todos si symbols es None, siempre por REST)."""
+        if symbols is None:
+            return await self._market.marks(None)
+        out: Dict[str, float] = {}
+        missing = []
+        for symbol in dict.fromkeys(symbols):
+            mark = self._prices.mark(symbol)
+            if mark is not None:
+                out[symbol] = mark
+            else:
+                missing.append(symbol)
+        if missing:
+            out.update(await self._market.marks(missing))
+        return out
 
     async def get_last_closed_kline(self, symbol: str, interval: str = "5m") -> dict:
         """
         Devuelve la última vela cerrada para el símbolo/intervalo.
         Binance suele devolver también la vela actual abierta como último
-        elemento, por eso pedimos limit=2 y usamos la penúltima.
+        elemento, por eso pedimos limit=2 y usamos la penúltima. Si el stream
+        kline del símbolo tiene ya esa vela, no se consulta REST.
         """
+        kline = self._prices.closed_kline(
+            symbol, interval, time.time() * 1000 + self._time_offset_ms
+        )
+        if kline is not None:
+            return dict(kline)
         data = await self._get(
             "/fapi/v1/klines",
             {"symbol": symbol, "interval": interval, "limit": 2},
@@ -296,14 +805,21 @@ class OrderManager:
                 return p
         return None
 
-    async def get_all_positions(self) -> list:
-        """Devuelve todas las posiciones abiertas (positionAmt != 0)."""
+    async def get_all_positions(self, max_age_s: float = 0.0) -> list:
+        """
+        Devuelve todas las posiciones abiertas (positionAmt != 0). Con
+        max_age_s > 0 acepta la foto compartida si no es más antigua.
+        """
+        return await self._account.get(POSITIONS, max_age_s)
+
+    async def _fetch_all_positions(self) -> list:
         data = await self._get("/fapi/v2/positionRisk", {}, signed=True)
         return [p for p in data if float(p.get("positionAmt", 0)) != 0]
 
     async def get_open_orders(self, symbol: str) -> list:
-        return await self._get("/fapi/v1/openOrders",
+        data = await self._get("/fapi/v1/openOrders",
                                {"symbol": symbol}, signed=True)
+        return self._remember_order_kinds(data if isinstance(data, list) else [], "regular")
 
     async def get_open_algo_orders(self, symbol: str) -> list:
         """
@@ -318,28 +834,36 @@ class OrderManager:
             for o in orders:
                 if "algoId" in o and "orderId" not in o:
                     o["orderId"] = o["algoId"]
-            return orders
+            return self._remember_order_kinds(orders, "algo")
         except BinanceError as e:
             log.debug(f"get_open_algo_orders({symbol}): {e}")
             return []
 
-    async def get_all_open_orders(self) -> list:
+    async def get_all_open_orders(self, max_age_s: float = 0.0) -> list:
         """Obtiene TODAS las órdenes regulares abiertas en la cuenta (sin filtro de símbolo)."""
-        return await self._get("/fapi/v1/openOrders", signed=True)
+        return await self._account.get(OPEN_ORDERS, max_age_s)
+
+    async def _fetch_all_open_orders(self) -> list:
+        data = await self._get("/fapi/v1/openOrders", signed=True)
+        return self._remember_order_kinds(data if isinstance(data, list) else [], "regular")
 
-    async def get_all_open_algo_orders(self) -> list:
+    async def get_all_open_algo_orders(self, max_age_s: float = 0.0) -> list:
         """Obtiene TODAS las órdenes algo (condicionales) abiertas en la cuenta."""
         try:
-            data = await self._get("/fapi/v1/openAlgoOrders", signed=True)
-            orders = data if isinstance(data, list) else data.get("orders", [])
-            for o in orders:
-                if "algoId" in o and "orderId" not in o:
-                    o["orderId"] = o["algoId"]
-            return orders
+            return await self._account.get(ALGO_ORDERS, max_age_s)
         except BinanceError as e:
+            # El error no se guarda en la foto: la siguiente lectura reintenta
             log.debug(f"get_all_open_algo_orders: {e}")
             return []
 
+    async def _fetch_all_open_algo_orders(self) -> list:
+        data = await self._get("/fapi/v1/openAlgoOrders", signed=True)
+        orders = data if isinstance(data, list) else data.get("orders", [])
+        for o in orders:
+            if "algoId" in o and "orderId" not in o:
+                o["orderId"] = o["algoId"]
+        return self._remember_order_kinds(orders, "algo")
+
     # ──────────────────────────────────────────────────────────────────
     # Quantity calculation
     # ──────────────────────────────────────────────────────────────────
@@ -420,20 +944,94 @@ class OrderManager:
 
     async def cancel_order(self, symbol: str, order_id: int) -> dict:
         """
-        Cancela una orden. Si Binance devuelve -2011 (orden no encontrada
-        en /fapi/v1/order), reintenta con /fapi/v1/algoOrder usando algoId.
+        Cancela una orden. Si se sabe que es algo, va directa a
+        /fapi/v1/algoOrder. Si no, prueba /fapi/v1/order y, ante -2011 (orden
+        no encontrada), reintenta con /fapi/v1/algoOrder usando algoId.
         """
-        log.info(f"[CANCEL] {symbol} orderId={order_id}")
+        order_id = int(order_id)
+        kind = self._order_kinds.get(order_id)
+        log.info(f"[CANCEL] {symbol} orderId={order_id}"
+                 f"{f' ({kind})' if kind else ''}")
+        if kind == "algo":
+            try:
+                result = await self._delete("/fapi/v1/algoOrder",
+                                            {"symbol": symbol, "algoId": order_id})
+            except BinanceError as e:
+                if e.code != -2011:
+                    raise
+                # Registro equivocado: probar como orden regular
+                log.debug(f"[CANCEL] algoId={order_id} no encontrado, "
+                          f"intentando /fapi/v1/order")
+                result = await self._delete("/fapi/v1/order",
+                                            {"symbol": symbol, "orderId": order_id})
+            self._order_kinds.pop(order_id, None)
+            return result
         try:
-            return await self._delete("/fapi/v1/order",
-                                      {"symbol": symbol, "orderId": order_id})
+            result = await self._delete("/fapi/v1/order",
+                                        {"symbol": symbol, "orderId": order_id})
         except BinanceError as e:
             if e.code == -2011:
                 log.debug(f"[CANCEL] orderId={order_id} no en /fapi/v1/order, "
                           f"intentando /fapi/v1/algoOrder algoId={order_id}")
-                return await self._delete("/fapi/v1/algoOrder",
-                                          {"symbol": symbol, "algoId": order_id})
-            raise
+                result = await self._delete("/fapi/v1/algoOrder",
+                                            {"symbol": symbol, "algoId": order_id})
+            else:
+                raise
+        self._order_kinds.pop(order_id, None)
+        return result
+
+    async def cancel_orders(self,
+                            symbol: str,
+                            order_ids: Iterable[int],
+                            algo_ids: Iterable[int] = ()) -> Dict[int, Union[dict, BinanceError]]:
+        """
+        Cancela varias órdenes de un símbolo. Las regulares van en lotes por
+        /fapi/v1/batchOrders; las algo (y las regulares que respondan -2011)
+        por /fapi/v1/algoOrder en paralelo. Devuelve orderId → respuesta o
+        BinanceError por orden, sin lanzar por fallos individuales.
+        """
+        order_ids = list(dict.fromkeys(int(oid) for oid in order_ids))
+        algo_ids = list(dict.fromkeys(int(aid) for aid in algo_ids))
+        algo_ids += [oid for oid in order_ids
+                     if self._order_kinds.get(oid) == "algo" and oid not in algo_ids]
+        order_ids = [oid for oid in order_ids if oid not in algo_ids]
+        results: Dict[int, Union[dict, BinanceError]] = {}
+        not_found: List[int] = []
+        if order_ids or algo_ids:
+            log.info(f"[CANCEL_BATCH] {symbol} orderIds={order_ids} algoIds={algo_ids}")
+
+        async def _cancel_chunk(chunk: List[int]):
+            try:
+                items = await self._delete("/fapi/v1/batchOrders", {
+                    "symbol": symbol,
+                    "orderIdList": json.dumps(chunk, separators=(",", ":")),
+                })
+            except BinanceError as e:
+                items = [e] * len(chunk)
+            for oid, item in zip(chunk, _batch_items(items, len(chunk))):
+                if isinstance(item, BinanceError) and item.code == -2011:
+                    not_found.append(oid)
+                else:
+                    results[oid] = item
+
+        async def _cancel_algo(aid: int):
+            try:
+                results[aid] = await self._delete("/fapi/v1/algoOrder",
+                                                  {"symbol": symbol, "algoId": aid})
+            except BinanceError as e:
+                results[aid] = e
+
+        await asyncio.gather(
+            *(_cancel_chunk(order_ids[i:i + _BATCH_CANCEL_MAX])
+              for i in range(0, len(order_ids), _BATCH_CANCEL_MAX)),
+            *(_cancel_algo(aid) for aid in algo_ids),
+        )
+        # Igual que cancel_order(): -2011 en /order → probar como algoId
+        await asyncio.gather(*(_cancel_algo(oid) for oid in not_found))
+        for oid, result in results.items():
+            if not isinstance(result, BinanceError):
+                self._order_kinds.pop(oid, None)
+        return results
 
     async def get_order(self, symbol: str, order_id: int) -> dict:
         return await self._get("/fapi/v1/order",
@@ -622,3 +1220,30 @@ class BinanceError(Exception):
         self.code = code
         self.msg  = msg
         super().__init__(f"Binance error {code}: {msg}")
+
+
+def _discard_result(task: asyncio.Task):
+    if not task.cancelled():
+        task.exception()
+
+
+def _nodelay_socket(addr_info) -> socket.socket:
+    family, type_, proto, _, _ = addr_info
+    sock = socket.socket(family=family, type=type_, proto=proto)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+def _batch_items(items: Any, expected: int) -> List[Union[dict, BinanceError]]:
+    """Respuesta de batchOrders → dict por orden o BinanceError si ese elemento falló."""
+    if not isinstance(items, list):
+        items = []
+    out: List[Union[dict, BinanceError]] = []
+    for item in items[:expected]:
+        if isinstance(item, dict) and "code" in item and "orderId" not in item:
+            out.append(BinanceError(item.get("code"), item.get("msg", str(item))))
+        else:
+            out.append(item)
+    while len(out) < expected:
+        out.append(BinanceError(-1, "Respuesta de batchOrders incompleta"))
+    return out
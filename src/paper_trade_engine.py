@@ -19,12 +19,13 @@ from .config import Config
 from .logger import get_logger
 from .models import Event, EventType, ExitType, Signal, Trade, TradeStatus
 from .order_manager import OrderManager
-from .state import StateDB
+from .rate_limiter import background_requests
+from .state import StateDB, parse_close_ts
 
 log = get_logger("paper_trade_engine")
 
 OnEventCallback = Callable[[Event], Awaitable[None]]
-PAPER_TRADE_ENGINE_VERSION = "0.24"
+PAPER_TRADE_ENGINE_VERSION = "0.26"
 _PAPER_KLINE_INTERVAL_S = 300
 _PAPER_KLINE_GRACE_S = 10
 _KLINE_WARNING_INTERVAL_S = 300.0
@@ -48,6 +49,8 @@ class PaperTradeEngine:
         self._last_pair_candle_close_ms: Dict[str, int] = {}
         self._pair_kline_failures: Dict[str, dict] = {}
         self._session_started_at: Optional[str] = None
+        # Cuarentena: ultimo cierre paper por par (precargado en start, actualizado al cerrar)
+        self._last_close_by_pair: Dict[str, datetime] = {}
 
     @property
     def session_started_at(self) -> Optional[str]:
@@ -93,6 +96,7 @@ class PaperTradeEngine:
     async def start(self):
         if self._session_started_at is None:
             self._session_started_at = datetime.now(timezone.utc).isoformat()
+        await self._load_quarantine_index()
         self._timeout_task = asyncio.create_task(self._timeout_loop(), name="paper_timeout_checker")
         self._candle_task = asyncio.create_task(self._candle_loop(), name="paper_candle_checker")
         log.info(
@@ -100,6 +104,23 @@ class PaperTradeEngine:
             f"(friction_pct={self._cfg.paper_friction_pct:.4f}%)"
         )
 
+    async def _load_quarantine_index(self):
+        try:
+            loaded = await self._db.get_last_closed_times(paper=True)
+        except Exception as e:
+            log.error(f"No se pudo precargar el índice de cuarentena paper: {e}")
+            return
+        for pair, ts in loaded.items():
+            self._remember_pair_close(pair, ts)
+        log.info(f"Índice de cuarentena paper precargado: {len(loaded)} pares")
+
+    def _remember_pair_close(self, pair: str, ts: Optional[datetime]):
+        if ts is None:
+            return
+        previous = self._last_close_by_pair.get(pair)
+        if previous is None or ts > previous:
+            self._last_close_by_pair[pair] = ts
+
     async def stop(self):
         for task in (self._timeout_task, self._candle_task):
             if task:
@@ -196,11 +217,9 @@ class PaperTradeEngine:
             return
 
         if self._cfg.quarantine_hours > 0:
-            last_closed = await self._db.get_last_paper_closed_time(sig.pair)
+            last_closed = self._last_close_by_pair.get(sig.pair)
             if last_closed:
                 now_utc = datetime.now(timezone.utc)
-                if last_closed.tzinfo is None:
-                    last_closed = last_closed.replace(tzinfo=timezone.utc)
                 hours_since = (now_utc - last_closed).total_seconds() / 3600.0
                 if hours_since < self._cfg.quarantine_hours:
                     log.info(
@@ -382,7 +401,8 @@ class PaperTradeEngine:
     async def _candle_loop(self):
         while True:
             try:
-                await self._check_paper_tp_sl()
+                with background_requests():
+                    await self._check_paper_tp_sl()
             except asyncio.CancelledError:
                 raise
             except Exception as e:
@@ -743,6 +763,7 @@ class PaperTradeEngine:
 
         trade.status = TradeStatus.CLOSED
         trade.touch()
+        self._remember_pair_close(trade.pair, parse_close_ts(trade.exit_fill_ts))
         await self._db.save_paper_trade(trade)
         self._trades.pop(trade.trade_id, None)
 
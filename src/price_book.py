@@ -0,0 +1,127 @@
+"""
+price_book.py - Precios en memoria alimentados por los streams de mercado.
+
+MarketStreamManager (market_stream.py) vuelca aquí, por cada símbolo suscrito:
+
+  <symbol>@markPrice@1s   mark price (llega cada segundo)
+  <symbol>@bookTicker     mejor bid/ask (llega en cada cambio)
+  <symbol>@kline_5m       última vela de 5m cerrada
+
+OrderManager consulta el libro antes que la API REST. Un símbolo se da por
+vivo si ha llegado cualquier mensaje suyo en los últimos max_age_ms: como el
+mark price llega cada segundo, un bookTicker sin cambios sigue siendo válido
+mientras el símbolo esté vivo. Si no lo está (sin suscripción, WS caído o
+retrasado), el llamador vuelve a REST.
+
+Una vela cerrada solo vale mientras no haya cerrado la siguiente.
+"""
+from __future__ import annotations
+
+import time
+from typing import Dict, Optional, Tuple
+
+from .logger import get_logger
+
+log = get_logger("price_book")
+PRICE_BOOK_VERSION = "0.01"
+
+_INTERVAL_MS = {
+    "1m": 60_000, "3m": 180_000, "5m": 300_000, "15m": 900_000,
+    "30m": 1_800_000, "1h": 3_600_000, "2h": 7_200_000, "4h": 14_400_000,
+}
+
+
+class PriceBook:
+    def __init__(self, max_age_ms: float = 3000.0):
+        self._max_age_s = max(0.0, max_age_ms) / 1000.0
+        self._books: Dict[str, Tuple[float, float]] = {}           # symbol → (bid, ask)
+        self._marks: Dict[str, float] = {}                          # symbol → mark
+        self._klines: Dict[Tuple[str, str], dict] = {}              # (symbol, interval) → vela
+        self._seen: Dict[str, float] = {}                           # symbol → último mensaje
+        self.hits = 0
+        self.misses = 0
+
+    # ──────────────────────────────────────────────────────────────────
+    # Lectura
+    # ──────────────────────────────────────────────────────────────────
+
+    def book(self, symbol: str) -> Optional[Tuple[float, float]]:
+        """(bid, ask) si el símbolo está vivo, o None."""
+        return self._count(self._books.get(symbol) if self._alive(symbol) else None)
+
+    def mark(self, symbol: str) -> Optional[float]:
+        return self._count(self._marks.get(symbol) if self._alive(symbol) else None)
+
+    def closed_kline(self, symbol: str, interval: str, now_ms: float) -> Optional[dict]:
+        """Última vela cerrada (formato de get_last_closed_kline) si sigue siendo la última."""
+        kline = self._klines.get((symbol, interval)) if self._alive(symbol) else None
+        span = _INTERVAL_MS.get(interval)
+        if kline is not None and (span is None or now_ms > kline["close_time"] + span):
+            kline = None
+        return self._count(kline)
+
+    def _alive(self, symbol: str) -> bool:
+        seen = self._seen.get(symbol)
+        return seen is not None and time.monotonic() - seen <= self._max_age_s
+
+    def _count(self, value):
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    # ──────────────────────────────────────────────────────────────────
+    # Actualización desde el stream
+    # ──────────────────────────────────────────────────────────────────
+
+    def apply(self, data: dict):
+        """Aplica el payload "data" de un mensaje del stream combinado."""
+        event_type = data.get("e")
+        symbol = data.get("s")
+        if not symbol:
+            return
+        try:
+            if event_type == "markPriceUpdate":
+                self._marks[symbol] = float(data["p"])
+            elif event_type == "bookTicker":
+                self._books[symbol] = (float(data["b"]), float(data["a"]))
+            elif event_type == "kline":
+                k = data["k"]
+                if not k.get("x"):
+                    # Vela en curso: solo confirma que el símbolo sigue vivo
+                    self._seen[symbol] = time.monotonic()
+                    return
+                self._klines[(symbol, k["i"])] = {
+                    "open_time": int(k["t"]),
+                    "open": float(k["o"]),
+                    "high": float(k["h"]),
+                    "low": float(k["l"]),
+                    "close": float(k["c"]),
+                    "close_time": int(k["T"]),
+                }
+            else:
+                return
+        except (KeyError, TypeError, ValueError) as e:
+            log.debug(f"Stream de mercado: evento {event_type} inválido para {symbol}: {e}")
+            return
+        self._seen[symbol] = time.monotonic()
+
+    def forget(self, symbol: str):
+        """Olvida un símbolo que deja de estar suscrito."""
+        self._books.pop(symbol, None)
+        self._marks.pop(symbol, None)
+        self._seen.pop(symbol, None)
+        for key in [k for k in self._klines if k[0] == symbol]:
+            del self._klines[key]
+
+    def clear(self):
+        """WS caído: nada de lo guardado sirve hasta que vuelvan los mensajes."""
+        self._books.clear()
+        self._marks.clear()
+        self._klines.clear()
+        self._seen.clear()
+
+    def snapshot(self) -> dict:
+        live = sum(1 for s in self._seen if self._alive(s))
+        return {"symbols": len(self._seen), "live": live, "hits": self.hits, "misses": self.misses}
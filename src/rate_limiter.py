@@ -0,0 +1,257 @@
+"""
+rate_limiter.py - Gobernador de peso de peticiones y ritmo de órdenes (Binance).
+
+Binance Futures limita por IP el peso usado por minuto (X-MBX-USED-WEIGHT-1M)
+y por cuenta el número de órdenes (X-MBX-ORDER-COUNT-10S / -1M). Superarlos da
+429 y, si se insiste, 418 (baneo temporal de IP).
+
+El gobernador lleva la cuenta localmente (peso estimado por endpoint) y la
+corrige con las cabeceras de cada respuesta. Antes de cada petición reserva su
+peso según la prioridad:
+
+  CRITICAL     órdenes: colocar, cancelar, TP/SL, cierres. Pueden usar todo
+               el cupo.
+  NORMAL       consultas del flujo de un trade (fills, book, posición).
+  LOW          tareas de fondo cuyo resultado hace falta: reconciliación,
+               klines de paper. Se quedan con menos cupo y esperan.
+  BEST_EFFORT  dashboard y avisos. Aún menos cupo y, si tendrían que esperar
+               demasiado, se descartan con RateLimitShed.
+
+La prioridad de órdenes se deduce del endpoint; el resto es NORMAL salvo que
+el código llamante marque su bloque con background_requests().
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import time
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Dict, Mapping, Optional
+
+from .logger import get_logger
+
+log = get_logger("rate_limiter")
+RATE_LIMITER_VERSION = "0.01"
+
+
+class Priority(IntEnum):
+    CRITICAL = 0
+    NORMAL = 1
+    LOW = 2
+    BEST_EFFORT = 3
+
+
+# Fracción del cupo por minuto que puede usar cada prioridad
+_WEIGHT_SHARE = {
+    Priority.CRITICAL: 1.0,
+    Priority.NORMAL: 0.85,
+    Priority.LOW: 0.7,
+    Priority.BEST_EFFORT: 0.6,
+}
+_ORDER_SHARE = 0.95
+# Espera máxima antes de descartar una petición BEST_EFFORT
+_SHED_MAX_WAIT_S = 5.0
+_POLL_S = 0.25
+
+_ORDER_PATHS = {
+    "/fapi/v1/order",
+    "/fapi/v1/algoOrder",
+    "/fapi/v1/batchOrders",
+    "/fapi/v1/allOpenOrders",
+}
+
+# Peso por endpoint: (con symbol, sin symbol)
+_ENDPOINT_WEIGHTS: Dict[str, tuple] = {
+    "/fapi/v1/exchangeInfo":      (1, 1),
+    "/fapi/v2/balance":           (5, 5),
+    "/fapi/v1/apiTradingStatus":  (1, 10),
+    "/fapi/v1/ticker/bookTicker": (2, 5),
+    "/fapi/v1/premiumIndex":      (1, 10),
+    "/fapi/v2/positionRisk":      (5, 5),
+    "/fapi/v1/openOrders":        (1, 40),
+    "/fapi/v1/openAlgoOrders":    (1, 40),
+    "/fapi/v1/userTrades":        (5, 5),
+    "/fapi/v1/batchOrders":       (5, 5),
+}
+
+_request_priority: contextvars.ContextVar[Optional[Priority]] = contextvars.ContextVar(
+    "request_priority", default=None
+)
+
+
+@contextmanager
+def background_requests(priority: Priority = Priority.LOW):
+    """Baja la prioridad de las peticiones REST del bloque (y de sus tareas hijas)."""
+    token = _request_priority.set(priority)
+    try:
+        yield
+    finally:
+        _request_priority.reset(token)
+
+
+def request_weight(method: str, path: str, params: Optional[Mapping] = None) -> int:
+    """Peso aproximado de una petición según la tabla pública de Binance."""
+    params = params or {}
+    if path == "/fapi/v1/klines":
+        limit = int(params.get("limit", 500) or 500)
+        if limit < 100:
+            return 1
+        if limit < 500:
+            return 2
+        return 5 if limit <= 1000 else 10
+    weights = _ENDPOINT_WEIGHTS.get(path)
+    if weights is None:
+        return 1
+    return weights[0] if params.get("symbol") else weights[1]
+
+
+def request_priority(method: str, path: str) -> Priority:
+    if method != "GET" and path in _ORDER_PATHS:
+        return Priority.CRITICAL
+    return _request_priority.get() or Priority.NORMAL
+
+
+class RateLimitShed(Exception):
+    """Petición de baja prioridad descartada para no acercarse al límite."""
+
+
+class RequestGovernor:
+    def __init__(self,
+                 weight_limit_1m: int = 2400,
+                 order_limit_10s: int = 300,
+                 order_limit_1m: int = 1200):
+        self._weight_limit = weight_limit_1m
+        self._order_limit_10s = order_limit_10s
+        self._order_limit_1m = order_limit_1m
+
+        self._weight_window = 0        # minuto epoch de la ventana actual
+        self._weight_used = 0
+        self._orders_10s_window = 0
+        self._orders_10s = 0
+        self._orders_1m_window = 0
+        self._orders_1m = 0
+        self._blocked_until = 0.0      # epoch; 429/418 con Retry-After
+        self._waiting: Dict[Priority, int] = {p: 0 for p in Priority}
+
+        self.shed_count = 0
+        self.weight_by_endpoint: Dict[str, int] = {}
+        self._warned_window = 0
+
+    # ──────────────────────────────────────────────────────────────────
+    # Reserva
+    # ──────────────────────────────────────────────────────────────────
+
+    async def acquire(self, method: str, path: str, params: Optional[Mapping] = None) -> Priority:
+        """Espera hasta que la petición quepa en su cupo. Devuelve la prioridad aplicada."""
+        priority = request_priority(method, path)
+        weight = request_weight(method, path, params)
+        is_order = priority == Priority.CRITICAL
+        deadline = time.monotonic() + _SHED_MAX_WAIT_S
+
+        self._waiting[priority] += 1
+        try:
+            while True:
+                wait = self._wait_time(weight, priority, is_order)
+                if wait <= 0:
+                    break
+                if priority == Priority.BEST_EFFORT and time.monotonic() + wait > deadline:
+                    self.shed_count += 1
+                    raise RateLimitShed(
+                        f"{method} {path} descartada: peso {self._weight_used}/{self._weight_limit}"
+                    )
+                await asyncio.sleep(min(wait, _POLL_S))
+        finally:
+            self._waiting[priority] -= 1
+
+        self._weight_used += weight
+        if is_order:
+            self._orders_10s += 1
+            self._orders_1m += 1
+        self.weight_by_endpoint[path] = self.weight_by_endpoint.get(path, 0) + weight
+        return priority
+
+    def _wait_time(self, weight: int, priority: Priority, is_order: bool) -> float:
+        now = time.time()
+        self._roll_windows(now)
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        # Una prioridad mayor esperando tiene preferencia
+        if any(self._waiting[p] for p in Priority if p < priority):
+            return _POLL_S
+
+        cap = self._weight_limit * _WEIGHT_SHARE[priority]
+        if self._weight_used + weight > cap:
+            if self._warned_window != self._weight_window:
+                self._warned_window = self._weight_window
+                log.warning(
+                    f"Peso Binance {self._weight_used}/{self._weight_limit}: "
+                    f"retrasando peticiones {priority.name}"
+                )
+            return (self._weight_window + 1) * 60 - now
+
+        if is_order:
+            if self._orders_10s + 1 > self._order_limit_10s * _ORDER_SHARE:
+                return (self._orders_10s_window + 1) * 10 - now
+            if self._orders_1m + 1 > self._order_limit_1m * _ORDER_SHARE:
+                return (self._orders_1m_window + 1) * 60 - now
+        return 0.0
+
+    def _roll_windows(self, now: float):
+        minute = int(now // 60)
+        if minute != self._weight_window:
+            self._weight_window = minute
+            self._weight_used = 0
+        if minute != self._orders_1m_window:
+            self._orders_1m_window = minute
+            self._orders_1m = 0
+        ten_s = int(now // 10)
+        if ten_s != self._orders_10s_window:
+            self._orders_10s_window = ten_s
+            self._orders_10s = 0
+
+    # ──────────────────────────────────────────────────────────────────
+    # Respuestas
+    # ──────────────────────────────────────────────────────────────────
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """Sincroniza la cuenta local con las cabeceras X-MBX-* de Binance."""
+        self._roll_windows(time.time())
+        used = _header_int(headers, "X-MBX-USED-WEIGHT-1M")
+        if used is not None:
+            self._weight_used = max(self._weight_used, used)
+        orders_10s = _header_int(headers, "X-MBX-ORDER-COUNT-10S")
+        if orders_10s is not None:
+            self._orders_10s = max(self._orders_10s, orders_10s)
+        orders_1m = _header_int(headers, "X-MBX-ORDER-COUNT-1M")
+        if orders_1m is not None:
+            self._orders_1m = max(self._orders_1m, orders_1m)
+
+    def on_rate_limited(self, status: int, headers: Mapping[str, str]):
+        """429/418: bloquea todas las peticiones durante Retry-After."""
+        retry_after = _header_int(headers, "Retry-After")
+        if retry_after is None:
+            retry_after = 60 if status == 418 else 5
+        self._blocked_until = max(self._blocked_until, time.time() + retry_after)
+        log.error(f"Binance HTTP {status}: peticiones en pausa {retry_after}s")
+
+    def snapshot(self) -> dict:
+        self._roll_windows(time.time())
+        return {
+            "weight_used_1m": self._weight_used,
+            "weight_limit_1m": self._weight_limit,
+            "orders_10s": self._orders_10s,
+            "orders_1m": self._orders_1m,
+            "blocked_s": max(0.0, round(self._blocked_until - time.time(), 1)),
+            "shed": self.shed_count,
+        }
+
+
+def _header_int(headers: Mapping[str, str], name: str) -> Optional[int]:
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
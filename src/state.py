@@ -1,22 +1,41 @@
 """
 state.py - Persistencia SQLite asincrona (aiosqlite).
 Tabla trades + tabla paper_trades + tabla events. Recuperacion tras reinicio.
+
+Escrituras write-behind: save_trade / save_paper_trade / save_event encolan
+la mutacion y una tarea de fondo las agrupa en una sola transaccion por
+ventana (database.write_batch_ms / database.write_batch_max). flush() es la
+barrera explicita para shutdown o rutas que necesiten durabilidad; las
+lecturas hacen flush previo si hay escrituras pendientes.
+
+Esquema versionado con PRAGMA user_version (_SCHEMA_MIGRATIONS); al arrancar
+se registra el EXPLAIN QUERY PLAN de las consultas calientes.
+
+El resumen del dashboard (get_dashboard_summary) se sirve de contadores en
+memoria que se cargan una vez al arrancar y se actualizan en cada save.
+
+Con database.archive_after_days > 0 los trades terminales antiguos y sus
+eventos se mueven a ficheros mensuales (archive.py); en la DB caliente quedan
+sus agregados en trade_rollups. El historico consulta ambos niveles.
 """
 from __future__ import annotations
 
+import asyncio
 import json
-from datetime import datetime, timezone
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 import aiosqlite
 
+from .archive import TradeArchive
 from .config import Config
 from .logger import get_logger
 from .models import Event, Trade, TradeStatus
 
 log = get_logger("state")
-STATE_VERSION = "0.16"
+STATE_VERSION = "0.26"
 
 
 _CREATE_TRADE_TABLE_TEMPLATE = """
@@ -63,11 +82,355 @@ CREATE TABLE IF NOT EXISTS events (
 )
 """
 
+# Campos de la señal guardados como columnas tipadas (clave en signal_data,
+# columna, tipo). "pair" y "rank" se derivan de trade.pair y de "top".
+_SIGNAL_COLUMNS = (
+    ("fecha_hora",   "sig_fecha_hora",   "TEXT"),
+    ("top",          "sig_top",          "INTEGER"),
+    ("close",        "sig_close",        "REAL"),
+    ("mom_1h_pct",   "sig_mom_1h_pct",   "REAL"),
+    ("mom_pct",      "sig_mom_pct",      "REAL"),
+    ("vol_ratio",    "sig_vol_ratio",    "REAL"),
+    ("trades_ratio", "sig_trades_ratio", "REAL"),
+    ("quintil",      "sig_quintil",      "INTEGER"),
+    ("bp",           "sig_bp",           "REAL"),
+    ("categoria",    "sig_categoria",    "TEXT"),
+)
+_SIGNAL_KEYS = tuple(key for key, _, _ in _SIGNAL_COLUMNS)
+_SIGNAL_DERIVED_KEYS = ("pair", "rank")
+
+# Columnas que cambian durante el ciclo de vida: el UPDATE toca solo las que
+# Trade marca como modificadas desde el ultimo persist (Trade.dirty_fields)
+_LIFECYCLE_COLUMNS = (
+    "status",
+    "entry_order_id", "entry_quantity", "entry_price", "entry_fill_ts",
+    "tp_order_id", "tp_trigger_price", "tp_price",
+    "sl_order_id", "sl_trigger_price", "sl_price",
+    "exit_price", "exit_fill_ts", "exit_type",
+    "pnl_pct", "pnl_usdt", "fees_usdt",
+    "error_message", "updated_at", "timeout_triggered", "reconciled",
+)
+_LIFECYCLE_FIELDS = frozenset(_LIFECYCLE_COLUMNS)
+_TOUCH_ONLY_FIELDS = frozenset({"updated_at"})
+_INSERT_COLUMNS = (
+    "trade_id", "pair", "signal_ts", "created_at",
+    *_LIFECYCLE_COLUMNS,
+    "signal_data",
+    *(col for _, col, _ in _SIGNAL_COLUMNS),
+)
+
+# Estados terminales como literales SQL: los indices parciales solo se usan si
+# el WHERE de la consulta implica el del indice, y con parametros enlazados
+# SQLite no puede demostrarlo.
+_TERMINAL_STATUS_SQL = ",".join(
+    f"'{s.value}'" for s in (TradeStatus.CLOSED, TradeStatus.NOT_EXECUTED, TradeStatus.ERROR)
+)
+_TERMINAL_ORDER_EXPR = "COALESCE(exit_fill_ts, updated_at, created_at)"
+
+_TRADE_TABLES = ("trades", "paper_trades")
+
+
+def _trade_table_indexes_v1(table: str) -> List[str]:
+    return [
+        # Cuarentena: ultimo cierre por par
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_pair_closed "
+        f"ON {table}(pair, exit_fill_ts) WHERE status = 'closed'",
+        # Trades activos (recuperacion tras reinicio / dashboard)
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_active "
+        f"ON {table}(status) WHERE status NOT IN ({_TERMINAL_STATUS_SQL})",
+        # Terminales recientes ordenados por fecha efectiva de cierre
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_terminal_ts "
+        f"ON {table}({_TERMINAL_ORDER_EXPR}) WHERE status IN ({_TERMINAL_STATUS_SQL})",
+        # Historico / listados por fecha de creacion
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_created "
+        f"ON {table}(created_at)",
+    ]
+
+
+def _signal_columns_v4(table: str) -> List[str]:
+    remove_paths = ", ".join(
+        f"'$.{key}'" for key in (*_SIGNAL_KEYS, *_SIGNAL_DERIVED_KEYS)
+    )
+    valid = "signal_data IS NOT NULL AND json_valid(signal_data)"
+    return [
+        *[f"ALTER TABLE {table} ADD COLUMN {col} {decl}" for _, col, decl in _SIGNAL_COLUMNS],
+        f"UPDATE {table} SET "
+        + ", ".join(f"{col} = json_extract(signal_data, '$.{key}')" for key, col, _ in _SIGNAL_COLUMNS)
+        + f" WHERE {valid}",
+        # En signal_data solo quedan claves no estandar (normalmente ninguna)
+        f"UPDATE {table} SET signal_data = NULLIF(json_remove(signal_data, {remove_paths}), '{{}}') "
+        f"WHERE {valid}",
+    ]
+
+
+# Migraciones de esquema versionadas (PRAGMA user_version). Cada entrada se
+# aplica una sola vez, en orden, y deja user_version en su numero.
+_SCHEMA_MIGRATIONS: List[tuple] = [
+    (
+        1,
+        "indices de eventos por trade, cuarentena, activos, terminales e historico",
+        [
+            "CREATE INDEX IF NOT EXISTS idx_events_trade ON events(trade_id, event_id)",
+            *[stmt for table in _TRADE_TABLES for stmt in _trade_table_indexes_v1(table)],
+        ],
+    ),
+    (
+        2,
+        "indice (created_at, trade_id) para la paginacion por cursor del historico",
+        [
+            stmt
+            for table in _TRADE_TABLES
+            for stmt in (
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_created_id ON {table}(created_at, trade_id)",
+                f"DROP INDEX IF EXISTS idx_{table}_created",
+            )
+        ],
+    ),
+    (
+        3,
+        "tabla trade_rollups (agregados diarios por par de los trades archivados)",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS trade_rollups (
+                source              TEXT NOT NULL,
+                day                 TEXT NOT NULL,
+                pair                TEXT NOT NULL,
+                entries_count       INTEGER NOT NULL DEFAULT 0,
+                closed_count        INTEGER NOT NULL DEFAULT 0,
+                win_count           INTEGER NOT NULL DEFAULT 0,
+                pnl_usdt            REAL NOT NULL DEFAULT 0,
+                fees_usdt           REAL NOT NULL DEFAULT 0,
+                not_executed_count  INTEGER NOT NULL DEFAULT 0,
+                error_count         INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (source, day, pair)
+            )
+            """,
+        ],
+    ),
+    (
+        4,
+        "campos de la señal como columnas tipadas sig_*",
+        [stmt for table in _TRADE_TABLES for stmt in _signal_columns_v4(table)],
+    ),
+]
+
+
+# Esquema de cada fichero mensual del archivo (mismas tablas que la DB caliente)
+_ARCHIVE_SCHEMA = [
+    _CREATE_TRADES,
+    _CREATE_PAPER_TRADES,
+    _CREATE_EVENTS,
+    "CREATE INDEX IF NOT EXISTS idx_events_trade ON events(trade_id, event_id)",
+    *[
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_created_id ON {table}(created_at, trade_id)"
+        for table in _TRADE_TABLES
+    ],
+]
+_ARCHIVE_COLUMNS = {
+    table: [(col, decl) for _, col, decl in _SIGNAL_COLUMNS] for table in _TRADE_TABLES
+}
+_ARCHIVE_BATCH = 500
+_ARCHIVE_FIRST_RUN_DELAY_S = 60.0
+_EVENT_COLUMNS = ("event_id", "trade_id", "event_type", "details", "timestamp")
+
+_ROLLUP_UPSERT_SQL = """
+    INSERT INTO trade_rollups (
+        source, day, pair, entries_count, closed_count, win_count,
+        pnl_usdt, fees_usdt, not_executed_count, error_count
+    ) VALUES (?,?,?,?,?,?,?,?,?,?)
+    ON CONFLICT(source, day, pair) DO UPDATE SET
+        entries_count      = entries_count + excluded.entries_count,
+        closed_count       = closed_count + excluded.closed_count,
+        win_count          = win_count + excluded.win_count,
+        pnl_usdt           = pnl_usdt + excluded.pnl_usdt,
+        fees_usdt          = fees_usdt + excluded.fees_usdt,
+        not_executed_count = not_executed_count + excluded.not_executed_count,
+        error_count        = error_count + excluded.error_count
+"""
+
+
+_ACTIVE_STATUSES = frozenset(
+    s.value for s in (
+        TradeStatus.OPEN,
+        TradeStatus.OPENING,
+        TradeStatus.SIGNAL_RECEIVED,
+        TradeStatus.CLOSING,
+    )
+)
+
+_SUMMARY_KEYS = (
+    "open_total",
+    "open_today",
+    "entries_total",
+    "entries_today",
+    "closed_total",
+    "wins_total",
+    "pnl_total",
+    "closed_today",
+    "wins_today",
+    "pnl_today",
+    "closed_today_non_manual",
+    "wins_today_non_manual",
+)
+_SUMMARY_FLOAT_KEYS = frozenset({"pnl_total", "pnl_today"})
+
+_SUMMARY_COLUMNS = (
+    "trade_id, status, entry_fill_ts, created_at, exit_fill_ts, "
+    "updated_at, exit_type, pnl_usdt, fees_usdt"
+)
+
+
+class _SummaryCounters:
+    """
+    Contadores del resumen del dashboard para una tabla de trades, mantenidos
+    incrementalmente en cada save. Equivalen a _get_dashboard_summary_from_table:
+    guardan por trade solo los campos que afectan al resumen y aplican el delta
+    de su contribucion. Los contadores "today" se recalculan en memoria al
+    cambiar el dia UTC. Los trades archivados aportan sus totales como base
+    fija (trade_rollups).
+    """
+
+    def __init__(self, net_of_fees: bool):
+        self._net_of_fees = net_of_fees
+        self._rows: Dict[str, tuple] = {}
+        self._base: Dict[str, float] = dict.fromkeys(_SUMMARY_KEYS, 0)
+        self._values: Dict[str, float] = dict.fromkeys(_SUMMARY_KEYS, 0)
+        self._day = _utc_day()
+
+    def reset(self, rows, base: Optional[dict] = None):
+        self._rows = {}
+        for r in rows:
+            self._rows[r[0]] = self._summary_row(*r[1:])
+        self._base = dict.fromkeys(_SUMMARY_KEYS, 0)
+        for key, value in (base or {}).items():
+            self._base[key] = value or 0
+        self._recompute(_utc_day())
+
+    def archive(self, trade_id: str):
+        """El trade sale de la DB caliente: su contribucion pasa a la base fija."""
+        row = self._rows.pop(trade_id, None)
+        if row is None:
+            return
+        # Un trade archivado ya no es "de hoy": solo aporta a los totales
+        for key, value in zip(_SUMMARY_KEYS, self._contribution(row, "-")):
+            if value:
+                self._base[key] += value
+
+    def apply(self, trade: Trade):
+        today = self._check_rollover()
+        new_row = self._summary_row(
+            trade.status.value,
+            trade.entry_fill_ts,
+            trade.created_at,
+            trade.exit_fill_ts,
+            trade.updated_at,
+            trade.exit_type,
+            trade.pnl_usdt,
+            trade.fees_usdt,
+        )
+        old_row = self._rows.get(trade.trade_id)
+        if old_row == new_row:
+            return
+        if old_row is not None:
+            self._add(self._contribution(old_row, today), -1)
+        self._add(self._contribution(new_row, today), 1)
+        self._rows[trade.trade_id] = new_row
+
+    def snapshot(self) -> dict:
+        self._check_rollover()
+        return {
+            k: (float(v) if k in _SUMMARY_FLOAT_KEYS else int(v))
+            for k, v in self._values.items()
+        }
+
+    def _check_rollover(self) -> str:
+        today = _utc_day()
+        if today != self._day:
+            self._recompute(today)
+        return today
+
+    def _recompute(self, today: str):
+        self._values = dict(self._base)
+        for row in self._rows.values():
+            self._add(self._contribution(row, today), 1)
+        self._day = today
+
+    def _add(self, contribution: tuple, sign: int):
+        for key, value in zip(_SUMMARY_KEYS, contribution):
+            if value:
+                self._values[key] += sign * value
+
+    def _summary_row(self, status, entry_fill_ts, created_at, exit_fill_ts,
+                     updated_at, exit_type, pnl_usdt, fees_usdt) -> tuple:
+        if pnl_usdt is None:
+            pnl = 0.0
+        elif self._net_of_fees:
+            pnl = float(pnl_usdt) - float(fees_usdt or 0.0)
+        else:
+            pnl = float(pnl_usdt)
+        return (
+            status,
+            (entry_fill_ts or created_at or "")[:10],
+            entry_fill_ts[:10] if entry_fill_ts is not None else None,
+            (exit_fill_ts or updated_at or "")[:10],
+            (exit_type or "") != "manual",
+            pnl_usdt is not None and pnl_usdt > 0,
+            pnl,
+        )
+
+    @staticmethod
+    def _contribution(row: tuple, today: str) -> tuple:
+        status, open_day, entry_day, close_day, non_manual, win, pnl = row
+        active = status in _ACTIVE_STATUSES
+        closed = status == TradeStatus.CLOSED.value
+        closed_today = closed and close_day == today
+        return (
+            int(active),
+            int(active and open_day == today),
+            int(entry_day is not None),
+            int(entry_day == today),
+            int(closed),
+            int(closed and win),
+            pnl if closed else 0.0,
+            int(closed_today),
+            int(closed_today and win),
+            pnl if closed_today else 0.0,
+            int(closed_today and non_manual),
+            int(closed_today and non_manual and win),
+        )
+
+
+def _utc_day() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def _next_day(day: str) -> str:
+    return (datetime.strptime(day, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+
 
 class StateDB:
     def __init__(self, cfg: Config):
         self._path = cfg.db_path
         self._db: Optional[aiosqlite.Connection] = None
+        self._write_batch_s = max(0.0, cfg.db_write_batch_ms / 1000.0)
+        self._write_batch_max = max(1, cfg.db_write_batch_max)
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._pending_writes = 0
+        self._summary: Dict[str, _SummaryCounters] = {}
+        # Transacciones directas (archivado) no deben intercalarse con el group commit
+        self._tx_lock = asyncio.Lock()
+        self._archive_after_days = cfg.db_archive_after_days
+        self._archive_interval_s = cfg.db_archive_interval_hours * 3600.0
+        self._archive: Optional[TradeArchive] = (
+            TradeArchive(cfg.db_archive_dir, _ARCHIVE_SCHEMA, _ARCHIVE_COLUMNS) if self._archive_after_days > 0 else None
+        )
+        self._archive_lock = asyncio.Lock()
+        self._archive_task: Optional[asyncio.Task] = None
+        # Pool de conexiones de solo lectura (dashboard / informes)
+        self._read_connections = cfg.db_read_connections
+        self._read_pool: Optional[asyncio.Queue] = None
+        self._read_conns: List[aiosqlite.Connection] = []
 
     async def init(self):
         Path(self._path).parent.mkdir(parents=True, exist_ok=True)
@@ -78,13 +441,264 @@ class StateDB:
         await self._db.execute(_CREATE_PAPER_TRADES)
         await self._db.execute(_CREATE_EVENTS)
         await self._db.commit()
-        log.info(f"DB inicializada: {self._path}")
+        await self._migrate_schema()
+        await self._log_query_plans()
+        for table in _TRADE_TABLES:
+            await self._load_summary_counters(table)
+        self._write_queue = asyncio.Queue()
+        self._writer_task = asyncio.create_task(self._writer_loop(), name="state_writer")
+        await self._open_read_pool()
+        if self._archive is not None:
+            self._archive_task = asyncio.create_task(self._archive_loop(), name="state_archiver")
+        log.info(
+            f"DB inicializada: {self._path} "
+            f"(write-behind {self._write_batch_s * 1000:.0f}ms / {self._write_batch_max} ops, "
+            f"{len(self._read_conns)} conexiones de lectura"
+            + (f", archivo >{self._archive_after_days}d" if self._archive is not None else "")
+            + ")"
+        )
+
+    @property
+    def archive_enabled(self) -> bool:
+        return self._archive is not None
 
     async def close(self):
+        if self._archive_task:
+            self._archive_task.cancel()
+            try:
+                await self._archive_task
+            except asyncio.CancelledError:
+                pass
+            self._archive_task = None
+        if self._archive is not None:
+            await self._archive.close()
+        await self._close_read_pool()
+        if self._writer_task:
+            try:
+                await self.flush()
+            except Exception as e:
+                log.error(f"Error vaciando escrituras pendientes al cerrar la DB: {e}")
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+            self._writer_task = None
+            self._write_queue = None
         if self._db:
             await self._db.close()
             self._db = None
 
+    # ──────────────────────────────────────────────────────────────────
+    # Esquema: migraciones e inspeccion de planes
+    # ──────────────────────────────────────────────────────────────────
+
+    async def _migrate_schema(self):
+        async with self._db.execute("PRAGMA user_version") as cur:
+            row = await cur.fetchone()
+        current = int(row[0]) if row else 0
+        for version, description, statements in _SCHEMA_MIGRATIONS:
+            if version <= current:
+                continue
+            try:
+                # BEGIN explicito: sqlite3 ejecuta el DDL fuera de transaccion y
+                # un ALTER TABLE sobreviviria al rollback de una migracion a medias
+                await self._db.execute("BEGIN")
+                for stmt in statements:
+                    await self._db.execute(stmt)
+                await self._db.execute(f"PRAGMA user_version = {int(version)}")
+                await self._db.commit()
+            except Exception:
+                await self._db.rollback()
+                log.error(f"StateDB: fallo aplicando migracion de esquema v{version} ({description})")
+                raise
+            current = version
+            log.info(f"StateDB: migracion de esquema v{version} aplicada ({description})")
+
+    async def _log_query_plans(self):
+        """EXPLAIN QUERY PLAN de las consultas calientes; avisa si alguna hace full scan."""
+        checks = [("events por trade", "SELECT * FROM events WHERE trade_id=? ORDER BY event_id", ("",))]
+        for table in _TRADE_TABLES:
+            checks.extend([
+                (f"{table} cuarentena", self._last_closed_sql(table), ("",)),
+                (f"{table} activos", self._active_sql(table), ()),
+                (f"{table} terminales", self._terminal_sql(table), (1,)),
+            ])
+        full_scans = 0
+        for name, sql, params in checks:
+            try:
+                async with self._db.execute(f"EXPLAIN QUERY PLAN {sql}", params) as cur:
+                    rows = await cur.fetchall()
+            except Exception as e:
+                log.warning(f"StateDB: no se pudo obtener el plan de '{name}': {e}")
+                continue
+            details = [str(r[3]) for r in rows]
+            plan = " | ".join(details)
+            if any(d.startswith("SCAN") and "INDEX" not in d for d in details):
+                full_scans += 1
+                log.warning(f"StateDB plan [{name}] sin indice: {plan}")
+            else:
+                log.debug(f"StateDB plan [{name}]: {plan}")
+        log.info(
+            f"StateDB: autochequeo de planes: {len(checks) - full_scans}/{len(checks)} "
+            "consultas calientes usan indice"
+        )
+
+    @staticmethod
+    def _active_sql(table: str) -> str:
+        return f"SELECT * FROM {table} WHERE status NOT IN ({_TERMINAL_STATUS_SQL})"
+
+    @staticmethod
+    def _terminal_sql(table: str) -> str:
+        return (
+            f"SELECT * FROM {table} "
+            f"WHERE status IN ({_TERMINAL_STATUS_SQL}) "
+            f"ORDER BY {_TERMINAL_ORDER_EXPR} DESC LIMIT ?"
+        )
+
+    @staticmethod
+    def _last_closed_sql(table: str) -> str:
+        return (
+            f"SELECT exit_fill_ts FROM {table} "
+            "WHERE pair = ? AND status = 'closed' AND exit_fill_ts IS NOT NULL "
+            "ORDER BY exit_fill_ts DESC LIMIT 1"
+        )
+
+    # ──────────────────────────────────────────────────────────────────
+    # Conexiones de solo lectura
+    # ──────────────────────────────────────────────────────────────────
+
+    async def _open_read_pool(self):
+        if self._read_connections <= 0:
+            return
+        uri = f"{Path(self._path).resolve().as_uri()}?mode=ro"
+        pool: asyncio.Queue = asyncio.Queue()
+        try:
+            for _ in range(self._read_connections):
+                conn = await aiosqlite.connect(uri, uri=True)
+                conn.row_factory = aiosqlite.Row
+                await conn.execute("PRAGMA query_only=1")
+                self._read_conns.append(conn)
+                pool.put_nowait(conn)
+        except Exception as e:
+            log.warning(f"StateDB: sin conexiones de lectura, se usa la principal: {e}")
+            await self._close_read_pool()
+            return
+        self._read_pool = pool
+
+    async def _close_read_pool(self):
+        self._read_pool = None
+        for conn in self._read_conns:
+            try:
+                await conn.close()
+            except Exception as e:
+                log.debug(f"Error cerrando conexión de lectura: {e}")
+        self._read_conns = []
+
+    @asynccontextmanager
+    async def _reader(self):
+        """
+        Conexion para lecturas del dashboard e informes. La barrera solo espera
+        al commit de lo ya encolado; con pool, la consulta corre en su propio
+        hilo sobre la ultima version confirmada (WAL) y no ocupa el de la
+        conexion de escritura. Sin pool, usa la conexion principal.
+        """
+        await self._read_barrier()
+        if self._read_pool is None:
+            yield self._db
+            return
+        conn = await self._read_pool.get()
+        try:
+            yield conn
+        finally:
+            if self._read_pool is not None:
+                self._read_pool.put_nowait(conn)
+
+    # ──────────────────────────────────────────────────────────────────
+    # Write-behind (group commit)
+    # ──────────────────────────────────────────────────────────────────
+
+    async def flush(self):
+        """Barrera: espera a que todas las escrituras encoladas esten confirmadas."""
+        if self._write_queue is None or self._writer_task is None or self._writer_task.done():
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._write_queue.put_nowait((None, None, fut, None))
+        await fut
+
+    async def _read_barrier(self):
+        if self._pending_writes:
+            await self.flush()
+
+    async def _enqueue_write(self, sql: str, params: tuple, trade: Optional[Trade] = None):
+        """
+        Encola una escritura. trade es el Trade que la origina: si la escritura
+        se descarta, su siguiente save vuelve a ser un upsert completo.
+        """
+        if self._write_queue is None or self._writer_task is None or self._writer_task.done():
+            async with self._tx_lock:
+                await self._db.execute(sql, params)
+                await self._db.commit()
+            return
+        self._pending_writes += 1
+        self._write_queue.put_nowait((sql, params, None, trade))
+
+    async def _writer_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._write_queue.get()]
+            deadline = loop.time() + self._write_batch_s
+            while len(batch) < self._write_batch_max and batch[-1][0] is not None:
+                try:
+                    batch.append(self._write_queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._write_queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._commit_batch(batch)
+
+    async def _commit_batch(self, batch: list):
+        writes = [(sql, params, trade) for sql, params, _, trade in batch if sql is not None]
+        try:
+            async with self._tx_lock:
+                await self._apply_writes(writes)
+        finally:
+            self._pending_writes = max(0, self._pending_writes - len(writes))
+            for _, _, fut, _ in batch:
+                if fut is not None and not fut.done():
+                    fut.set_result(None)
+
+    async def _apply_writes(self, writes: list):
+        if not writes:
+            return
+        try:
+            for sql, params, _ in writes:
+                await self._db.execute(sql, params)
+            await self._db.commit()
+        except Exception as e:
+            log.error(
+                f"StateDB: fallo confirmando lote de {len(writes)} escrituras: {e}. "
+                "Reintentando una a una."
+            )
+            await self._db.rollback()
+            for sql, params, trade in writes:
+                try:
+                    await self._db.execute(sql, params)
+                    await self._db.commit()
+                except Exception as item_err:
+                    log.error(f"StateDB: escritura descartada ({sql.split()[0]}): {item_err}")
+                    await self._db.rollback()
+                    if trade is not None:
+                        # Sus campos sucios ya se limpiaron al encolar: el
+                        # siguiente save reescribe la fila entera
+                        trade.mark_unpersisted()
+
     async def save_trade(self, trade: Trade):
         await self._save_trade_to_table("trades", trade)
 
@@ -92,56 +706,34 @@ class StateDB:
         await self._save_trade_to_table("paper_trades", trade)
 
     async def _save_trade_to_table(self, table: str, trade: Trade):
-        sql = f"""
-            INSERT OR REPLACE INTO {table} (
-                trade_id, pair, status, signal_ts,
-                entry_order_id, entry_quantity, entry_price, entry_fill_ts,
-                tp_order_id, tp_trigger_price, tp_price,
-                sl_order_id, sl_trigger_price, sl_price,
-                exit_price, exit_fill_ts, exit_type,
-                pnl_pct, pnl_usdt, fees_usdt,
-                error_message, signal_data,
-                created_at, updated_at, timeout_triggered, reconciled
-            ) VALUES (
-                ?, ?, ?, ?,
-                ?, ?, ?, ?,
-                ?, ?, ?,
-                ?, ?, ?,
-                ?, ?, ?,
-                ?, ?, ?,
-                ?, ?,
-                ?, ?, ?, ?
-            )
-        """
-        await self._db.execute(sql, (
+        counters = self._summary.get(table)
+        if counters is not None:
+            counters.apply(trade)
+        if trade.persisted_in == table:
+            dirty = trade.dirty_fields()
+            if dirty <= _TOUCH_ONLY_FIELDS:
+                # Sin cambios reales (p. ej. re-save tras touch() en reconciliacion):
+                # updated_at queda pendiente y viaja con el siguiente cambio.
+                return
+            if dirty <= _LIFECYCLE_FIELDS:
+                columns = tuple(c for c in _LIFECYCLE_COLUMNS if c in dirty)
+                values = tuple(_lifecycle_value(trade, c) for c in columns)
+                await self._enqueue_write(
+                    _update_sql(table, columns), (*values, trade.trade_id), trade
+                )
+                trade.mark_persisted(table)
+                return
+        signal_values, signal_extra = _signal_to_columns(trade)
+        await self._enqueue_write(_insert_sql(table), (
             trade.trade_id,
             trade.pair,
-            trade.status.value,
             trade.signal_ts,
-            trade.entry_order_id,
-            trade.entry_quantity,
-            trade.entry_price,
-            trade.entry_fill_ts,
-            trade.tp_order_id,
-            trade.tp_trigger_price,
-            trade.tp_price,
-            trade.sl_order_id,
-            trade.sl_trigger_price,
-            trade.sl_price,
-            trade.exit_price,
-            trade.exit_fill_ts,
-            trade.exit_type,
-            trade.pnl_pct,
-            trade.pnl_usdt,
-            trade.fees_usdt,
-            trade.error_message,
-            json.dumps(trade.signal_data),
             trade.created_at,
-            trade.updated_at,
-            1 if trade.timeout_triggered else 0,
-            1 if getattr(trade, "reconciled", False) else 0,
-        ))
-        await self._db.commit()
+            *(_lifecycle_value(trade, c) for c in _LIFECYCLE_COLUMNS),
+            signal_extra,
+            *signal_values,
+        ), trade)
+        trade.mark_persisted(table)
 
     async def load_active_trades(self) -> List[Trade]:
         return await self._load_active_from_table("trades", source="real")
@@ -149,21 +741,19 @@ class StateDB:
     async def load_active_paper_trades(self) -> List[Trade]:
         return await self._load_active_from_table("paper_trades", source="paper")
 
-    async def _load_active_from_table(self, table: str, source: str) -> List[Trade]:
-        terminal = (
-            TradeStatus.CLOSED.value,
-            TradeStatus.NOT_EXECUTED.value,
-            TradeStatus.ERROR.value,
-        )
-        placeholders = ",".join("?" * len(terminal))
-        async with self._db.execute(
-            f"SELECT * FROM {table} WHERE status NOT IN ({placeholders})",
-            terminal,
-        ) as cur:
+    async def _load_active_from_table(self,
+                                      table: str,
+                                      source: str,
+                                      conn: Optional[aiosqlite.Connection] = None) -> List[Trade]:
+        if conn is None:
+            await self._read_barrier()
+            conn = self._db
+        async with conn.execute(self._active_sql(table)) as cur:
             rows = await cur.fetchall()
         return [_row_to_trade(r, source=source) for r in rows]
 
     async def load_recent_closed(self, limit: int = 50) -> List[Trade]:
+        await self._read_barrier()
         async with self._db.execute(
             "SELECT * FROM trades WHERE status IN (?,?,?) "
             "ORDER BY updated_at DESC LIMIT ?",
@@ -178,13 +768,14 @@ class StateDB:
         return [_row_to_trade(r, source="real") for r in rows]
 
     async def load_all_trades(self, limit: int = 200) -> List[Trade]:
-        active_real = await self._load_active_from_table("trades", source="real")
-        active_paper = await self._load_active_from_table("paper_trades", source="paper")
+        async with self._reader() as conn:
+            active_real = await self._load_active_from_table("trades", "real", conn)
+            active_paper = await self._load_active_from_table("paper_trades", "paper", conn)
+            recent_real = await self._load_terminal_from_table("trades", limit, "real", conn)
+            recent_paper = await self._load_terminal_from_table("paper_trades", limit, "paper", conn)
         active_trades = active_real + active_paper
         active_ids = {t.trade_id for t in active_trades}
 
-        recent_real = await self._load_terminal_from_table("trades", limit=limit, source="real")
-        recent_paper = await self._load_terminal_from_table("paper_trades", limit=limit, source="paper")
         closed_candidates = [t for t in (recent_real + recent_paper) if t.trade_id not in active_ids]
         closed_candidates.sort(
             key=lambda t: (t.exit_fill_ts or t.updated_at or t.created_at or ""),
@@ -199,19 +790,12 @@ class StateDB:
     async def _load_terminal_from_table(self,
                                         table: str,
                                         limit: int,
-                                        source: str) -> List[Trade]:
-        terminal = (
-            TradeStatus.CLOSED.value,
-            TradeStatus.NOT_EXECUTED.value,
-            TradeStatus.ERROR.value,
-        )
-        placeholders = ",".join("?" * len(terminal))
-        sql = (
-            f"SELECT * FROM {table} "
-            f"WHERE status IN ({placeholders}) "
-            "ORDER BY COALESCE(exit_fill_ts, updated_at, created_at) DESC LIMIT ?"
-        )
-        async with self._db.execute(sql, (*terminal, limit)) as cur:
+                                        source: str,
+                                        conn: Optional[aiosqlite.Connection] = None) -> List[Trade]:
+        if conn is None:
+            await self._read_barrier()
+            conn = self._db
+        async with conn.execute(self._terminal_sql(table), (limit,)) as cur:
             rows = await cur.fetchall()
         return [_row_to_trade(r, source=source) for r in rows]
 
@@ -219,6 +803,7 @@ class StateDB:
                                       table: str,
                                       limit: int,
                                       source: str) -> List[Trade]:
+        await self._read_barrier()
         async with self._db.execute(
             f"SELECT * FROM {table} ORDER BY created_at DESC LIMIT ?",
             (limit,),
@@ -227,24 +812,128 @@ class StateDB:
         return [_row_to_trade(r, source=source) for r in rows]
 
     async def get_closed_trades(self) -> list[Trade]:
+        await self._read_barrier()
         sql = "SELECT * FROM trades WHERE status = 'closed' ORDER BY exit_fill_ts ASC"
         async with self._db.execute(sql) as cursor:
             rows = await cursor.fetchall()
         return [_row_to_trade(r, source="real") for r in rows]
 
     async def get_all_history_trades(self) -> list[Trade]:
-        real_rows = await self._load_history_from_table("trades", source="real")
-        paper_rows = await self._load_history_from_table("paper_trades", source="paper")
+        async with self._reader() as conn:
+            real_rows = await self._load_history_from_table("trades", "real", conn)
+            paper_rows = await self._load_history_from_table("paper_trades", "paper", conn)
         merged = real_rows + paper_rows
+        if self._archive is not None:
+            seen = {(t.source, t.trade_id) for t in merged}
+            for month in self._archive.months():
+                for table, source in (("trades", "real"), ("paper_trades", "paper")):
+                    rows = await self._archive.fetch(month, f"SELECT * FROM {table}")
+                    for r in rows:
+                        if (source, r["trade_id"]) not in seen:
+                            merged.append(_row_to_trade(r, source=source))
         merged.sort(key=lambda t: t.created_at or "")
         return merged
 
-    async def _load_history_from_table(self, table: str, source: str) -> list[Trade]:
+    async def _load_history_from_table(self,
+                                       table: str,
+                                       source: str,
+                                       conn: Optional[aiosqlite.Connection] = None) -> list[Trade]:
+        if conn is None:
+            await self._read_barrier()
+            conn = self._db
         sql = f"SELECT * FROM {table} ORDER BY created_at ASC"
-        async with self._db.execute(sql) as cursor:
+        async with conn.execute(sql) as cursor:
             rows = await cursor.fetchall()
         return [_row_to_trade(r, source=source) for r in rows]
 
+    async def get_history_page(self,
+                               source: str = "both",
+                               pair: Optional[str] = None,
+                               date_from: Optional[str] = None,
+                               date_to: Optional[str] = None,
+                               after: Optional[tuple] = None,
+                               limit: int = 500) -> List[Trade]:
+        """
+        Pagina del historico ordenada por (created_at, trade_id), con paginacion
+        por cursor: `after` es la clave (created_at, trade_id) del ultimo trade
+        de la pagina anterior. date_from/date_to (YYYY-MM-DD, inclusivos)
+        filtran por created_at. Incluye los meses archivados que puedan
+        contener claves del rango pedido.
+        """
+        tables = {
+            "real": (("trades", "real"),),
+            "paper": (("paper_trades", "paper"),),
+        }.get(source, (("trades", "real"), ("paper_trades", "paper")))
+
+        conds: List[str] = []
+        cond_params: list = []
+        if pair:
+            conds.append("pair = ?")
+            cond_params.append(pair)
+        if date_from:
+            conds.append("created_at >= ?")
+            cond_params.append(date_from)
+        if date_to:
+            conds.append("created_at < ?")
+            cond_params.append(_next_day(date_to))
+        if after:
+            conds.append("(created_at, trade_id) > (?, ?)")
+            cond_params.extend(after)
+        where = f"WHERE {' AND '.join(conds)} " if conds else ""
+
+        # Cada rama ya viene acotada y ordenada por su indice (created_at, trade_id)
+        arms = []
+        params: list = []
+        for table, src in tables:
+            arms.append(
+                f"SELECT * FROM (SELECT *, '{src}' AS source FROM {table} {where}"
+                "ORDER BY created_at, trade_id LIMIT ?)"
+            )
+            params.extend(cond_params)
+            params.append(limit)
+        sql = " UNION ALL ".join(arms) + " ORDER BY created_at, trade_id LIMIT ?"
+        params.append(limit)
+        async with self._reader() as conn:
+            async with conn.execute(sql, params) as cur:
+                rows = await cur.fetchall()
+        trades = [_row_to_trade(r, source=r["source"]) for r in rows]
+        if self._archive is None:
+            return trades
+
+        # Los ficheros mensuales se particionan por created_at: solo se consultan
+        # los meses que pueden tener claves posteriores al cursor y dentro del rango.
+        min_month = max(
+            (after[0] if after else "")[:7],
+            (date_from or "")[:7],
+        )
+        max_month = date_to[:7] if date_to else None
+        by_key = {(t.source, t.trade_id): t for t in trades}
+        for month in self._archive.months():
+            if month < min_month or (max_month and month > max_month):
+                continue
+            for r in await self._archive.fetch(month, sql, params):
+                by_key.setdefault((r["source"], r["trade_id"]), _row_to_trade(r, source=r["source"]))
+        merged = sorted(by_key.values(), key=lambda t: (t.created_at or "", t.trade_id))
+        return merged[:limit]
+
+    async def get_last_closed_times(self, paper: bool = False) -> Dict[str, datetime]:
+        """Ultimo cierre por par (una sola consulta GROUP BY) para precargar la cuarentena."""
+        await self._read_barrier()
+        table = "paper_trades" if paper else "trades"
+        sql = (
+            f"SELECT pair, MAX(exit_fill_ts) FROM {table} "
+            "WHERE status = 'closed' AND exit_fill_ts IS NOT NULL "
+            "GROUP BY pair"
+        )
+        async with self._db.execute(sql) as cursor:
+            rows = await cursor.fetchall()
+        result: Dict[str, datetime] = {}
+        for pair, ts in rows:
+            parsed = parse_close_ts(ts)
+            if parsed is not None:
+                result[pair] = parsed
+        return result
+
     async def get_last_closed_time(self, pair: str) -> datetime | None:
         return await self._get_last_closed_time_from_table("trades", pair)
 
@@ -252,68 +941,232 @@ class StateDB:
         return await self._get_last_closed_time_from_table("paper_trades", pair)
 
     async def _get_last_closed_time_from_table(self, table: str, pair: str) -> datetime | None:
-        sql = (
-            f"SELECT exit_fill_ts FROM {table} "
-            "WHERE pair = ? AND status = 'closed' AND exit_fill_ts IS NOT NULL "
-            "ORDER BY exit_fill_ts DESC LIMIT 1"
-        )
-        async with self._db.execute(sql, (pair,)) as cursor:
+        await self._read_barrier()
+        async with self._db.execute(self._last_closed_sql(table), (pair,)) as cursor:
             row = await cursor.fetchone()
 
         if row and row[0]:
-            try:
-                ts_str = row[0].replace("Z", "+00:00")
-                return datetime.fromisoformat(ts_str)
-            except Exception as e:
-                log.error(f"Error parseando fecha de cuarentena para {pair} ({row[0]}): {e}")
+            return parse_close_ts(row[0])
         return None
 
     async def get_trade(self, trade_id: str) -> Optional[Trade]:
-        async with self._db.execute(
-            "SELECT * FROM trades WHERE trade_id=?",
-            (trade_id,),
-        ) as cur:
-            row = await cur.fetchone()
-        if row:
-            return _row_to_trade(row, source="real")
+        async with self._reader() as conn:
+            async with conn.execute(
+                "SELECT * FROM trades WHERE trade_id=?",
+                (trade_id,),
+            ) as cur:
+                row = await cur.fetchone()
+            if row:
+                return _row_to_trade(row, source="real")
 
-        async with self._db.execute(
-            "SELECT * FROM paper_trades WHERE trade_id=?",
-            (trade_id,),
-        ) as cur:
-            row = await cur.fetchone()
+            async with conn.execute(
+                "SELECT * FROM paper_trades WHERE trade_id=?",
+                (trade_id,),
+            ) as cur:
+                row = await cur.fetchone()
         return _row_to_trade(row, source="paper") if row else None
 
     async def save_event(self, ev: Event):
-        await self._db.execute(
+        await self._enqueue_write(
             "INSERT INTO events (trade_id, event_type, details, timestamp) "
             "VALUES (?,?,?,?)",
-            (ev.trade_id, ev.event_type, json.dumps(ev.details), ev.timestamp),
+            (
+                ev.trade_id,
+                ev.event_type,
+                json.dumps(ev.details, separators=(",", ":")) if ev.details else None,
+                ev.timestamp,
+            ),
+        )
+
+    async def collapse_duplicate_events(self, vacuum: bool = True) -> int:
+        """
+        Elimina filas duplicadas de events (mismo trade_id, event_type, details
+        y timestamp), conservando la de menor event_id. Las versiones previas
+        guardaban cada evento del motor real dos veces.
+        """
+        await self.flush()
+        cursor = await self._db.execute(
+            "DELETE FROM events WHERE event_id NOT IN ("
+            "SELECT MIN(event_id) FROM events "
+            "GROUP BY trade_id, event_type, details, timestamp)"
         )
         await self._db.commit()
+        removed = cursor.rowcount if cursor.rowcount != -1 else 0
+        await cursor.close()
+        if vacuum and removed:
+            await self._db.execute("VACUUM")
+        log.info(f"StateDB v{STATE_VERSION}: {removed} eventos duplicados eliminados")
+        return removed
 
-    async def get_trade_events(self, trade_id: str) -> List[Event]:
+    # ──────────────────────────────────────────────────────────────────
+    # Archivo: trades terminales antiguos → ficheros mensuales + rollups
+    # ──────────────────────────────────────────────────────────────────
+
+    async def _archive_loop(self):
+        await asyncio.sleep(_ARCHIVE_FIRST_RUN_DELAY_S)
+        while True:
+            try:
+                await self.archive_closed_trades()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.error(f"StateDB: error en el archivado periodico: {e}", exc_info=True)
+            await asyncio.sleep(self._archive_interval_s)
+
+    async def archive_closed_trades(self, vacuum: bool = False) -> dict:
+        """
+        Mueve al archivo mensual (por mes de created_at) los trades terminales
+        cuyo cierre es anterior a database.archive_after_days, junto con sus
+        eventos y los eventos sin trade igual de antiguos. En la DB caliente
+        quedan sus agregados diarios por par en trade_rollups.
+
+        Cada lote se copia primero al archivo (INSERT OR REPLACE, idempotente)
+        y despues se borra de la DB caliente en una sola transaccion con su
+        rollup, asi que una interrupcion a medias solo provoca una recopia.
+        Las fees de paper ya archivadas no se resincronizan si cambia
+        friction_pct.
+        """
+        if self._archive is None:
+            return {}
+        cutoff = (
+            datetime.now(timezone.utc) - timedelta(days=self._archive_after_days)
+        ).isoformat()
+        moved = {"trades": 0, "paper_trades": 0, "events": 0}
+        async with self._archive_lock:
+            await self.flush()
+            for table, source in (("trades", "real"), ("paper_trades", "paper")):
+                while True:
+                    async with self._db.execute(
+                        f"SELECT * FROM {table} "
+                        f"WHERE status IN ({_TERMINAL_STATUS_SQL}) "
+                        f"AND {_TERMINAL_ORDER_EXPR} < ? LIMIT ?",
+                        (cutoff, _ARCHIVE_BATCH),
+                    ) as cur:
+                        rows = await cur.fetchall()
+                    if not rows:
+                        break
+                    moved["events"] += await self._archive_trade_batch(table, source, rows)
+                    moved[table] += len(rows)
+            moved["events"] += await self._archive_orphan_events(cutoff)
+
+            async with self._tx_lock:
+                await self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                if vacuum:
+                    await self._db.execute("VACUUM")
+
+        if any(moved.values()):
+            log.info(
+                f"StateDB: archivados {moved['trades']} trades reales, "
+                f"{moved['paper_trades']} paper y {moved['events']} eventos "
+                f"(cierre anterior a {cutoff[:10]})"
+            )
+        return moved
+
+    async def _archive_trade_batch(self, table: str, source: str, rows: list) -> int:
+        trade_ids = [r["trade_id"] for r in rows]
+        placeholders = ",".join("?" * len(trade_ids))
         async with self._db.execute(
-            "SELECT * FROM events WHERE trade_id=? ORDER BY event_id",
-            (trade_id,),
+            f"SELECT {', '.join(_EVENT_COLUMNS)} FROM events WHERE trade_id IN ({placeholders})",
+            trade_ids,
         ) as cur:
-            rows = await cur.fetchall()
+            events = await cur.fetchall()
+
+        columns = list(rows[0].keys())
+        insert_trade = (
+            f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({','.join('?' * len(columns))})"
+        )
+        insert_event = (
+            f"INSERT OR REPLACE INTO events ({', '.join(_EVENT_COLUMNS)}) "
+            f"VALUES ({','.join('?' * len(_EVENT_COLUMNS))})"
+        )
+        month_by_trade = {r["trade_id"]: (r["created_at"] or "")[:7] or "0000-00" for r in rows}
+        by_month: Dict[str, tuple] = {}
+        for r in rows:
+            by_month.setdefault(month_by_trade[r["trade_id"]], ([], []))[0].append(tuple(r))
+        for e in events:
+            by_month[month_by_trade[e["trade_id"]]][1].append(tuple(e))
+        for month, (trade_rows, event_rows) in sorted(by_month.items()):
+            await self._archive.write(month, [(insert_trade, trade_rows), (insert_event, event_rows)])
+
+        async with self._tx_lock:
+            try:
+                await self._db.executemany(_ROLLUP_UPSERT_SQL, _rollup_rows(source, rows))
+                await self._db.execute(
+                    f"DELETE FROM events WHERE trade_id IN ({placeholders})", trade_ids
+                )
+                await self._db.execute(
+                    f"DELETE FROM {table} WHERE trade_id IN ({placeholders})", trade_ids
+                )
+                await self._db.commit()
+            except Exception:
+                await self._db.rollback()
+                raise
+
+        counters = self._summary.get(table)
+        if counters is not None:
+            for trade_id in trade_ids:
+                counters.archive(trade_id)
+        return len(events)
+
+    async def _archive_orphan_events(self, cutoff: str) -> int:
+        insert_event = (
+            f"INSERT OR REPLACE INTO events ({', '.join(_EVENT_COLUMNS)}) "
+            f"VALUES ({','.join('?' * len(_EVENT_COLUMNS))})"
+        )
+        total = 0
+        while True:
+            async with self._db.execute(
+                f"SELECT {', '.join(_EVENT_COLUMNS)} FROM events "
+                "WHERE trade_id IS NULL AND timestamp < ? ORDER BY event_id LIMIT ?",
+                (cutoff, _ARCHIVE_BATCH),
+            ) as cur:
+                events = await cur.fetchall()
+            if not events:
+                return total
+            by_month: Dict[str, list] = {}
+            for e in events:
+                by_month.setdefault((e["timestamp"] or "")[:7] or "0000-00", []).append(tuple(e))
+            for month, event_rows in sorted(by_month.items()):
+                await self._archive.write(month, [(insert_event, event_rows)])
+            event_ids = [e["event_id"] for e in events]
+            async with self._tx_lock:
+                try:
+                    await self._db.execute(
+                        f"DELETE FROM events WHERE event_id IN ({','.join('?' * len(event_ids))})",
+                        event_ids,
+                    )
+                    await self._db.commit()
+                except Exception:
+                    await self._db.rollback()
+                    raise
+            total += len(events)
+
+    async def get_trade_events(self, trade_id: str) -> List[Event]:
+        async with self._reader() as conn:
+            async with conn.execute(
+                "SELECT * FROM events WHERE trade_id=? ORDER BY event_id",
+                (trade_id,),
+            ) as cur:
+                rows = await cur.fetchall()
         return [_row_to_event(r) for r in rows]
 
     async def get_recent_events(self, limit: int = 100) -> List[Event]:
-        async with self._db.execute(
-            "SELECT * FROM events ORDER BY event_id DESC LIMIT ?",
-            (limit,),
-        ) as cur:
-            rows = await cur.fetchall()
+        async with self._reader() as conn:
+            async with conn.execute(
+                "SELECT * FROM events ORDER BY event_id DESC LIMIT ?",
+                (limit,),
+            ) as cur:
+                rows = await cur.fetchall()
         return [_row_to_event(r) for r in reversed(rows)]
 
     async def get_last_events(self, limit: int = 100) -> List[Event]:
-        async with self._db.execute(
-            "SELECT * FROM events ORDER BY event_id DESC LIMIT ?",
-            (limit,),
-        ) as cur:
-            rows = await cur.fetchall()
+        async with self._reader() as conn:
+            async with conn.execute(
+                "SELECT * FROM events ORDER BY event_id DESC LIMIT ?",
+                (limit,),
+            ) as cur:
+                rows = await cur.fetchall()
         return [_row_to_event(r) for r in rows]
 
     async def get_daily_metrics(self) -> dict:
@@ -324,10 +1177,39 @@ class StateDB:
 
     async def get_dashboard_summary(self, paper: bool = False) -> dict:
         table = "paper_trades" if paper else "trades"
+        counters = self._summary.get(table)
+        if counters is not None:
+            return counters.snapshot()
         return await self._get_dashboard_summary_from_table(table)
 
+    async def _load_summary_counters(self, table: str):
+        """Carga unica (un full scan al arrancar o tras updates masivos) de los contadores."""
+        await self._read_barrier()
+        async with self._db.execute(f"SELECT {_SUMMARY_COLUMNS} FROM {table}") as cur:
+            rows = await cur.fetchall()
+        paper = table == "paper_trades"
+        async with self._db.execute(
+            "SELECT SUM(entries_count), SUM(closed_count), SUM(win_count), "
+            "SUM(pnl_usdt), SUM(fees_usdt) FROM trade_rollups WHERE source = ?",
+            ("paper" if paper else "real",),
+        ) as cur:
+            rollup = await cur.fetchone()
+        base = {}
+        if rollup and rollup[0] is not None:
+            pnl = (rollup[3] or 0.0) - ((rollup[4] or 0.0) if paper else 0.0)
+            base = {
+                "entries_total": rollup[0] or 0,
+                "closed_total": rollup[1] or 0,
+                "wins_total": rollup[2] or 0,
+                "pnl_total": pnl,
+            }
+        counters = _SummaryCounters(net_of_fees=paper)
+        counters.reset((tuple(r) for r in rows), base=base)
+        self._summary[table] = counters
+
     async def sync_paper_closed_trade_fees(self, friction_pct: float) -> int:
         friction_pct = max(0.0, float(friction_pct))
+        await self.flush()
         sql = """
             UPDATE paper_trades
             SET fees_usdt = ROUND((entry_price + exit_price) * entry_quantity * (? / 100.0), 4)
@@ -340,6 +1222,8 @@ class StateDB:
         await self._db.commit()
         updated = cursor.rowcount if cursor.rowcount != -1 else 0
         await cursor.close()
+        if updated:
+            await self._load_summary_counters("paper_trades")
         log.info(
             f"StateDB v{STATE_VERSION}: resincronizadas {updated} fees de paper_trades "
             f"cerrados con friction_pct={friction_pct:.4f}%"
@@ -347,6 +1231,7 @@ class StateDB:
         return updated
 
     async def _get_dashboard_summary_from_table(self, table: str) -> dict:
+        await self._read_barrier()
         today_str = datetime.now(timezone.utc).strftime("%Y-%m-%d")
         pnl_expr = "pnl_usdt - COALESCE(fees_usdt, 0)" if table == "paper_trades" else "pnl_usdt"
         active_statuses = (
@@ -427,6 +1312,7 @@ class StateDB:
         }
 
     async def _get_daily_metrics_from_table(self, table: str) -> dict:
+        await self._read_barrier()
         today_str = datetime.now(timezone.utc).strftime("%Y-%m-%d")
         pnl_expr = "pnl_usdt - COALESCE(fees_usdt, 0)" if table == "paper_trades" else "pnl_usdt"
         sql = f"""
@@ -460,13 +1346,117 @@ class StateDB:
         }
 
 
+def _rollup_rows(source: str, rows) -> List[tuple]:
+    """Agrega filas de trades terminales por (dia de cierre, par) para trade_rollups."""
+    acc: Dict[tuple, list] = {}
+    for r in rows:
+        day = (r["exit_fill_ts"] or r["updated_at"] or r["created_at"] or "")[:10]
+        bucket = acc.setdefault((day, r["pair"]), [0, 0, 0, 0.0, 0.0, 0, 0])
+        status = r["status"]
+        pnl = r["pnl_usdt"]
+        if r["entry_fill_ts"] is not None:
+            bucket[0] += 1
+        if status == TradeStatus.CLOSED.value:
+            bucket[1] += 1
+            if pnl is not None:
+                bucket[3] += float(pnl)
+                bucket[4] += float(r["fees_usdt"] or 0.0)
+                if pnl > 0:
+                    bucket[2] += 1
+        elif status == TradeStatus.NOT_EXECUTED.value:
+            bucket[5] += 1
+        elif status == TradeStatus.ERROR.value:
+            bucket[6] += 1
+    return [(source, day, pair, *values) for (day, pair), values in acc.items()]
+
+
+def parse_close_ts(value: Optional[str]) -> Optional[datetime]:
+    """Parsea un exit_fill_ts ISO a datetime UTC-aware (None si no es valido)."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except Exception as e:
+        log.error(f"Error parseando fecha de cuarentena ({value}): {e}")
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+_SQL_CACHE: Dict[tuple, str] = {}
+
+
+def _insert_sql(table: str) -> str:
+    key = ("insert", table)
+    sql = _SQL_CACHE.get(key)
+    if sql is None:
+        sql = (
+            f"INSERT OR REPLACE INTO {table} ({', '.join(_INSERT_COLUMNS)}) "
+            f"VALUES ({','.join('?' * len(_INSERT_COLUMNS))})"
+        )
+        _SQL_CACHE[key] = sql
+    return sql
+
+
+def _update_sql(table: str, columns: tuple) -> str:
+    key = ("update", table, columns)
+    sql = _SQL_CACHE.get(key)
+    if sql is None:
+        sql = (
+            f"UPDATE {table} SET {', '.join(f'{col} = ?' for col in columns)} "
+            "WHERE trade_id = ?"
+        )
+        _SQL_CACHE[key] = sql
+    return sql
+
+
+def _lifecycle_value(trade: Trade, column: str):
+    if column == "status":
+        return trade.status.value
+    if column in ("timeout_triggered", "reconciled"):
+        return 1 if getattr(trade, column, False) else 0
+    return getattr(trade, column)
+
+
+def _signal_to_columns(trade: Trade) -> tuple:
+    """Valores de las columnas sig_* y JSON solo con las claves no estandar (o None)."""
+    data = trade.signal_data or {}
+    values = tuple(data.get(key) for key, _, _ in _SIGNAL_COLUMNS)
+    extra = {
+        k: v for k, v in data.items()
+        if k not in _SIGNAL_KEYS
+        and not (k == "pair" and v == trade.pair)
+        and not (k == "rank" and v == data.get("top"))
+    }
+    return values, (json.dumps(extra, separators=(",", ":")) if extra else None)
+
+
+def _signal_from_row(r: dict) -> dict:
+    values = [r.get(col) for _, col, _ in _SIGNAL_COLUMNS]
+    data: dict = {}
+    if any(v is not None for v in values):
+        by_key = dict(zip(_SIGNAL_KEYS, values))
+        # Mismo orden de claves que _signal_to_dict en los motores
+        data = {
+            "fecha_hora": by_key["fecha_hora"],
+            "pair": r["pair"],
+            "top": by_key["top"],
+            "rank": by_key["top"],
+        }
+        data.update((k, by_key[k]) for k in _SIGNAL_KEYS if k not in data)
+    if r.get("signal_data"):
+        data.update(json.loads(r["signal_data"]))
+    return data
+
+
 def _row_to_trade(row, source: str = "real") -> Trade:
     r = dict(row)
     return Trade(
         trade_id=r["trade_id"],
         pair=r["pair"],
         signal_ts=r["signal_ts"] or "",
-        signal_data=json.loads(r["signal_data"] or "{}"),
+        signal_data=_signal_from_row(r),
         entry_order_id=r["entry_order_id"],
         entry_price=r["entry_price"],
         entry_quantity=r["entry_quantity"],
@@ -490,6 +1480,7 @@ def _row_to_trade(row, source: str = "real") -> Trade:
         timeout_triggered=bool(r["timeout_triggered"]) if r["timeout_triggered"] is not None else False,
         reconciled=bool(r["reconciled"]) if r["reconciled"] is not None else False,
         source=source,
+        persisted_in="paper_trades" if source == "paper" else "trades",
     )
 
 
@@ -499,6 +1490,6 @@ def _row_to_event(row) -> Event:
         event_id=r["event_id"],
         trade_id=r["trade_id"],
         event_type=r["event_type"],
-        details=json.loads(r["details"] or "{}"),
+        details=json.loads(r["details"]) if r["details"] else {},
         timestamp=r["timestamp"],
     )
@@ -20,10 +20,15 @@ SL : STOP_MARKET CONDITIONAL (algo) con workingType=MARK_PRICE.
      stopPrice = entry * (1 + sl_pct/100). Vive en Binance.
 
 Ambas vía /fapi/v1/algoOrder con algoType="CONDITIONAL".
+
+Eventos del User Data Stream (WSManager.subscribe), además de los fills:
+  - TP/SL cancelado, expirado o rechazado sin que lo pida el motor, o una
+    posición que queda a 0 con trades OPEN → reconciliación adelantada.
 """
 from __future__ import annotations
 
 import asyncio
+import functools
 import json
 from datetime import datetime, timezone, timedelta
 from decimal import Decimal
@@ -32,14 +37,42 @@ from typing import Callable, Awaitable, Dict, Optional
 from .config import Config
 from .logger import get_logger
 from .models import Event, EventType, Signal, Trade, TradeStatus, ExitType
+from .circuit_breaker import CLOSED, CircuitOpen
 from .order_manager import BinanceError, OrderManager
-from .state import StateDB
+from .rate_limiter import Priority, background_requests
+from .state import StateDB, parse_close_ts
 from .ws_manager import WSManager
 
 log = get_logger("trade_engine")
 
 OnEventCallback = Callable[[Event], Awaitable[None]]
-TRADE_ENGINE_VERSION = "1.10"
+TRADE_ENGINE_VERSION = "1.18"
+# Antigüedad tolerada de la foto de cuenta (AccountSnapshot) con el User Data
+# Stream conectado, que la mantiene al día (la reconciliación periódica la
+# descarga entera cada 10 min); sin él, cada consulta va a Binance.
+_ORDER_COUNT_CHECK_MAX_AGE_S = 900.0
+_SL_CAPACITY_MAX_AGE_S = 900.0
+# Margen para que el motor retire de sus mapas lo que cancela o cierra él
+# mismo antes de tratar un evento WS como cambio externo.
+_EXTERNAL_CHANGE_GRACE_S = 5.0
+# Esperas de fill (entrada y cierres): despiertan con el evento WS de la orden.
+# Con el WS conectado se revisa su estado cada _WS_RECHECK_S; caído, se
+# consulta la orden por REST cada _FILL_POLL_FALLBACK_S.
+_WS_RECHECK_S = 5.0
+_FILL_POLL_FALLBACK_S = 2.0
+
+
+def _position_path(method):
+    """
+    Las lecturas de protección y cierre de posiciones van a prioridad NORMAL
+    aunque las lance la reconciliación (background_requests), cuya prioridad
+    LOW heredarían también las tareas creadas dentro, como las cascadas.
+    """
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        with background_requests(Priority.NORMAL):
+            return await method(*args, **kwargs)
+    return wrapper
 
 
 class TradeEngine:
@@ -74,12 +107,23 @@ class TradeEngine:
         self._sl_capacity_lock = asyncio.Lock()
         self._entry_rejected_no_sl_capacity: dict | None = None
         self._quantitative_rules_status: dict | None = None
+        # Cuarentena: ultimo cierre por par (precargado en start, actualizado al cerrar)
+        self._last_close_by_pair: Dict[str, datetime] = {}
+        # Reconciliación adelantada por eventos WS (ver _request_reconcile)
+        self._reconcile_reason: Optional[str] = None
+        self._reconcile_wakeup = asyncio.Event()
+
+        for kind in ("ALGO_CANCELED", "ALGO_EXPIRED", "ALGO_REJECTED",
+                     "ORDER_CANCELED", "ORDER_EXPIRED"):
+            ws_mgr.subscribe(kind, self._on_protection_order_gone)
+        ws_mgr.subscribe("ACCOUNT_UPDATE", self._on_account_update)
 
     # ──────────────────────────────────────────────────────────────────
     # Arranque / Parada
     # ──────────────────────────────────────────────────────────────────
 
     async def start(self):
+        await self._load_quarantine_index()
         self._timeout_task = asyncio.create_task(
             self._timeout_loop(), name="timeout_checker"
         )
@@ -111,6 +155,28 @@ class TradeEngine:
 
         log.info(f"TradeEngine detenido. Trades abiertos: {self.open_count}")
 
+    # ──────────────────────────────────────────────────────────────────
+    # Cuarentena: índice en memoria del último cierre por par
+    # ──────────────────────────────────────────────────────────────────
+
+    async def _load_quarantine_index(self):
+        try:
+            loaded = await self._db.get_last_closed_times()
+        except Exception as e:
+            log.error(f"No se pudo precargar el índice de cuarentena: {e}")
+            return
+        # Los cierres registrados antes de la precarga (reconciliación) se respetan
+        for pair, ts in loaded.items():
+            self._remember_pair_close(pair, ts)
+        log.info(f"Índice de cuarentena precargado: {len(loaded)} pares")
+
+    def _remember_pair_close(self, pair: str, ts: Optional[datetime]):
+        if ts is None:
+            return
+        previous = self._last_close_by_pair.get(pair)
+        if previous is None or ts > previous:
+            self._last_close_by_pair[pair] = ts
+
     # ──────────────────────────────────────────────────────────────────
     # Propiedades públicas
     # ──────────────────────────────────────────────────────────────────
@@ -355,6 +421,7 @@ class TradeEngine:
         trade.exit_type = ExitType.MANUAL.value
         trade.exit_fill_ts = trade.exit_fill_ts or datetime.now(timezone.utc).isoformat()
         trade.touch()
+        self._remember_pair_close(trade.pair, parse_close_ts(trade.exit_fill_ts))
         await self._db.save_trade(trade)
         await self._forget_trade(trade.trade_id)
         await self._emit(EventType.ERROR, trade.trade_id, {
@@ -368,16 +435,24 @@ class TradeEngine:
     async def _reconcile_loop(self):
         """
         Ejecuta una reconciliacion periodica cada 10 minutos y la adelanta si
-        el recuento de ordenes abiertas deja de cuadrar con 2 x trades OPEN.
+        el recuento de ordenes abiertas deja de cuadrar con 2 x trades OPEN o
+        si un evento del User Data Stream la pide (_request_reconcile).
         """
         loop = asyncio.get_running_loop()
         self._last_reconcile_monotonic = loop.time()
         while True:
-            await asyncio.sleep(60)
+            try:
+                await asyncio.wait_for(self._reconcile_wakeup.wait(), timeout=60)
+            except asyncio.TimeoutError:
+                pass
+            self._reconcile_wakeup.clear()
 
             # Validación: No interrumpir si hay tareas de entrada (chase loop)
             if self._open_tasks:
                 continue
+            # Con la API de cuenta caída no hay nada fiable que reconciliar
+            if self._order_mgr.circuits.for_request("GET", "/fapi/v2/positionRisk").state != CLOSED:
+                continue
 
             try:
                 now = loop.time()
@@ -385,22 +460,81 @@ class TradeEngine:
                     self._last_reconcile_monotonic is None
                     or (now - self._last_reconcile_monotonic) >= 600
                 )
-                if periodic_due:
-                    log.info("Iniciando reconciliacion periodica (10 min)...")
-                else:
-                    if not await self._has_order_count_mismatch():
-                        continue
-                    log.warning(
-                        "Iniciando reconciliacion por desajuste en el recuento "
-                        "de ordenes abiertas."
-                    )
-                await self.reconcile(self.get_active_trades())
+                # Consultas detrás de las órdenes; las órdenes que reponga
+                # la reconciliación siguen siendo CRITICAL
+                with background_requests():
+                    if periodic_due:
+                        log.info("Iniciando reconciliacion periodica (10 min)...")
+                    elif self._reconcile_reason:
+                        log.warning(f"Iniciando reconciliacion adelantada: {self._reconcile_reason}")
+                    else:
+                        if not await self._has_order_count_mismatch():
+                            continue
+                        log.warning(
+                            "Iniciando reconciliacion por desajuste en el recuento "
+                            "de ordenes abiertas."
+                        )
+                    self._reconcile_reason = None
+                    await self.reconcile(self.get_active_trades())
                 self._last_reconcile_monotonic = loop.time()
             except asyncio.CancelledError:
                 raise
             except Exception as e:
                 log.error(f"Error en reconcile_loop: {e}", exc_info=True)
 
+    def _request_reconcile(self, reason: str):
+        """Adelanta la reconciliacion (en cuanto no haya chase loops en curso)."""
+        if self._reconcile_reason is None:
+            self._reconcile_reason = reason
+        self._reconcile_wakeup.set()
+
+    async def _on_protection_order_gone(self, order_data: dict):
+        """
+        Evento WS: una orden terminó sin llenarse. Si era un TP o SL que el
+        motor sigue teniendo asignado pasado el margen, no la canceló él
+        (cancelación manual, expiración, rechazo) y el trade queda sin
+        protección: se adelanta la reconciliación, que la repone.
+        """
+        try:
+            order_id = int(order_data.get("aid") or order_data.get("i") or 0)
+        except (TypeError, ValueError):
+            return
+        if order_id not in self._by_tp and order_id not in self._by_sl:
+            return
+        await asyncio.sleep(_EXTERNAL_CHANGE_GRACE_S)
+        trade_id = self._by_tp.get(order_id) or self._by_sl.get(order_id)
+        if not trade_id:
+            return
+        side = "TP" if order_id in self._by_tp else "SL"
+        status = order_data.get("X")
+        log.warning(
+            f"Trade {trade_id[:8]}: {side} {order_id} {status} fuera del motor"
+        )
+        self._request_reconcile(f"{side} {order_id} {status} ({order_data.get('s')})")
+
+    async def _on_account_update(self, account: dict):
+        """
+        Evento WS: posición de un par a 0 con trades OPEN en él. Si pasado el
+        margen siguen OPEN (no la cerró un TP/SL/cierre del propio motor), se
+        cerró fuera del bot: se adelanta la reconciliación.
+        """
+        flat = {
+            p.get("s") for p in account.get("P") or []
+            if p.get("ps", "BOTH") == "BOTH" and p.get("pa") is not None and float(p["pa"]) == 0
+        }
+        if not flat or not any(
+            t.status == TradeStatus.OPEN and t.pair in flat for t in self._trades.values()
+        ):
+            return
+        await asyncio.sleep(_EXTERNAL_CHANGE_GRACE_S)
+        pairs = sorted({
+            t.pair for t in self._trades.values()
+            if t.status == TradeStatus.OPEN and t.pair in flat
+        })
+        if pairs:
+            log.warning(f"Posicion a 0 en Binance con trades OPEN: {', '.join(pairs)}")
+            self._request_reconcile(f"posicion cerrada fuera del bot ({', '.join(pairs)})")
+
     async def _has_order_count_mismatch_legacy(self) -> bool:
         """
         Comprueba si Binance mantiene el nÃºmero esperado de Ã³rdenes abiertas:
@@ -681,13 +815,19 @@ class TradeEngine:
             return self.open_count_pair(sig.pair) == 0
         return True
 
+    def _account_snapshot_max_age(self, seconds: float) -> float:
+        """Solo se fía de la foto de cuenta si el WS la está manteniendo al día."""
+        return seconds if self._ws_mgr.connected else 0.0
+
     async def _ensure_conditional_capacity_for_new_signal(self, sig: Signal) -> bool:
         if not self._signal_requires_new_conditional_slot(sig):
             self._clear_entry_rejected_no_sl_capacity()
             return True
 
         try:
-            open_algo_orders = await self._order_mgr.get_all_open_algo_orders()
+            open_algo_orders = await self._order_mgr.get_all_open_algo_orders(
+                max_age_s=self._account_snapshot_max_age(_SL_CAPACITY_MAX_AGE_S)
+            )
         except Exception as e:
             log.warning(
                 f"Señal {sig.pair}: no se pudo verificar el límite de órdenes "
@@ -750,6 +890,13 @@ class TradeEngine:
                 continue
             pair_trades.setdefault(trade.pair, []).append(trade)
 
+        # Una sola consulta para todos los pares (variante multi-símbolo)
+        try:
+            mark_prices = await self._order_mgr.get_mark_prices(pair_trades.keys())
+        except Exception as e:
+            log.warning(f"Límite SL: no se pudieron leer mark prices para liberar capacidad: {e}")
+            return None
+
         candidates: list[dict] = []
         for pair, trades in pair_trades.items():
             total_qty = sum(float(t.entry_quantity or 0.0) for t in trades)
@@ -761,12 +908,10 @@ class TradeEngine:
                 for t in trades
             ) / total_qty
 
-            try:
-                mark_price = await self._order_mgr.get_mark_price(pair)
-            except Exception as e:
+            mark_price = mark_prices.get(pair)
+            if mark_price is None:
                 log.warning(
-                    f"Límite SL: no se pudo leer mark price de {pair} "
-                    f"para liberar capacidad: {e}"
+                    f"Límite SL: sin mark price de {pair} para liberar capacidad"
                 )
                 continue
 
@@ -817,6 +962,11 @@ class TradeEngine:
                 trade.touch()
                 await self._db.save_trade(trade)
 
+            # TP/SL de todo el par en una sola tanda antes de cerrar
+            await self._cancel_counterparts(
+                [t for t in trades if self._cascade_trade_sigue_activo(t)]
+            )
+
             for index, trade in enumerate(trades):
                 if not self._cascade_trade_sigue_activo(trade):
                     continue
@@ -825,9 +975,6 @@ class TradeEngine:
                 trade.touch()
                 await self._db.save_trade(trade)
 
-                await self._cancel_counterpart(trade, "tp")
-                await self._cancel_counterpart(trade, "sl")
-
                 try:
                     if await self._cerrar_cascade_si_posicion_ya_no_existe(
                         trade,
@@ -972,9 +1119,10 @@ class TradeEngine:
             expected_orders = len(open_trades) * 2 - blocked_sl_trades
             expected_formula = f"2 x {len(open_trades)} trades OPEN"
 
+        max_age = self._account_snapshot_max_age(_ORDER_COUNT_CHECK_MAX_AGE_S)
         try:
-            all_open = await self._order_mgr.get_all_open_orders()
-            all_algo = await self._order_mgr.get_all_open_algo_orders()
+            all_open = await self._order_mgr.get_all_open_orders(max_age_s=max_age)
+            all_algo = await self._order_mgr.get_all_open_algo_orders(max_age_s=max_age)
         except Exception as e:
             log.error(
                 f"Chequeo de recuento de órdenes: no se pudo consultar Binance: {e}",
@@ -1348,6 +1496,7 @@ class TradeEngine:
         Reconciliación general de estado y limpieza de huérfanos.
         """
         log.info(f"Reconciliando {len(db_trades)} trades activos de la DB...")
+        started = asyncio.get_running_loop().time()
 
         # 1. Obtener todas las posiciones Binance de una sola llamada
         try:
@@ -1357,6 +1506,10 @@ class TradeEngine:
                 f"Reconciliación: {len(all_positions)} posición(es) abiertas "
                 f"en Binance: {binance_pairs or '(ninguna)'}"
             )
+        except CircuitOpen as e:
+            # Sin posiciones fiables se darían por cerrados todos los trades OPEN
+            log.warning(f"Reconciliación aplazada: {e}")
+            return
         except Exception as e:
             log.error(f"Reconciliación: no se pudieron obtener posiciones: {e}")
             binance_pairs = set()
@@ -1448,13 +1601,18 @@ class TradeEngine:
             )
 
         # 3. Limpieza global de órdenes huérfanas en Binance
+        # La foto inicial sirve si nada la ha invalidado desde entonces (órdenes
+        # colocadas/canceladas aquí o eventos WS que no se pueden aplicar)
+        snapshot_age = self._account_snapshot_max_age(
+            asyncio.get_running_loop().time() - started
+        )
         try:
-            all_open = await self._order_mgr.get_all_open_orders()
-            all_algo = await self._order_mgr.get_all_open_algo_orders()
+            all_open = await self._order_mgr.get_all_open_orders(max_age_s=snapshot_age)
+            all_algo = await self._order_mgr.get_all_open_algo_orders(max_age_s=snapshot_age)
             all_orders = all_open + all_algo
 
             try:
-                current_positions = await self._order_mgr.get_all_positions()
+                current_positions = await self._order_mgr.get_all_positions(max_age_s=snapshot_age)
                 current_binance_pairs = {p["symbol"] for p in current_positions}
             except Exception as e:
                 log.debug(
@@ -1468,7 +1626,8 @@ class TradeEngine:
                 current_binance_pairs.union(db_opening_pairs)
             )
 
-            cleaned_count = 0
+            # Agrupar por símbolo: una tanda batchOrders (+ algo en paralelo) por par
+            purge: Dict[str, Dict[str, list[int]]] = {}
             for o in all_orders:
                 sym = o.get("symbol")
                 try:
@@ -1483,27 +1642,35 @@ class TradeEngine:
                         f"Reconciliación: eliminando orden huérfana {oid} "
                         f"en {sym} (posición cero)"
                     )
-                    try:
-                        await self._order_mgr.cancel_order(sym, oid)
-                        cleaned_count += 1
-                    except Exception as e:
-                        log.error(
-                            f"Fallo al cancelar orden huérfana {oid} en {sym}: {e}"
-                        )
-                    continue
-
-                if oid not in expected_order_ids:
+                elif oid not in expected_order_ids:
                     log.warning(
                         f"Reconciliación: eliminando orden sobrante {oid} en {sym} "
                         "(no asociada a trades activos del motor)"
                     )
-                    try:
-                        await self._order_mgr.cancel_order(sym, oid)
-                        cleaned_count += 1
-                    except Exception as e:
-                        log.error(
-                            f"Fallo al cancelar orden sobrante {oid} en {sym}: {e}"
-                        )
+                else:
+                    continue
+                kind = "algo" if "algoId" in o else "regular"
+                purge.setdefault(sym, {"regular": [], "algo": []})[kind].append(oid)
+
+            async def _purge_symbol(sym: str, ids: Dict[str, list[int]]) -> int:
+                try:
+                    results = await self._order_mgr.cancel_orders(
+                        sym, ids["regular"], algo_ids=ids["algo"]
+                    )
+                except Exception as e:
+                    log.error(f"Fallo al purgar órdenes de {sym}: {e}")
+                    return 0
+                ok = 0
+                for oid, result in results.items():
+                    if isinstance(result, BinanceError):
+                        log.error(f"Fallo al cancelar orden {oid} en {sym}: {result}")
+                    else:
+                        ok += 1
+                return ok
+
+            cleaned_count = sum(await asyncio.gather(
+                *(_purge_symbol(sym, ids) for sym, ids in purge.items())
+            ))
 
             if cleaned_count > 0:
                 log.info(
@@ -1526,8 +1693,7 @@ class TradeEngine:
             )
 
             # --- LIMPIEZA ACTIVA DE ÓRDENES CONDICIONALES ---
-            await self._cancel_counterpart(t, "tp")
-            await self._cancel_counterpart(t, "sl")
+            await self._cancel_counterparts([t])
             # ------------------------------------------------
             await self._apply_reconciled_close(
                 t,
@@ -1680,8 +1846,7 @@ class TradeEngine:
                 "→ Cancelando TP/SL huérfanos y resolviendo el motivo de cierre"
             )
 
-            await self._cancel_counterpart(t, "tp")
-            await self._cancel_counterpart(t, "sl")
+            await self._cancel_counterparts([t])
             await self._apply_reconciled_close(
                 t,
                 "Reconciliación: posición cerrada externamente",
@@ -1767,8 +1932,7 @@ class TradeEngine:
                 "→ Cancelando TP/SL huérfanos y resolviendo el motivo de cierre"
             )
 
-            await self._cancel_counterpart(t, "tp")
-            await self._cancel_counterpart(t, "sl")
+            await self._cancel_counterparts([t])
             await self._apply_reconciled_close(
                 t,
                 "Reconciliación: posición cerrada externamente",
@@ -1927,11 +2091,9 @@ class TradeEngine:
 
         # --- Control de Cuarentena ---
         if self._cfg.quarantine_hours > 0:
-            last_closed = await self._db.get_last_closed_time(sig.pair)
+            last_closed = self._last_close_by_pair.get(sig.pair)
             if last_closed:
                 now_utc = datetime.now(timezone.utc)
-                if last_closed.tzinfo is None:
-                    last_closed = last_closed.replace(tzinfo=timezone.utc)
                 hours_since = (now_utc - last_closed).total_seconds() / 3600.0
                 if hours_since < self._cfg.quarantine_hours:
                     log.info(
@@ -2080,7 +2242,7 @@ class TradeEngine:
 
                     # Esperar fill durante chase_timeout_seconds
                     filled = await self._wait_fill(
-                        trade, order_id, cfg.chase_timeout_seconds
+                        trade, order_id, cfg.chase_timeout_seconds, client_oid
                     )
                     if filled:
                         return   # on_entry_fill() lo llevará a OPEN
@@ -2091,7 +2253,17 @@ class TradeEngine:
                         f"{cfg.chase_timeout_seconds}s (attempt {attempt})"
                     )
                     try:
-                        await self._order_mgr.cancel_order(sig.pair, order_id)
+                        cancelled = await self._order_mgr.cancel_order(sig.pair, order_id)
+                        if float((cancelled or {}).get("executedQty") or 0) > 0:
+                            # Fill parcial antes de cancelar: se abre con lo ejecutado
+                            self._ws_mgr.unregister(order_id)
+                            self._ws_mgr.unregister_client_id(client_oid)
+                            if trade.status != TradeStatus.OPEN:
+                                await self._apply_rest_entry_fill(
+                                    trade, order_id, client_oid, cancelled,
+                                    "cancelada con fill parcial",
+                                )
+                            return
                     except BinanceError as e:
                         if e.code == -2011:
                             recovered = await self._recover_entry_after_unknown_cancel(
@@ -2162,7 +2334,7 @@ class TradeEngine:
                         f"Trade {trade.trade_id[:8]} OPENING MARKET fallback: "
                         f"orderId={order_id} qty={qty}"
                     )
-                    filled = await self._wait_fill(trade, order_id, 10.0)
+                    filled = await self._wait_fill(trade, order_id, 10.0, client_oid)
                     if filled:
                         return  # on_entry_fill() lo llevará a OPEN
                     log.error(
@@ -2227,16 +2399,56 @@ class TradeEngine:
             raise
 
     async def _wait_fill(self, trade: Trade, order_id: int,
-                         timeout: float) -> bool:
-        """Espera hasta timeout. Devuelve True si fue fill detectado por WS."""
-        t0 = asyncio.get_event_loop().time()
-        while asyncio.get_event_loop().time() - t0 < timeout:
-            if trade.status == TradeStatus.OPEN:
-                return True
-            if trade.status == TradeStatus.NOT_EXECUTED:
-                return False
-            await asyncio.sleep(0.2)
-        return False
+                         timeout: float, client_oid: Optional[str] = None) -> bool:
+        """
+        Espera hasta timeout el fill de la entrada. Despierta con el estado
+        final de la orden en el User Data Stream; solo con el WS caído consulta
+        la orden por REST. Devuelve True si se llenó (on_entry_fill la lleva a
+        OPEN) y False sin fill, o antes si Binance la cancela o expira.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        waiter = self._ws_mgr.wait_order(order_id, client_oid)
+        try:
+            while True:
+                if trade.status == TradeStatus.OPEN:
+                    return True
+                if trade.status == TradeStatus.NOT_EXECUTED:
+                    return False
+                final = _final_order(waiter)
+                if final is not None:
+                    # Cancelada o expirada con fill parcial: WSManager la
+                    # enruta también a on_entry_fill con la cantidad ejecutada
+                    return final.get("X") == "FILLED" or float(final.get("z") or 0) > 0
+                if waiter.cancelled():
+                    waiter = self._ws_mgr.wait_order(order_id, client_oid)
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return False
+                ws_up = self._ws_mgr.connected
+                await asyncio.wait(
+                    (waiter,),
+                    timeout=min(remaining, _WS_RECHECK_S if ws_up else _FILL_POLL_FALLBACK_S),
+                )
+                if not waiter.done() and not self._ws_mgr.connected:
+                    if await self._poll_entry_fill(trade, order_id, client_oid or ""):
+                        return True
+        finally:
+            self._ws_mgr.forget_order(order_id, client_oid)
+
+    async def _poll_entry_fill(self, trade: Trade, order_id: int,
+                               client_oid: str) -> bool:
+        """Consulta REST de la entrada con el WS caído; aplica el fill si lo hay."""
+        try:
+            order = await self._order_mgr.get_order(trade.pair, order_id)
+        except Exception as e:
+            log.debug(f"Polling fill entrada {order_id}: {e}")
+            return False
+        if str(order.get("status") or "").upper() != "FILLED":
+            return False
+        return await self._apply_rest_entry_fill(
+            trade, order_id, client_oid, order, "WS caído, fill detectado por REST"
+        )
 
     async def _recover_entry_after_unknown_cancel(self,
                                                   trade: Trade,
@@ -2256,7 +2468,17 @@ class TradeEngine:
                 f"tras cancel -2011: {e}"
             )
             return False
+        return await self._apply_rest_entry_fill(
+            trade, order_id, client_oid, order, "cancel -2011"
+        )
 
+    async def _apply_rest_entry_fill(self,
+                                     trade: Trade,
+                                     order_id: int,
+                                     client_oid: str,
+                                     order: dict,
+                                     reason: str) -> bool:
+        """Convierte la orden consultada por REST en un fill sintético de entrada."""
         status = str(order.get("status") or "").upper()
         executed_qty = float(order.get("executedQty") or order.get("z") or 0)
         avg_price = float(
@@ -2267,7 +2489,7 @@ class TradeEngine:
         )
 
         log.warning(
-            f"Trade {trade.trade_id[:8]}: cancel -2011 para orderId={order_id}; "
+            f"Trade {trade.trade_id[:8]}: {reason} para orderId={order_id}; "
             f"Binance reporta status={status} executedQty={executed_qty}"
         )
 
@@ -2318,6 +2540,10 @@ class TradeEngine:
 
         entry_price = float(order_data.get("ap") or order_data.get("L") or 0)
         fill_ts     = datetime.now(timezone.utc).isoformat()
+        # Fill parcial (entrada cancelada o expirada): la posición es lo ejecutado
+        filled_qty  = float(order_data.get("z") or 0)
+        if filled_qty > 0:
+            trade.entry_quantity = filled_qty
 
         trade.entry_price   = entry_price
         trade.entry_fill_ts = fill_ts
@@ -2337,6 +2563,7 @@ class TradeEngine:
         # Colocar TP y SL inmediatamente
         await self._place_tp_sl(trade)
 
+    @_position_path
     async def _place_tp_sl(self, trade: Trade):
         await self._place_one_tp(trade)
         if self._cfg.sl_por_par:
@@ -2344,6 +2571,7 @@ class TradeEngine:
         else:
             await self._place_one_sl(trade)
 
+    @_position_path
     async def _place_one_tp(self, trade: Trade):
         try:
             tp_result = await self._order_mgr.place_tp(
@@ -2359,6 +2587,8 @@ class TradeEngine:
             self._ws_mgr.register_tp(tp_oid)
             trade.touch()
             await self._db.save_trade(trade)
+            # Durable ya: tras un crash, la reconciliación necesita el id de la protección
+            await self._db.flush()
             await self._emit(EventType.TP_PLACED, trade.trade_id, {
                 "orderId": tp_oid,
                 "stopPrice": trade.tp_trigger_price,
@@ -2405,6 +2635,7 @@ class TradeEngine:
             log.error(f"Error colocando TP {trade.pair}: {e}", exc_info=True)
             await self._emit(EventType.ERROR, trade.trade_id, {"msg": f"TP error: {e}"})
 
+    @_position_path
     async def _place_one_sl(self, trade: Trade, recover_on_4045: bool = True):
         """
         Coloca STOP_MARKET Algo (algoType=CONDITIONAL, workingType=MARK_PRICE)
@@ -2430,6 +2661,8 @@ class TradeEngine:
                 trade.error_message = None
             trade.touch()
             await self._db.save_trade(trade)
+            # Durable ya: tras un crash, la reconciliación necesita el id de la protección
+            await self._db.flush()
             await self._emit(EventType.SL_PLACED, trade.trade_id, {
                 "orderId": sl_oid,
                 "stopPrice": trade.sl_trigger_price,
@@ -2611,6 +2844,34 @@ class TradeEngine:
             self._by_sl.pop(oid, None)
             self._ws_mgr.unregister(oid)
 
+    async def _cancel_counterparts(self, trades: list[Trade]):
+        """
+        Cancela TP y SL de varios trades con una tanda por par
+        (batchOrders para los TP, algoOrder en paralelo para los SL).
+        """
+        by_pair: Dict[str, Dict[int, tuple]] = {}
+        for trade in trades:
+            if trade.tp_order_id:
+                by_pair.setdefault(trade.pair, {})[int(trade.tp_order_id)] = (trade, "tp")
+            if trade.sl_order_id:
+                by_pair.setdefault(trade.pair, {})[int(trade.sl_order_id)] = (trade, "sl")
+
+        async def _cancel_pair(pair: str, owners: Dict[int, tuple]):
+            tp_ids = [oid for oid, (_, side) in owners.items() if side == "tp"]
+            sl_ids = [oid for oid, (_, side) in owners.items() if side == "sl"]
+            results = await self._order_mgr.cancel_orders(pair, tp_ids, algo_ids=sl_ids)
+            for oid, (trade, side) in owners.items():
+                result = results.get(oid)
+                if isinstance(result, dict):
+                    label = "orderId" if side == "tp" else "algoId"
+                    log.info(f"Trade {trade.trade_id[:8]} {side.upper()} cancelado ({label}={oid})")
+                else:
+                    log.warning(f"No se pudo cancelar {side.upper()} {oid}: {result}")
+                (self._by_tp if side == "tp" else self._by_sl).pop(oid, None)
+                self._ws_mgr.unregister(oid)
+
+        await asyncio.gather(*(_cancel_pair(pair, owners) for pair, owners in by_pair.items()))
+
     async def _close_trade(self, trade: Trade):
         """Calcula PnL y marca el trade como CLOSED."""
         if trade.entry_price and trade.exit_price and trade.entry_quantity:
@@ -2626,6 +2887,7 @@ class TradeEngine:
 
         trade.status = TradeStatus.CLOSED
         trade.touch()
+        self._remember_pair_close(trade.pair, parse_close_ts(trade.exit_fill_ts))
         self._sl_retry_after.pop(trade.trade_id, None)
         await self._db.save_trade(trade)
         await self._forget_trade(trade.trade_id)
@@ -2738,6 +3000,7 @@ class TradeEngine:
         await self._db.save_trade(trade)
         return True
 
+    @_position_path
     async def _close_sibling_trades(self, pair: str, trigger_type: str, exclude_trade_id: str):
         """
         Cierra trades hermanos en cascada con un modelo Maker Progresivo.
@@ -2757,8 +3020,7 @@ class TradeEngine:
             min_tp_pct = self._cfg.min_tp_posicion_pct
             if min_tp_pct > 0:
                 try:
-                    bid = await self._order_mgr.get_best_bid(pair)
-                    ask = await self._order_mgr.get_best_ask(pair)
+                    bid, ask = await self._order_mgr.get_book(pair)
                     mid_price = (bid + ask) / 2.0
 
                     total_cost = sum(t.entry_price * t.entry_quantity for t in candidates)
@@ -2797,17 +3059,18 @@ class TradeEngine:
                 )
                 return
 
-            await self._cancel_counterpart(t, "tp")
+            # TP y SL de este hermano en una sola tanda, justo antes de su
+            # cierre: hasta su turno conserva la protección en Binance. Si un
+            # TP/SL se ejecuta en la carrera, su callback resuelve el trade.
+            await self._cancel_counterparts([t])
 
             if self._cascade_trade_ya_resuelto(t):
                 log.info(
-                    f"Trade {t.trade_id[:8]} cascada omitida tras cancelar TP: "
+                    f"Trade {t.trade_id[:8]} cascada omitida tras cancelar TP/SL: "
                     "el trade paso a resolverse por su propio cierre"
                 )
                 return
 
-            await self._cancel_counterpart(t, "sl")
-
             try:
                 if await self._cerrar_cascade_si_posicion_ya_no_existe(
                     t, "inicio de cascada"
@@ -2821,8 +3084,7 @@ class TradeEngine:
                     return
 
                 if trigger_type == "TP":
-                    bid = await self._order_mgr.get_best_bid(pair)
-                    ask = await self._order_mgr.get_best_ask(pair)
+                    bid, ask = await self._order_mgr.get_book(pair)
                     mid_price = (bid + ask) / 2.0
 
                     is_winning = mid_price < t.entry_price
@@ -2894,8 +3156,7 @@ class TradeEngine:
                             return
 
                         # --- INTENTO 2: LIMIT (Maker Agresivo) ---
-                        new_bid = await self._order_mgr.get_best_bid(pair)
-                        new_ask = await self._order_mgr.get_best_ask(pair)
+                        new_bid, new_ask = await self._order_mgr.get_book(pair)
                         new_mid = (new_bid + new_ask) / 2.0
 
                         aggro_maker_price = (new_mid + new_ask) / 2.0
@@ -3063,8 +3324,7 @@ class TradeEngine:
         await self._db.save_trade(trade)
 
         # Cancelar TP y SL
-        await self._cancel_counterpart(trade, "tp")
-        await self._cancel_counterpart(trade, "sl")
+        await self._cancel_counterparts([trade])
 
         qty = trade.entry_quantity
         if not qty:
@@ -3127,16 +3387,44 @@ class TradeEngine:
 
     async def _wait_close_fill(self, order_id: int, symbol: str,
                                 timeout: float) -> Optional[float]:
-        """Polling REST para verificar fill de la orden de cierre."""
-        t0 = asyncio.get_event_loop().time()
-        while asyncio.get_event_loop().time() - t0 < timeout:
-            await asyncio.sleep(2)
-            try:
-                od = await self._order_mgr.get_order(symbol, order_id)
-                if od.get("status") == "FILLED":
-                    return float(od.get("avgPrice") or od.get("price") or 0)
-            except Exception as e:
-                log.debug(f"Polling fill {order_id}: {e}")
+        """
+        Espera el fill de una orden de cierre y devuelve su precio medio, o
+        None si no se llena (o Binance la cancela). Como _wait_fill, despierta
+        con el evento WS y solo consulta REST con el WS caído; al agotar el
+        tiempo confirma una vez por REST antes de darla por no llenada.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        waiter = self._ws_mgr.wait_order(order_id)
+        try:
+            while True:
+                final = _final_order(waiter)
+                if final is not None:
+                    if final.get("X") != "FILLED":
+                        return None
+                    return float(final.get("ap") or final.get("L") or 0)
+                remaining = deadline - loop.time()
+                if remaining <= 0 or waiter.cancelled():
+                    return await self._rest_close_fill_price(order_id, symbol)
+                ws_up = self._ws_mgr.connected
+                await asyncio.wait(
+                    (waiter,),
+                    timeout=min(remaining, _WS_RECHECK_S if ws_up else _FILL_POLL_FALLBACK_S),
+                )
+                if not waiter.done() and not self._ws_mgr.connected:
+                    price = await self._rest_close_fill_price(order_id, symbol)
+                    if price is not None:
+                        return price
+        finally:
+            self._ws_mgr.forget_order(order_id)
+
+    async def _rest_close_fill_price(self, order_id: int, symbol: str) -> Optional[float]:
+        try:
+            od = await self._order_mgr.get_order(symbol, order_id)
+            if od.get("status") == "FILLED":
+                return float(od.get("avgPrice") or od.get("price") or 0)
+        except Exception as e:
+            log.debug(f"Polling fill {order_id}: {e}")
         return None
 
     # ──────────────────────────────────────────────────────────────────
@@ -3144,9 +3432,9 @@ class TradeEngine:
     # ──────────────────────────────────────────────────────────────────
 
     async def _emit(self, etype: EventType, trade_id: Optional[str], details: dict):
+        # La persistencia y el fan-out (dashboard/notifier) los hace on_event.
         ev = Event(trade_id=trade_id, event_type=etype.value, details=details)
         try:
-            await self._db.save_event(ev)
             await self._on_event(ev)
         except Exception as e:
             log.debug(f"Error emitiendo evento {etype}: {e}")
@@ -3171,3 +3459,10 @@ def _signal_to_dict(sig: Signal) -> dict:
         "bp":           sig.bp,
         "categoria":    sig.categoria,
     }
+
+
+def _final_order(waiter: "asyncio.Future") -> Optional[dict]:
+    """Payload WS final de la orden esperada, o None si aún no llegó."""
+    if waiter.done() and not waiter.cancelled():
+        return waiter.result()
+    return None
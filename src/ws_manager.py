@@ -3,17 +3,35 @@ ws_manager.py — WebSocket User Data Stream de Binance Futures.
 
 Escucha ORDER_TRADE_UPDATE para detectar:
   - Fill de entry order  → callback on_entry_fill(order_data)
+    (también si se cancela o expira con parte ejecutada)
   - Fill de TP order     → callback on_tp_fill(order_data)
   - Fill de SL order     → callback on_sl_fill(order_data)
 
+Todos los eventos se pasan también a la foto de cuenta de OrderManager
+(AccountSnapshot), que mientras el WS está conectado es un espejo vivo de
+posiciones y órdenes abiertas; al (re)conectar se invalida entera porque
+pueden haberse perdido eventos.
+
+Además, cualquier evento se reparte a quien se suscriba a su tipo con
+subscribe() (ver event_kind): ORDER_<estado> y ALGO_<estado> reciben el
+payload "o", ACCOUNT_UPDATE el payload "a" y el resto el mensaje entero.
+
+Quien espera a que una orden concreta termine (fill de entrada, cierre por
+timeout o cascada) pide un future con wait_order(); se resuelve con el
+payload "o" de ORDER_TRADE_UPDATE en cuanto la orden llega a un estado final
+(FILLED, CANCELED, EXPIRED...). Los estados finales recientes se guardan por
+si el evento llega antes que la respuesta REST con el orderId.
+
 Mantiene el listenKey activo con PUT cada keep_alive_interval segundos.
 Reconexión automática con backoff exponencial.
 """
 from __future__ import annotations
 
 import asyncio
+import inspect
 import json
-from typing import Awaitable, Callable, Optional
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Union
 
 import websockets
 from websockets.exceptions import ConnectionClosedError, ConnectionClosedOK
@@ -25,6 +43,27 @@ from .order_manager import OrderManager
 log = get_logger("ws_manager")
 
 OnFillCallback = Callable[[dict], Awaitable[None]]
+OrderKey = Union[int, str]   # orderId / algoId o newClientOrderId
+UserDataHandler = Callable[[dict], Optional[Awaitable[None]]]
+
+_FINAL_ORDER_STATUSES = {"FILLED", "CANCELED", "EXPIRED", "EXPIRED_IN_MATCH", "REJECTED"}
+_RECENT_FINAL_KEPT = 1000
+
+
+def event_kind(msg: dict) -> str:
+    """
+    Tipo de un evento del User Data Stream: ORDER_<X> para ORDER_TRADE_UPDATE
+    (ORDER_NEW, ORDER_PARTIALLY_FILLED, ORDER_FILLED, ORDER_CANCELED,
+    ORDER_EXPIRED...), ALGO_<X> para ALGO_UPDATE (ALGO_NEW, ALGO_TRIGGERED,
+    ALGO_CANCELED...) y el campo "e" tal cual para el resto (ACCOUNT_UPDATE,
+    MARGIN_CALL, listenKeyExpired...).
+    """
+    event_type = msg.get("e") or ""
+    if event_type == "ORDER_TRADE_UPDATE":
+        return f"ORDER_{(msg.get('o') or {}).get('X', '')}"
+    if event_type == "ALGO_UPDATE":
+        return f"ALGO_{(msg.get('o') or {}).get('X', '')}"
+    return event_type
 
 
 class WSManager:
@@ -46,9 +85,11 @@ class WSManager:
         self._tp_orders:     set[int]       = set()   # order_ids de TP
         self._sl_orders:     set[int]       = set()   # order_ids de SL
 
-        # Events opcionales por orderId: se activan al detectar FILLED.
-        # LimitChaseExecutor los usa para despertar antes del timeout REST.
-        self._fill_events: dict[int, asyncio.Event] = {}
+        # Futures por orden (ver wait_order) y últimos estados finales vistos
+        self._order_waiters: Dict[OrderKey, asyncio.Future] = {}
+        self._recent_final: "OrderedDict[OrderKey, dict]" = OrderedDict()
+        self._subscribers: Dict[str, List[UserDataHandler]] = {}
+        self._ws = None
 
         # referencia al task para poder cancelarlo
         self._task:          Optional[asyncio.Task] = None
@@ -73,13 +114,56 @@ class WSManager:
         self._sl_orders.add(order_id)
         log.debug(f"WS registrado SL orderId={order_id}")
 
-    def register_fill_event(self, order_id: int, event: asyncio.Event):
-        """Registra un asyncio.Event que se activará cuando orderId sea FILLED."""
-        self._fill_events[order_id] = event
-        log.debug(f"WS fill_event registrado orderId={order_id}")
-
-    def unregister_fill_event(self, order_id: int):
-        self._fill_events.pop(order_id, None)
+    def subscribe(self, kind: str, handler: UserDataHandler):
+        """
+        Llama a handler(payload) con cada evento de tipo kind (ver event_kind).
+        Puede ser una función normal o una corrutina (se lanza como tarea).
+        """
+        self._subscribers.setdefault(kind, []).append(handler)
+
+    def wait_order(self, order_id: Optional[OrderKey] = None,
+                   client_id: Optional[str] = None) -> asyncio.Future:
+        """
+        Future que se resuelve con el payload "o" cuando la orden (por orderId,
+        algoId o newClientOrderId) llega a un estado final. Si ya llegó, sale
+        resuelto. Liberar con forget_order() al terminar de esperar.
+        """
+        keys = [k for k in (order_id, client_id) if k]
+        loop = asyncio.get_running_loop()
+        for key in keys:
+            final = self._recent_final.get(key)
+            if final is not None:
+                fut = loop.create_future()
+                fut.set_result(final)
+                return fut
+        fut = next((self._order_waiters[k] for k in keys
+                    if k in self._order_waiters and not self._order_waiters[k].done()), None)
+        if fut is None:
+            fut = loop.create_future()
+        for key in keys:
+            self._order_waiters[key] = fut
+        return fut
+
+    def forget_order(self, order_id: Optional[OrderKey] = None,
+                     client_id: Optional[str] = None):
+        for key in (order_id, client_id):
+            if key:
+                fut = self._order_waiters.pop(key, None)
+                if fut is not None and not fut.done():
+                    fut.cancel()
+
+    def _resolve_order_waiters(self, order: dict):
+        final = dict(order)
+        for key in (int(order.get("i", 0)), int(order.get("A", 0)), order.get("c", "")):
+            if not key:
+                continue
+            self._recent_final[key] = final
+            self._recent_final.move_to_end(key)
+            fut = self._order_waiters.pop(key, None)
+            if fut is not None and not fut.done():
+                fut.set_result(final)
+        while len(self._recent_final) > _RECENT_FINAL_KEPT:
+            self._recent_final.popitem(last=False)
 
     def unregister_client_id(self, client_id: str):
         """Elimina un newClientOrderId del set de entradas vigiladas."""
@@ -89,7 +173,7 @@ class WSManager:
         self._entry_orders.discard(order_id)
         self._tp_orders.discard(order_id)
         self._sl_orders.discard(order_id)
-        self._fill_events.pop(order_id, None)
+        self.forget_order(order_id)
 
     @property
     def connected(self) -> bool:
@@ -148,10 +232,18 @@ class WSManager:
         log.info(f"WS conectando: {url[:60]}...")
 
         async with websockets.connect(url, ping_interval=20, ping_timeout=10) as ws:
+            self._ws = ws
             self._connected = True
+            self._order_mgr.account.invalidate()
+            self._order_mgr.account.live = True
             log.info("WS User Data Stream conectado ✓")
-            async for raw in ws:
-                await self._handle_message(raw)
+            try:
+                async for raw in ws:
+                    await self._handle_message(raw)
+            finally:
+                self._ws = None
+                self._connected = False
+                self._order_mgr.account.live = False
 
     async def _keepalive_loop(self):
         while True:
@@ -174,14 +266,49 @@ class WSManager:
 
         event_type = msg.get("e")
         log.debug(f"WS msg: {event_type} → {str(msg)[:300]}")
-
-        if event_type != "ORDER_TRADE_UPDATE":
+        self._order_mgr.account.apply_ws_event(msg)
+
+        if event_type == "ORDER_TRADE_UPDATE":
+            self._route_order_update(msg.get("o", {}))
+        elif event_type == "listenKeyExpired":
+            log.warning("WS listenKey caducado: reconectando con uno nuevo")
+            if self._ws is not None:
+                await self._ws.close()
+        self._dispatch(msg)
+
+    def _dispatch(self, msg: dict):
+        kind = event_kind(msg)
+        handlers = self._subscribers.get(kind)
+        if not handlers:
             return
+        if kind.startswith(("ORDER_", "ALGO_")):
+            payload = msg.get("o") or {}
+        elif kind == "ACCOUNT_UPDATE":
+            payload = msg.get("a") or {}
+        else:
+            payload = msg
+        for handler in handlers:
+            try:
+                result = handler(payload)
+            except Exception as e:
+                log.error(f"WS: error en suscriptor de {kind}: {e}", exc_info=True)
+                continue
+            if inspect.isawaitable(result):
+                asyncio.ensure_future(result)
 
-        order = msg.get("o", {})
+    def _route_order_update(self, order: dict):
         exec_type    = order.get("x")   # TRADE = fill
         order_status = order.get("X")   # FILLED, PARTIALLY_FILLED, ...
 
+        if order_status in _FINAL_ORDER_STATUSES:
+            self._resolve_order_waiters(order)
+
+        if order_status in ("CANCELED", "EXPIRED", "EXPIRED_IN_MATCH"):
+            # Entrada cancelada/expirada con parte ejecutada: se abre con esa cantidad
+            if float(order.get("z") or 0) > 0:
+                self._route_partial_entry(order)
+            return
+
         if exec_type not in ("TRADE", "FILLED") or order_status != "FILLED":
             return
 
@@ -194,12 +321,7 @@ class WSManager:
             f"symbol={order.get('s')} side={order.get('S')} qty={order.get('q')}"
         )
 
-        # 2. DESPERTAR EJECUTORES REST (si aplica)
-        ev = self._fill_events.pop(order_id, self._fill_events.pop(algo_id, None))
-        if ev is not None:
-            ev.set()
-
-        # 3. EMPAREJAMIENTO CON FIRE-AND-FORGET ASÍNCRONO
+        # 2. EMPAREJAMIENTO CON FIRE-AND-FORGET ASÍNCRONO
         if client_id and client_id in self._entry_orders:
             self._entry_orders.discard(client_id)
             asyncio.create_task(self._on_entry_fill(order), name=f"entry_c_{client_id}")
@@ -210,8 +332,7 @@ class WSManager:
 
         elif algo_id in self._entry_orders:
             self._entry_orders.discard(algo_id)
-            order["i"] = algo_id
-            asyncio.create_task(self._on_entry_fill(order), name=f"entry_a_{algo_id}")
+            asyncio.create_task(self._on_entry_fill(dict(order, i=algo_id)), name=f"entry_a_{algo_id}")
 
         elif order_id in self._tp_orders:
             self._tp_orders.discard(order_id)
@@ -219,8 +340,7 @@ class WSManager:
 
         elif algo_id in self._tp_orders:
             self._tp_orders.discard(algo_id)
-            order["i"] = algo_id
-            asyncio.create_task(self._on_tp_fill(order), name=f"tp_a_{algo_id}")
+            asyncio.create_task(self._on_tp_fill(dict(order, i=algo_id)), name=f"tp_a_{algo_id}")
 
         elif order_id in self._sl_orders:
             self._sl_orders.discard(order_id)
@@ -228,11 +348,24 @@ class WSManager:
 
         elif algo_id in self._sl_orders:
             self._sl_orders.discard(algo_id)
-            order["i"] = algo_id
-            asyncio.create_task(self._on_sl_fill(order), name=f"sl_a_{algo_id}")
+            asyncio.create_task(self._on_sl_fill(dict(order, i=algo_id)), name=f"sl_a_{algo_id}")
 
         else:
             log.debug(
                 f"WS fill de orden no registrada: "
                 f"orderId={order_id} algoId={algo_id} client={client_id}"
             )
+
+    def _route_partial_entry(self, order: dict):
+        order_id  = int(order.get("i", 0))
+        client_id = order.get("c", "")
+        key = client_id if client_id in self._entry_orders else order_id
+        if key not in self._entry_orders:
+            return
+        self._entry_orders.discard(client_id)
+        self._entry_orders.discard(order_id)
+        log.warning(
+            f"WS entrada {order.get('X')} con fill parcial: orderId={order_id} "
+            f"clientId={client_id} ejecutado={order.get('z')}/{order.get('q')}"
+        )
+        asyncio.create_task(self._on_entry_fill(order), name=f"entry_p_{order_id}")
@@ -0,0 +1,97 @@
+"""
+bench_sign.py - Micro-benchmark de la firma de peticiones de OrderManager.
+
+Compara, por petición firmada, el camino anterior (normalizar + urlencode +
+HMAC desde cero + segunda normalización en _request) con RequestSigner
+(HMAC precalculado + codificador plano), y comprueba que ambas firmas
+coinciden. Los dos caminos usan el _to_binance_str actual, así que el ahorro
+de su atajo para floats no entra en la comparación.
+
+Uso (desde la raíz del repo):
+    python tools/bench_sign.py [--n 20000]
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import hmac
+import sys
+import timeit
+from pathlib import Path
+from urllib.parse import urlencode
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.order_manager import RequestSigner, _all_str, _normalize_binance_value  # noqa: E402
+
+_SECRET = "x" * 64
+_TIMESTAMP = 1_700_000_000_000
+
+# Peticiones típicas: consulta de reconciliación y orden con precio/cantidad
+_CASES = {
+    "reconcile": {"symbol": "BTCUSDT"},
+    "open_orders": {"symbol": "1000PEPEUSDT", "orderId": 123456789},
+    "entry": {
+        "symbol": "1000PEPEUSDT",
+        "side": "SELL",
+        "type": "LIMIT",
+        "timeInForce": "GTC",
+        "quantity": 125000.0,
+        "price": 0.0000123,
+        "priceMatch": "OPPONENT_5",
+        "newClientOrderId": "gt_a1b2c3d4e5f6",
+    },
+    "algo_sl": {
+        "symbol": "ETHUSDT",
+        "side": "BUY",
+        "algoType": "CONDITIONAL",
+        "type": "STOP_MARKET",
+        "triggerPrice": 3456.78,
+        "closePosition": "true",
+        "workingType": "MARK_PRICE",
+    },
+}
+
+
+def _legacy_sign(params: dict) -> dict:
+    """Implementación anterior de OrderManager._sign + normalización de _request."""
+    params = _normalize_binance_value(dict(params))
+    params["timestamp"] = _TIMESTAMP
+    qs = urlencode(params)
+    params["signature"] = hmac.new(
+        _SECRET.encode("utf-8"),
+        qs.encode("utf-8"),
+        hashlib.sha256,
+    ).hexdigest()
+    return _normalize_binance_value(params)
+
+
+def _fast_sign(signer: RequestSigner, params: dict) -> dict:
+    out = signer.sign(params, _TIMESTAMP)
+    return out if _all_str(out) else _normalize_binance_value(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--n", type=int, default=20000, help="firmas por caso")
+    args = parser.parse_args()
+
+    signer = RequestSigner(_SECRET)
+    print(f"{'caso':<12} {'anterior µs':>12} {'nuevo µs':>10} {'ahorro':>8}")
+    for name, params in _CASES.items():
+        legacy = _legacy_sign(params)
+        fast = _fast_sign(signer, params)
+        if legacy["signature"] != fast["signature"]:
+            raise SystemExit(f"{name}: las firmas no coinciden")
+        t_legacy = min(timeit.repeat(lambda: _legacy_sign(params), number=args.n, repeat=5))
+        t_fast = min(timeit.repeat(lambda: _fast_sign(signer, params), number=args.n, repeat=5))
+        us_legacy = t_legacy / args.n * 1e6
+        us_fast = t_fast / args.n * 1e6
+        print(
+            f"{name:<12} {us_legacy:>12.2f} {us_fast:>10.2f} "
+            f"{(1 - us_fast / us_legacy) * 100:>7.0f}%"
+        )
+
+
+if __name__ == "__main__":
+    main()
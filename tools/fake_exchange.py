@@ -0,0 +1,1223 @@
+"""
+fake_exchange.py - Binance USDⓈ-M Futures simulado en local (REST + User Data Stream).
+
+Implementa en memoria los endpoints que usan OrderManager y WSManager, para
+poder ejecutar el bot entero sin cuenta: órdenes regulares, algo y por lotes,
+órdenes abiertas, posiciones, balance, bookTicker, premiumIndex, klines,
+userTrades, exchangeInfo, listenKey, el WebSocket de usuario
+(ORDER_TRADE_UPDATE, ALGO_UPDATE, ACCOUNT_UPDATE) y el stream combinado de
+mercado en /stream (SUBSCRIBE/UNSUBSCRIBE de <symbol>@markPrice@1s,
+@bookTicker y @kline_5m).
+
+Para una semilla y una misma secuencia de peticiones todo es reproducible:
+
+  latencia   latency_ms fija + jitter uniforme (jitter_ms) + picos
+             (spike_pct % de las peticiones tardan spike_ms más). El WS puede
+             ir con ws_delay_ms de retraso respecto al REST.
+  errores    error_pct: probabilidad (%) por código en los endpoints donde
+             Binance lo devuelve (-2011 cancelaciones, -2021/-4045 órdenes
+             algo, -4400 órdenes que no reducen, 429/503 cualquiera), o los N
+             siguientes con inject(). -2021 y -4045 también salen solos
+             cuando toca (trigger ya cruzado, 200 órdenes algo abiertas).
+  fills      las órdenes LIMIT que cruzan al llegar (priceMatch OPPONENT*,
+             precio marcable) llenan tras fill_delay_ms con probabilidad
+             fill_pct, decidida por orderId; las que no, quedan vivas hasta
+             que se cancelan. MARKET llena siempre. Las LIMIT que no cruzan y
+             las algo (SL/TP) llenan cuando el precio simulado llega a su
+             nivel.
+  precios    paseo aleatorio por símbolo cada tick_ms (volatility_bps de
+             desviación y drift_bps de tendencia por tick).
+
+Con api_secret comprueba la firma HMAC de cada petición firmada (-1022), y
+con clock_offset_ms desplaza el reloj del servidor para provocar -1021.
+
+Uso (desde la raíz del repo):
+    python tools/fake_exchange.py --port 8765 --latency-ms 5 --fill-delay-ms 50
+
+y en config.yaml:
+    binance:
+      base_url: "http://127.0.0.1:8765"
+      ws_base_url: "ws://127.0.0.1:8765"
+
+tools/load_test.py lo arranca en el mismo proceso para medir el motor.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import math
+import random
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from aiohttp import WSMsgType, web
+
+FAKE_EXCHANGE_VERSION = "0.02"
+
+_ORDER = "/fapi/v1/order"
+_ALGO = "/fapi/v1/algoOrder"
+_BATCH = "/fapi/v1/batchOrders"
+
+_SIGNED_PATHS = {
+    _ORDER, _ALGO, _BATCH,
+    "/fapi/v1/allOpenOrders",
+    "/fapi/v1/openOrders",
+    "/fapi/v1/openAlgoOrders",
+    "/fapi/v2/positionRisk",
+    "/fapi/v2/balance",
+    "/fapi/v1/apiTradingStatus",
+    "/fapi/v1/leverage",
+    "/fapi/v1/marginType",
+    "/fapi/v1/userTrades",
+}
+# Peso aproximado de Binance (las variantes sin símbolo pesan más)
+_WEIGHTS = {
+    "/fapi/v2/positionRisk": 5,
+    "/fapi/v2/balance": 5,
+    "/fapi/v1/userTrades": 5,
+    "/fapi/v1/exchangeInfo": 1,
+    "/fapi/v1/klines": 2,
+}
+_WEIGHTS_ALL_SYMBOLS = {
+    "/fapi/v1/openOrders": 40,
+    "/fapi/v1/openAlgoOrders": 40,
+    "/fapi/v1/ticker/bookTicker": 5,
+    "/fapi/v1/premiumIndex": 10,
+}
+
+_ERROR_MSGS = {
+    -1001: "Internal error; unable to process your request. Please try again.",
+    -1003: "Too many requests; current limit of IP is 2400 requests per minute.",
+    -1021: "Timestamp for this request is outside of the recvWindow.",
+    -1022: "Signature for this request is not valid.",
+    -1102: "Mandatory parameter was not sent, was empty/null, or malformed.",
+    -1121: "Invalid symbol.",
+    -2011: "Unknown order sent.",
+    -2013: "Order does not exist.",
+    -2021: "Order would immediately trigger.",
+    -2022: "ReduceOnly Order is rejected.",
+    -4045: "Reach max stop order limit.",
+    -4046: "No need to change margin type.",
+    -4400: "Futures Trading Quantitative Rules violated, only reduceOnly order is allowed, "
+           "please try again later.",
+    -5022: "Due to the order could not be executed as maker, the Post Only order will be rejected.",
+}
+INJECTABLE_CODES = (-2011, -2021, -4045, -4400, 429, 503)
+
+_MAX_ALGO_ORDERS = 200
+_CANDLES_KEPT = 500
+_INTERVAL_MIN = {"1m": 1, "3m": 3, "5m": 5, "15m": 15, "30m": 30, "1h": 60, "2h": 120, "4h": 240}
+
+
+class FakeError(Exception):
+    def __init__(self, code: int, msg: str = "", status: int = 400):
+        super().__init__(code, msg)
+        self.code = code
+        self.msg = msg or _ERROR_MSGS.get(code, "error")
+        self.status = status
+
+
+@dataclass
+class FakeSettings:
+    seed: int = 1
+    symbols: int = 50
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    spike_pct: float = 0.0
+    spike_ms: float = 0.0
+    ws_delay_ms: float = 0.0
+    fill_pct: float = 100.0
+    fill_delay_ms: float = 0.0
+    tick_ms: float = 100.0
+    volatility_bps: float = 5.0
+    drift_bps: float = 0.0
+    error_pct: Dict[int, float] = field(default_factory=dict)
+    api_secret: str = ""
+    clock_offset_ms: float = 0.0
+    balance_usdt: float = 10_000.0
+
+
+class _Market:
+    __slots__ = ("symbol", "mid", "tick", "price_digits", "step", "qty_digits", "candles")
+
+    def __init__(self, symbol: str, mid: float):
+        magnitude = math.floor(math.log10(mid))
+        self.symbol = symbol
+        self.price_digits = max(0, 4 - magnitude)
+        self.tick = 10 ** -self.price_digits
+        self.qty_digits = max(0, magnitude + 2)
+        self.step = 10 ** -self.qty_digits
+        self.mid = round(mid, self.price_digits)
+        # Velas de 1m: [open_time_ms, open, high, low, close]
+        self.candles: Deque[list] = deque(maxlen=_CANDLES_KEPT)
+
+    @property
+    def bid(self) -> float:
+        return round(math.floor(self.mid / self.tick) * self.tick, self.price_digits)
+
+    @property
+    def ask(self) -> float:
+        return round(self.bid + self.tick, self.price_digits)
+
+    def price(self, value: float) -> str:
+        return f"{value:.{self.price_digits}f}"
+
+    def record(self, now_ms: int):
+        open_time = now_ms - now_ms % 60_000
+        if self.candles and self.candles[-1][0] == open_time:
+            candle = self.candles[-1]
+            candle[2] = max(candle[2], self.mid)
+            candle[3] = min(candle[3], self.mid)
+            candle[4] = self.mid
+        else:
+            self.candles.append([open_time, self.mid, self.mid, self.mid, self.mid])
+
+
+class FakeExchange:
+    def __init__(self, settings: Optional[FakeSettings] = None):
+        self.settings = settings or FakeSettings()
+        seed = self.settings.seed
+        self._rng_latency = random.Random(f"{seed}:latency")
+        self._rng_errors = random.Random(f"{seed}:errors")
+        self._rng_prices = random.Random(f"{seed}:prices")
+        self._markets: Dict[str, _Market] = {}
+        setup = random.Random(f"{seed}:markets")
+        for i in range(self.settings.symbols):
+            symbol = f"SIM{i:03d}USDT"
+            self._markets[symbol] = _Market(symbol, 10 ** setup.uniform(-1.0, 2.0))
+
+        self._orders: Dict[int, dict] = {}        # orderId → orden (todas)
+        self._open: Dict[int, dict] = {}          # orderId → orden viva
+        self._by_client: Dict[str, int] = {}      # clientOrderId → orderId
+        self._no_fill: set = set()                # órdenes marcables que no llenarán
+        self._algos: Dict[int, dict] = {}         # algoId → orden algo viva
+        self._positions: Dict[str, List[float]] = {}   # symbol → [amt, entry_price]
+        self._trades: Dict[str, List[dict]] = {}
+        self._margin_types: Dict[str, str] = {}
+        self._leverage: Dict[str, int] = {}
+        self._wallet = self.settings.balance_usdt
+        self._next_id = 1_000_000
+        self._trade_id = 1
+        self._listen_keys: set = set()
+        self._ws_queues: List[asyncio.Queue] = []
+        self._stream_subs: Dict[asyncio.Queue, set] = {}   # conexión /stream → streams
+        self._last_books: Dict[str, Tuple[float, float]] = {}
+        self._next_mark_ms = 0
+        self._kline_open_ms = 0
+        self._forced_errors: Counter = Counter()
+        self._weight_minute = 0
+        self._weight_used = 0
+        self._orders_10s: Tuple[int, int] = (0, 0)
+        self._orders_1m: Tuple[int, int] = (0, 0)
+
+        self.requests: Counter = Counter()
+        self.injected: Counter = Counter()
+        self.fills = 0
+        self.ws_events = 0
+        self.stream_messages = 0
+
+        self._runner: Optional[web.AppRunner] = None
+        self._tick_task: Optional[asyncio.Task] = None
+        self._ws_tasks: set = set()
+        self._ws_conns: set = set()
+        self.base_url = ""
+        self.ws_base_url = ""
+        self._route_table = self._routes()
+
+    # ──────────────────────────────────────────────────────────────────
+    # Arranque / Parada
+    # ──────────────────────────────────────────────────────────────────
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self._markets)
+
+    def price(self, symbol: str) -> float:
+        return self._markets[symbol].mid
+
+    def set_price(self, symbol: str, price: float):
+        """Fija el precio de un símbolo y evalúa al momento las órdenes afectadas."""
+        market = self._markets[symbol]
+        market.mid = round(price, market.price_digits)
+        self._check_resting(market, self._now_ms())
+
+    def inject(self, code: int, count: int = 1):
+        """Fuerza code en las próximas count peticiones donde Binance podría devolverlo."""
+        self._forced_errors[code] += count
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_route("*", "/ws/{listen_key}", self._ws_handler)
+        app.router.add_route("*", "/stream", self._stream_handler)
+        app.router.add_route("*", "/{tail:.*}", self._dispatch)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_host, bound_port = self._runner.addresses[0][:2]
+        self.base_url = f"http://{bound_host}:{bound_port}"
+        self.ws_base_url = f"ws://{bound_host}:{bound_port}"
+        now_ms = self._now_ms()
+        for market in self._markets.values():
+            market.record(now_ms)
+        self._tick_task = asyncio.create_task(self._tick_loop(), name="fake_exchange_ticks")
+        return self.base_url
+
+    async def stop(self):
+        if self._tick_task:
+            self._tick_task.cancel()
+        for ws in list(self._ws_conns):
+            await ws.close()
+        for task in list(self._ws_tasks):
+            task.cancel()
+        if self._runner:
+            await self._runner.cleanup()
+
+    # ──────────────────────────────────────────────────────────────────
+    # HTTP: latencia, firma, errores y cabeceras de peso
+    # ──────────────────────────────────────────────────────────────────
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        if request.path.startswith("/ws/") or request.path == "/stream":
+            return await handler(request)
+        delay_ms = self._latency_ms()
+        if delay_ms > 0:
+            await asyncio.sleep(delay_ms / 1000.0)
+        key = f"{request.method} {request.path}"
+        self.requests[key] += 1
+        try:
+            params = dict(request.query)
+            body = ""
+            if request.method == "POST":
+                body = await request.text()
+                params.update(dict((await request.post()).items()))
+            if request.path in _SIGNED_PATHS:
+                self._check_signature(request, body, params)
+            self._maybe_inject(request.method, request.path, params)
+            request["params"] = params
+            data = await handler(request)
+            response = web.json_response(data)
+        except FakeError as e:
+            response = web.json_response({"code": e.code, "msg": e.msg}, status=e.status)
+            if e.status == 429:
+                response.headers["Retry-After"] = "1"
+        self._add_weight_headers(response, request.method, request.path, request.query)
+        return response
+
+    def _latency_ms(self) -> float:
+        s = self.settings
+        delay = s.latency_ms
+        if s.jitter_ms > 0:
+            delay += self._rng_latency.uniform(0.0, s.jitter_ms)
+        if s.spike_pct > 0 and self._rng_latency.random() * 100 < s.spike_pct:
+            delay += s.spike_ms
+        return delay
+
+    def _check_signature(self, request: web.Request, body: str, params: dict):
+        if "timestamp" not in params or "signature" not in params:
+            raise FakeError(-1102)
+        window = float(params.get("recvWindow") or 5000)
+        if abs(self._now_ms() - float(params["timestamp"])) > window:
+            raise FakeError(-1021)
+        if not self.settings.api_secret:
+            return
+        payload = request.rel_url.raw_query_string
+        if body:
+            payload = f"{payload}&{body}" if payload else body
+        payload = payload.rsplit("&signature=", 1)[0]
+        expected = hmac.new(self.settings.api_secret.encode(), payload.encode(), hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(expected, params["signature"]):
+            raise FakeError(-1022)
+
+    def _maybe_inject(self, method: str, path: str, params: dict):
+        for code in INJECTABLE_CODES:
+            if not _error_applies(code, method, path, params):
+                continue
+            forced = self._forced_errors[code] > 0
+            pct = self.settings.error_pct.get(code, 0.0)
+            if forced:
+                self._forced_errors[code] -= 1
+            elif not (pct > 0 and self._rng_errors.random() * 100 < pct):
+                continue
+            self.injected[code] += 1
+            if code == 429:
+                raise FakeError(-1003, status=429)
+            if code == 503:
+                raise FakeError(-1001, status=503)
+            raise FakeError(code)
+
+    def _add_weight_headers(self, response: web.StreamResponse, method: str, path: str, query):
+        now_s = int(time.time())
+        minute = now_s // 60
+        if minute != self._weight_minute:
+            self._weight_minute, self._weight_used = minute, 0
+        weight = _WEIGHTS.get(path, 1)
+        if "symbol" not in query and path in _WEIGHTS_ALL_SYMBOLS:
+            weight = _WEIGHTS_ALL_SYMBOLS[path]
+        self._weight_used += weight
+        response.headers["X-MBX-USED-WEIGHT-1M"] = str(self._weight_used)
+        if method == "POST" and path in (_ORDER, _ALGO, _BATCH):
+            self._orders_10s = _bump(self._orders_10s, now_s // 10)
+            self._orders_1m = _bump(self._orders_1m, minute)
+            response.headers["X-MBX-ORDER-COUNT-10S"] = str(self._orders_10s[1])
+            response.headers["X-MBX-ORDER-COUNT-1M"] = str(self._orders_1m[1])
+
+    async def _dispatch(self, request: web.Request) -> Any:
+        route = self._route_table.get((request.method, request.path))
+        if route is None:
+            raise FakeError(-1102, f"{request.method} {request.path} no simulado", status=404)
+        return route(request["params"])
+
+    def _routes(self) -> dict:
+        return {
+            ("GET", "/fapi/v1/ping"): lambda p: {},
+            ("GET", "/fapi/v1/time"): lambda p: {"serverTime": self._now_ms()},
+            ("GET", "/fapi/v1/exchangeInfo"): self._exchange_info,
+            ("GET", "/fapi/v1/ticker/bookTicker"): self._book_ticker,
+            ("GET", "/fapi/v1/premiumIndex"): self._premium_index,
+            ("GET", "/fapi/v1/klines"): self._klines,
+            ("GET", "/fapi/v2/balance"): self._balance,
+            ("GET", "/fapi/v1/apiTradingStatus"): lambda p: {"indicators": {}, "updateTime": self._now_ms()},
+            ("POST", "/fapi/v1/leverage"): self._set_leverage,
+            ("POST", "/fapi/v1/marginType"): self._set_margin_type,
+            ("GET", "/fapi/v2/positionRisk"): self._position_risk,
+            ("GET", "/fapi/v1/openOrders"): self._open_orders,
+            ("GET", "/fapi/v1/openAlgoOrders"): self._open_algo_orders,
+            ("GET", "/fapi/v1/userTrades"): self._user_trades,
+            ("POST", _ORDER): self._new_order,
+            ("GET", _ORDER): self._query_order,
+            ("DELETE", _ORDER): self._cancel_order,
+            ("POST", _ALGO): self._new_algo_order,
+            ("DELETE", _ALGO): self._cancel_algo_order,
+            ("POST", _BATCH): self._batch_new,
+            ("DELETE", _BATCH): self._batch_cancel,
+            ("DELETE", "/fapi/v1/allOpenOrders"): self._cancel_all,
+            ("POST", "/fapi/v1/listenKey"): self._new_listen_key,
+            ("PUT", "/fapi/v1/listenKey"): lambda p: {},
+            ("DELETE", "/fapi/v1/listenKey"): lambda p: {},
+        }
+
+    # ──────────────────────────────────────────────────────────────────
+    # Mercado
+    # ──────────────────────────────────────────────────────────────────
+
+    def _market(self, params: dict) -> _Market:
+        symbol = params.get("symbol")
+        if not symbol:
+            raise FakeError(-1102)
+        market = self._markets.get(symbol)
+        if market is None:
+            raise FakeError(-1121)
+        return market
+
+    def _selected(self, params: dict) -> List[_Market]:
+        return [self._market(params)] if params.get("symbol") else list(self._markets.values())
+
+    def _exchange_info(self, params: dict) -> dict:
+        return {
+            "timezone": "UTC",
+            "serverTime": self._now_ms(),
+            "rateLimits": [],
+            "symbols": [
+                {
+                    "symbol": m.symbol,
+                    "pair": m.symbol,
+                    "contractType": "PERPETUAL",
+                    "status": "TRADING",
+                    "baseAsset": m.symbol[:-4],
+                    "quoteAsset": "USDT",
+                    "pricePrecision": m.price_digits,
+                    "quantityPrecision": m.qty_digits,
+                    "filters": [
+                        {"filterType": "PRICE_FILTER", "tickSize": m.price(m.tick),
+                         "minPrice": m.price(m.tick), "maxPrice": "1000000"},
+                        {"filterType": "LOT_SIZE", "stepSize": _fmt(m.step),
+                         "minQty": _fmt(m.step), "maxQty": "10000000"},
+                        {"filterType": "MARKET_LOT_SIZE", "stepSize": _fmt(m.step),
+                         "minQty": _fmt(m.step), "maxQty": "10000000"},
+                        {"filterType": "MIN_NOTIONAL", "notional": "5"},
+                    ],
+                }
+                for m in self._markets.values()
+            ],
+        }
+
+    def _book_ticker(self, params: dict) -> Any:
+        now_ms = self._now_ms()
+        items = [
+            {"symbol": m.symbol, "bidPrice": m.price(m.bid), "bidQty": "1000",
+             "askPrice": m.price(m.ask), "askQty": "1000", "time": now_ms}
+            for m in self._selected(params)
+        ]
+        return items[0] if params.get("symbol") else items
+
+    def _premium_index(self, params: dict) -> Any:
+        now_ms = self._now_ms()
+        items = [
+            {"symbol": m.symbol, "markPrice": m.price(m.mid), "indexPrice": m.price(m.mid),
+             "estimatedSettlePrice": m.price(m.mid), "lastFundingRate": "0.00010000",
+             "interestRate": "0.00010000", "nextFundingTime": now_ms - now_ms % 28_800_000 + 28_800_000,
+             "time": now_ms}
+            for m in self._selected(params)
+        ]
+        return items[0] if params.get("symbol") else items
+
+    def _klines(self, params: dict) -> list:
+        market = self._market(params)
+        minutes = _INTERVAL_MIN.get(params.get("interval", "1m"))
+        if minutes is None:
+            raise FakeError(-1102, "interval no simulado")
+        limit = max(1, min(int(params.get("limit") or 500), 1500))
+        span = minutes * 60_000
+        groups: Dict[int, list] = {}
+        for open_time, o, h, lo, c in market.candles:
+            start = open_time - open_time % span
+            group = groups.get(start)
+            if group is None:
+                groups[start] = [o, h, lo, c]
+            else:
+                group[1], group[2], group[3] = max(group[1], h), min(group[2], lo), c
+        out = []
+        for start in sorted(groups)[-limit:]:
+            o, h, lo, c = groups[start]
+            out.append([start, market.price(o), market.price(h), market.price(lo), market.price(c),
+                        "0", start + span - 1, "0", 0, "0", "0", "0"])
+        return out
+
+    # ──────────────────────────────────────────────────────────────────
+    # Cuenta
+    # ──────────────────────────────────────────────────────────────────
+
+    def _balance(self, params: dict) -> list:
+        pnl = self._unrealized_pnl()
+        wallet = _fmt(round(self._wallet, 8))
+        return [{
+            "accountAlias": "SgsR", "asset": "USDT", "balance": wallet,
+            "crossWalletBalance": wallet, "crossUnPnl": _fmt(round(pnl, 8)),
+            "availableBalance": _fmt(round(self._wallet + pnl, 8)),
+            "maxWithdrawAmount": wallet, "marginAvailable": True, "updateTime": self._now_ms(),
+        }]
+
+    def _set_leverage(self, params: dict) -> dict:
+        market = self._market(params)
+        self._leverage[market.symbol] = int(params.get("leverage") or 1)
+        return {"leverage": self._leverage[market.symbol], "maxNotionalValue": "1000000",
+                "symbol": market.symbol}
+
+    def _set_margin_type(self, params: dict) -> dict:
+        market = self._market(params)
+        margin_type = str(params.get("marginType", "CROSSED")).upper()
+        if self._margin_types.get(market.symbol, "CROSSED") == margin_type:
+            raise FakeError(-4046)
+        self._margin_types[market.symbol] = margin_type
+        return {"code": 200, "msg": "success"}
+
+    def _position_risk(self, params: dict) -> list:
+        out = []
+        for market in self._selected(params):
+            amt, entry = self._positions.get(market.symbol, (0.0, 0.0))
+            out.append({
+                "symbol": market.symbol,
+                "positionAmt": _fmt(amt),
+                "entryPrice": market.price(entry),
+                "breakEvenPrice": market.price(entry),
+                "markPrice": market.price(market.mid),
+                "unRealizedProfit": _fmt(round((market.mid - entry) * amt, 8)),
+                "liquidationPrice": "0",
+                "leverage": str(self._leverage.get(market.symbol, 1)),
+                "maxNotionalValue": "1000000",
+                "marginType": "isolated" if self._margin_types.get(market.symbol) == "ISOLATED" else "cross",
+                "isolatedMargin": "0",
+                "isAutoAddMargin": "false",
+                "positionSide": "BOTH",
+                "notional": _fmt(round(amt * market.mid, 8)),
+                "isolatedWallet": "0",
+                "updateTime": self._now_ms(),
+            })
+        return out
+
+    def _open_orders(self, params: dict) -> list:
+        symbol = params.get("symbol")
+        return [_public(o) for o in self._open.values() if not symbol or o["symbol"] == symbol]
+
+    def _open_algo_orders(self, params: dict) -> list:
+        symbol = params.get("symbol")
+        return [dict(a) for a in self._algos.values() if not symbol or a["symbol"] == symbol]
+
+    def _user_trades(self, params: dict) -> list:
+        market = self._market(params)
+        start = int(params.get("startTime") or 0)
+        end = int(params.get("endTime") or 2 ** 62)
+        limit = max(1, min(int(params.get("limit") or 500), 1000))
+        trades = [t for t in self._trades.get(market.symbol, []) if start <= t["time"] <= end]
+        return trades[-limit:]
+
+    def _unrealized_pnl(self) -> float:
+        return sum((self._markets[s].mid - entry) * amt for s, (amt, entry) in self._positions.items())
+
+    # ──────────────────────────────────────────────────────────────────
+    # Órdenes regulares
+    # ──────────────────────────────────────────────────────────────────
+
+    def _new_order(self, params: dict) -> dict:
+        market = self._market(params)
+        side = str(params.get("side", "")).upper()
+        order_type = str(params.get("type", "")).upper()
+        quantity = float(params.get("quantity") or 0)
+        if side not in ("BUY", "SELL") or order_type not in ("LIMIT", "MARKET") or quantity <= 0:
+            raise FakeError(-1102)
+        reduce_only = _true(params.get("reduceOnly"))
+        if reduce_only and not self._reducible(market.symbol, side):
+            raise FakeError(-2022)
+        tif = str(params.get("timeInForce") or "GTC").upper()
+        price_match = str(params.get("priceMatch") or "NONE").upper()
+        price = 0.0
+        if order_type == "LIMIT":
+            if price_match != "NONE":
+                price = _match_price(market, side, price_match)
+            else:
+                price = float(params.get("price") or 0)
+                if price <= 0:
+                    raise FakeError(-1102)
+            if tif == "GTX" and _marketable(market, side, price):
+                raise FakeError(-5022)
+
+        order = self._create_order(market, side, order_type, quantity, price, params,
+                                   reduce_only=reduce_only, tif=tif, price_match=price_match)
+        if order_type == "MARKET":
+            self._schedule_fill(order, self.settings.fill_delay_ms)
+        elif _marketable(market, side, price):
+            order["_taker"] = True
+            if _order_fills(self.settings, order["orderId"]):
+                self._schedule_fill(order, self.settings.fill_delay_ms)
+            else:
+                self._no_fill.add(order["orderId"])
+        return _public(order)
+
+    def _create_order(self, market: _Market, side: str, order_type: str, quantity: float,
+                      price: float, params: dict, reduce_only: bool = False, tif: str = "GTC",
+                      price_match: str = "NONE", algo: Optional[dict] = None) -> dict:
+        now_ms = self._now_ms()
+        order_id = self._new_id()
+        client_id = str(params.get("newClientOrderId") or f"fake_{order_id}")
+        order = {
+            "orderId": order_id,
+            "symbol": market.symbol,
+            "status": "NEW",
+            "clientOrderId": client_id,
+            "price": market.price(price),
+            "avgPrice": "0",
+            "origQty": _fmt(quantity),
+            "executedQty": "0",
+            "cumQuote": "0",
+            "timeInForce": tif,
+            "type": order_type,
+            "reduceOnly": reduce_only,
+            "closePosition": False,
+            "side": side,
+            "positionSide": "BOTH",
+            "stopPrice": "0",
+            "workingType": "CONTRACT_PRICE",
+            "priceProtect": False,
+            "origType": algo["orderType"] if algo else order_type,
+            "priceMatch": price_match,
+            "selfTradePreventionMode": "EXPIRE_MAKER",
+            "goodTillDate": 0,
+            "time": now_ms,
+            "updateTime": now_ms,
+        }
+        if algo:
+            order["_algoId"] = algo["algoId"]
+        self._orders[order_id] = order
+        self._open[order_id] = order
+        self._by_client[client_id] = order_id
+        self._emit_order(order, "NEW")
+        return order
+
+    def _find_order(self, params: dict) -> Optional[dict]:
+        order_id = params.get("orderId")
+        if order_id is None and params.get("origClientOrderId"):
+            order_id = self._by_client.get(params["origClientOrderId"])
+        if order_id is None:
+            raise FakeError(-1102)
+        return self._orders.get(int(order_id))
+
+    def _query_order(self, params: dict) -> dict:
+        order = self._find_order(params)
+        if order is None:
+            raise FakeError(-2013)
+        return _public(order)
+
+    def _cancel_order(self, params: dict) -> dict:
+        order = self._find_order(params)
+        if order is None or order["orderId"] not in self._open:
+            raise FakeError(-2011)
+        self._close_order(order, "CANCELED")
+        return _public(order)
+
+    def _cancel_all(self, params: dict) -> dict:
+        market = self._market(params)
+        for order in [o for o in self._open.values() if o["symbol"] == market.symbol]:
+            self._close_order(order, "CANCELED")
+        return {"code": 200, "msg": "The operation of cancel all open order is done."}
+
+    def _batch_new(self, params: dict) -> list:
+        out = []
+        for item in json.loads(params.get("batchOrders") or "[]"):
+            try:
+                out.append(self._new_order({k: str(v) for k, v in item.items()}))
+            except FakeError as e:
+                out.append({"code": e.code, "msg": e.msg})
+        return out
+
+    def _batch_cancel(self, params: dict) -> list:
+        out = []
+        for order_id in json.loads(params.get("orderIdList") or "[]"):
+            try:
+                out.append(self._cancel_order({"symbol": params.get("symbol"), "orderId": order_id}))
+            except FakeError as e:
+                out.append({"code": e.code, "msg": e.msg})
+        return out
+
+    def _close_order(self, order: dict, status: str):
+        self._open.pop(order["orderId"], None)
+        self._no_fill.discard(order["orderId"])
+        order["status"] = status
+        order["updateTime"] = self._now_ms()
+        self._emit_order(order, status)
+
+    # ──────────────────────────────────────────────────────────────────
+    # Órdenes algo (condicionales)
+    # ──────────────────────────────────────────────────────────────────
+
+    def _new_algo_order(self, params: dict) -> dict:
+        market = self._market(params)
+        side = str(params.get("side", "")).upper()
+        order_type = str(params.get("type") or params.get("orderType") or "").upper()
+        trigger = float(params.get("triggerPrice") or params.get("stopPrice") or 0)
+        close_position = _true(params.get("closePosition"))
+        quantity = float(params.get("quantity") or 0)
+        if (side not in ("BUY", "SELL") or trigger <= 0
+                or order_type not in ("STOP_MARKET", "TAKE_PROFIT_MARKET", "STOP", "TAKE_PROFIT")
+                or (quantity <= 0 and not close_position)):
+            raise FakeError(-1102)
+        if _triggered(order_type, side, trigger, market.mid):
+            raise FakeError(-2021)
+        if len(self._algos) >= _MAX_ALGO_ORDERS:
+            raise FakeError(-4045)
+        now_ms = self._now_ms()
+        algo_id = self._new_id()
+        algo = {
+            "algoId": algo_id,
+            "clientAlgoId": str(params.get("clientAlgoId") or f"fake_algo_{algo_id}"),
+            "algoType": "CONDITIONAL",
+            "orderType": order_type,
+            "symbol": market.symbol,
+            "side": side,
+            "positionSide": "BOTH",
+            "timeInForce": "GTC",
+            "quantity": _fmt(quantity),
+            "algoStatus": "NEW",
+            "triggerPrice": market.price(trigger),
+            "price": str(params.get("price") or "0"),
+            "workingType": str(params.get("workingType") or "CONTRACT_PRICE"),
+            "priceProtect": _true(params.get("priceProtect")),
+            "reduceOnly": _true(params.get("reduceOnly")),
+            "closePosition": close_position,
+            "createTime": now_ms,
+            "updateTime": now_ms,
+        }
+        self._algos[algo_id] = algo
+        self._emit_algo(algo)
+        return dict(algo)
+
+    def _cancel_algo_order(self, params: dict) -> dict:
+        algo = self._algos.pop(int(params.get("algoId") or 0), None)
+        if algo is None:
+            raise FakeError(-2011)
+        algo["algoStatus"] = "CANCELED"
+        algo["updateTime"] = self._now_ms()
+        self._emit_algo(algo)
+        return {"algoId": algo["algoId"], "clientAlgoId": algo["clientAlgoId"],
+                "code": "200", "msg": "success"}
+
+    def _trigger_algo(self, algo: dict, market: _Market):
+        self._algos.pop(algo["algoId"], None)
+        algo["algoStatus"] = "TRIGGERED"
+        algo["updateTime"] = self._now_ms()
+        self._emit_algo(algo)
+        quantity = float(algo["quantity"])
+        if algo["closePosition"]:
+            quantity = abs(self._positions.get(market.symbol, (0.0, 0.0))[0])
+        if quantity <= 0 or ((algo["reduceOnly"] or algo["closePosition"])
+                             and not self._reducible(market.symbol, algo["side"])):
+            algo["algoStatus"] = "EXPIRED"
+            self._emit_algo(algo)
+            return
+        order = self._create_order(market, algo["side"], "MARKET", quantity, 0.0,
+                                   {"newClientOrderId": algo["clientAlgoId"]},
+                                   reduce_only=True, algo=algo)
+        self._fill(order)
+        algo["algoStatus"] = "FINISHED"
+        self._emit_algo(algo)
+
+    # ──────────────────────────────────────────────────────────────────
+    # Fills y posiciones
+    # ──────────────────────────────────────────────────────────────────
+
+    def _schedule_fill(self, order: dict, delay_ms: float):
+        loop = asyncio.get_running_loop()
+        if delay_ms > 0:
+            loop.call_later(delay_ms / 1000.0, self._fill, order)
+        else:
+            loop.call_soon(self._fill, order)
+
+    def _reducible(self, symbol: str, side: str) -> bool:
+        amt = self._positions.get(symbol, (0.0, 0.0))[0]
+        return (side == "BUY" and amt < 0) or (side == "SELL" and amt > 0)
+
+    def _fill(self, order: dict):
+        if order["orderId"] not in self._open:
+            return   # cancelada antes de llenar
+        market = self._markets[order["symbol"]]
+        side = order["side"]
+        quantity = float(order["origQty"])
+        amt, entry = self._positions.get(market.symbol, (0.0, 0.0))
+        if order["reduceOnly"]:
+            quantity = min(quantity, abs(amt)) if self._reducible(market.symbol, side) else 0.0
+        if quantity <= 0:
+            self._close_order(order, "EXPIRED")
+            return
+        touch = market.ask if side == "BUY" else market.bid
+        limit = float(order["price"])
+        if order["type"] == "MARKET" or limit <= 0:
+            price = touch
+        else:
+            price = min(limit, touch) if side == "BUY" else max(limit, touch)
+        maker = order["type"] == "LIMIT" and not order.get("_taker")
+        signed_qty = quantity if side == "BUY" else -quantity
+        realized = 0.0
+        if amt == 0 or (amt > 0) == (signed_qty > 0):
+            new_amt = amt + signed_qty
+            entry = (abs(amt) * entry + quantity * price) / abs(new_amt)
+        else:
+            closed = min(abs(amt), quantity)
+            realized = (price - entry) * closed * (1 if amt > 0 else -1)
+            new_amt = amt + signed_qty
+            if new_amt == 0:
+                entry = 0.0
+            elif (new_amt > 0) != (amt > 0):
+                entry = price
+        new_amt = round(new_amt, market.qty_digits)
+        commission = quantity * price * (0.0002 if maker else 0.0005)
+        self._wallet += realized - commission
+        if new_amt == 0:
+            self._positions.pop(market.symbol, None)
+        else:
+            self._positions[market.symbol] = [new_amt, entry]
+
+        now_ms = self._now_ms()
+        self._open.pop(order["orderId"], None)
+        order.update({
+            "status": "FILLED", "executedQty": _fmt(quantity), "avgPrice": market.price(price),
+            "cumQuote": _fmt(round(quantity * price, 8)), "updateTime": now_ms,
+        })
+        trade_id = self._trade_id
+        self._trade_id += 1
+        self._trades.setdefault(market.symbol, []).append({
+            "symbol": market.symbol, "id": trade_id, "orderId": order["orderId"], "side": side,
+            "price": market.price(price), "qty": _fmt(quantity),
+            "realizedPnl": _fmt(round(realized, 8)), "marginAsset": "USDT",
+            "quoteQty": _fmt(round(quantity * price, 8)), "commission": _fmt(round(commission, 8)),
+            "commissionAsset": "USDT", "time": now_ms, "positionSide": "BOTH",
+            "buyer": side == "BUY", "maker": maker,
+        })
+        self.fills += 1
+        self._emit_order(order, "TRADE", last_qty=quantity, last_price=price,
+                         realized=realized, commission=commission, trade_id=trade_id, maker=maker)
+        self._emit_account(market, now_ms)
+
+    def _check_resting(self, market: _Market, now_ms: int):
+        for order in [o for o in self._open.values() if o["symbol"] == market.symbol]:
+            if order["type"] != "LIMIT" or order["orderId"] in self._no_fill:
+                continue
+            price = float(order["price"])
+            crossed = market.ask <= price if order["side"] == "BUY" else market.bid >= price
+            if crossed:
+                self._fill(order)
+        for algo in [a for a in self._algos.values() if a["symbol"] == market.symbol]:
+            if _triggered(algo["orderType"], algo["side"], float(algo["triggerPrice"]), market.mid):
+                self._trigger_algo(algo, market)
+
+    async def _tick_loop(self):
+        s = self.settings
+        drift = s.drift_bps / 10_000.0
+        vol = s.volatility_bps / 10_000.0
+        active: set = set()
+        while True:
+            await asyncio.sleep(s.tick_ms / 1000.0)
+            now_ms = self._now_ms()
+            active.clear()
+            active.update(o["symbol"] for o in self._open.values())
+            active.update(a["symbol"] for a in self._algos.values())
+            for market in self._markets.values():
+                step = drift + vol * self._rng_prices.gauss(0.0, 1.0)
+                market.mid = round(max(market.tick, market.mid * math.exp(step)), market.price_digits)
+                market.record(now_ms)
+                if market.symbol in active:
+                    self._check_resting(market, now_ms)
+            if self._stream_subs:
+                self._publish_streams(now_ms)
+
+    # ──────────────────────────────────────────────────────────────────
+    # User Data Stream
+    # ──────────────────────────────────────────────────────────────────
+
+    def _new_listen_key(self, params: dict) -> dict:
+        key = hashlib.sha256(f"{self.settings.seed}:{len(self._listen_keys)}".encode()).hexdigest()
+        self._listen_keys.add(key)
+        return {"listenKey": key}
+
+    async def _ws_handler(self, request: web.Request) -> web.StreamResponse:
+        if request.match_info["listen_key"] not in self._listen_keys:
+            return web.json_response({"code": -1125, "msg": "This listenKey does not exist."}, status=400)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        queue: asyncio.Queue = asyncio.Queue()
+        self._ws_queues.append(queue)
+        self._ws_conns.add(ws)
+        writer = asyncio.create_task(self._ws_writer(ws, queue), name="fake_exchange_ws")
+        self._ws_tasks.add(writer)
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.ERROR:
+                    break
+        finally:
+            writer.cancel()
+            self._ws_tasks.discard(writer)
+            self._ws_conns.discard(ws)
+            self._ws_queues.remove(queue)
+        return ws
+
+    async def _ws_writer(self, ws: web.WebSocketResponse, queue: asyncio.Queue):
+        while True:
+            due, payload = await queue.get()
+            wait = due - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await ws.send_str(payload)
+
+    def _broadcast(self, event: dict):
+        if not self._ws_queues:
+            return
+        self.ws_events += 1
+        due = time.monotonic() + self.settings.ws_delay_ms / 1000.0
+        payload = json.dumps(event, separators=(",", ":"))
+        for queue in self._ws_queues:
+            queue.put_nowait((due, payload))
+
+    def _emit_order(self, order: dict, exec_type: str, last_qty: float = 0.0,
+                    last_price: float = 0.0, realized: float = 0.0, commission: float = 0.0,
+                    trade_id: int = 0, maker: bool = False):
+        market = self._markets[order["symbol"]]
+        now_ms = self._now_ms()
+        self._broadcast({
+            "e": "ORDER_TRADE_UPDATE", "E": now_ms, "T": now_ms,
+            "o": {
+                "s": order["symbol"], "c": order["clientOrderId"], "S": order["side"],
+                "o": order["type"], "f": order["timeInForce"], "q": order["origQty"],
+                "p": order["price"], "ap": order["avgPrice"], "sp": order["stopPrice"],
+                "x": exec_type, "X": order["status"], "i": order["orderId"],
+                "l": _fmt(last_qty), "z": order["executedQty"],
+                "L": market.price(last_price) if last_price else "0",
+                "N": "USDT", "n": _fmt(round(commission, 8)), "T": order["updateTime"],
+                "t": trade_id, "b": "0", "a": "0", "m": maker, "R": order["reduceOnly"],
+                "wt": order["workingType"], "ot": order["origType"], "ps": "BOTH",
+                "cp": order["closePosition"], "rp": _fmt(round(realized, 8)),
+                "pm": order["priceMatch"], "A": order.get("_algoId", 0),
+            },
+        })
+
+    def _emit_algo(self, algo: dict):
+        now_ms = self._now_ms()
+        self._broadcast({
+            "e": "ALGO_UPDATE", "E": now_ms, "T": now_ms,
+            "o": {
+                "caid": algo["clientAlgoId"], "aid": algo["algoId"], "at": algo["algoType"],
+                "o": algo["orderType"], "s": algo["symbol"], "S": algo["side"], "ps": "BOTH",
+                "f": algo["timeInForce"], "q": algo["quantity"], "X": algo["algoStatus"],
+                "tp": algo["triggerPrice"], "p": algo["price"], "wt": algo["workingType"],
+                "R": algo["reduceOnly"], "cp": algo["closePosition"],
+            },
+        })
+
+    def _emit_account(self, market: _Market, now_ms: int):
+        amt, entry = self._positions.get(market.symbol, (0.0, 0.0))
+        self._broadcast({
+            "e": "ACCOUNT_UPDATE", "E": now_ms, "T": now_ms,
+            "a": {
+                "m": "ORDER",
+                "B": [{"a": "USDT", "wb": _fmt(round(self._wallet, 8)),
+                       "cw": _fmt(round(self._wallet, 8)), "bc": "0"}],
+                "P": [{"s": market.symbol, "pa": _fmt(amt), "ep": market.price(entry),
+                       "bep": market.price(entry), "cr": "0",
+                       "up": _fmt(round((market.mid - entry) * amt, 8)),
+                       "mt": "cross", "iw": "0", "ps": "BOTH"}],
+            },
+        })
+
+    # ──────────────────────────────────────────────────────────────────
+    # Stream combinado de mercado
+    # ──────────────────────────────────────────────────────────────────
+
+    async def _stream_handler(self, request: web.Request) -> web.StreamResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        queue: asyncio.Queue = asyncio.Queue()
+        subs: set = set()
+        self._stream_subs[queue] = subs
+        self._ws_conns.add(ws)
+        writer = asyncio.create_task(self._ws_writer(ws, queue), name="fake_exchange_stream")
+        self._ws_tasks.add(writer)
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.ERROR:
+                    break
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    request_msg = json.loads(msg.data)
+                    method = request_msg["method"]
+                    params = list(request_msg.get("params") or [])
+                except (ValueError, KeyError, TypeError):
+                    await ws.send_str(json.dumps({"error": {"code": 3, "msg": "Invalid JSON"}}))
+                    continue
+                if method == "SUBSCRIBE":
+                    subs.update(params)
+                elif method == "UNSUBSCRIBE":
+                    subs.difference_update(params)
+                await ws.send_str(json.dumps({"result": None, "id": request_msg.get("id")}))
+        finally:
+            writer.cancel()
+            self._ws_tasks.discard(writer)
+            self._ws_conns.discard(ws)
+            self._stream_subs.pop(queue, None)
+        return ws
+
+    def _publish_streams(self, now_ms: int):
+        """Publica, para los streams suscritos, lo que ha cambiado en este tick."""
+        mark_due = now_ms >= self._next_mark_ms
+        if mark_due:
+            self._next_mark_ms = now_ms - now_ms % 1000 + 1000
+        kline_open = now_ms - now_ms % 300_000
+        kline_due = bool(self._kline_open_ms) and kline_open != self._kline_open_ms
+        self._kline_open_ms = kline_open
+        wanted = set().union(*self._stream_subs.values())
+        events: Dict[str, dict] = {}
+        for stream in wanted:
+            symbol, _, kind = stream.partition("@")
+            market = self._markets.get(symbol.upper())
+            if market is None:
+                continue
+            if kind == "markPrice@1s" and mark_due:
+                events[stream] = {
+                    "e": "markPriceUpdate", "E": now_ms, "s": market.symbol,
+                    "p": market.price(market.mid), "i": market.price(market.mid),
+                    "P": market.price(market.mid), "r": "0.00010000",
+                    "T": now_ms - now_ms % 28_800_000 + 28_800_000,
+                }
+            elif kind == "bookTicker":
+                book = (market.bid, market.ask)
+                if self._last_books.get(market.symbol) != book:
+                    events[stream] = {
+                        "e": "bookTicker", "u": now_ms, "E": now_ms, "T": now_ms,
+                        "s": market.symbol, "b": market.price(book[0]), "B": "1000",
+                        "a": market.price(book[1]), "A": "1000",
+                    }
+            elif kind == "kline_5m" and kline_due:
+                closed = self._klines({"symbol": market.symbol, "interval": "5m", "limit": 2})
+                if len(closed) >= 2:
+                    k = closed[-2]
+                    events[stream] = {
+                        "e": "kline", "E": now_ms, "s": market.symbol,
+                        "k": {"t": k[0], "T": k[6], "s": market.symbol, "i": "5m",
+                              "o": k[1], "h": k[2], "l": k[3], "c": k[4], "v": "0", "x": True},
+                    }
+        for market in self._markets.values():
+            self._last_books[market.symbol] = (market.bid, market.ask)
+        if not events:
+            return
+        due = time.monotonic() + self.settings.ws_delay_ms / 1000.0
+        payloads = {
+            stream: json.dumps({"stream": stream, "data": data}, separators=(",", ":"))
+            for stream, data in events.items()
+        }
+        for queue, subs in self._stream_subs.items():
+            for stream in subs:
+                payload = payloads.get(stream)
+                if payload is not None:
+                    self.stream_messages += 1
+                    queue.put_nowait((due, payload))
+
+    # ──────────────────────────────────────────────────────────────────
+    # Helpers
+    # ──────────────────────────────────────────────────────────────────
+
+    def _now_ms(self) -> int:
+        return int(time.time() * 1000 + self.settings.clock_offset_ms)
+
+    def _new_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    def stats(self) -> dict:
+        return {
+            "requests": sum(self.requests.values()),
+            "by_endpoint": dict(self.requests.most_common()),
+            "injected_errors": {str(code): n for code, n in self.injected.items()},
+            "fills": self.fills,
+            "ws_events": self.ws_events,
+            "stream_messages": self.stream_messages,
+            "open_orders": len(self._open),
+            "open_algo_orders": len(self._algos),
+            "positions": len(self._positions),
+        }
+
+
+def _error_applies(code: int, method: str, path: str, params: dict) -> bool:
+    if code in (429, 503):
+        return True
+    if code == -2011:
+        return method == "DELETE" and path in (_ORDER, _ALGO)
+    if code in (-2021, -4045):
+        return method == "POST" and path == _ALGO
+    if code == -4400:
+        return (method == "POST" and path == _ORDER
+                and not _true(params.get("reduceOnly")) and not _true(params.get("closePosition")))
+    return False
+
+
+def _order_fills(settings: FakeSettings, order_id: int) -> bool:
+    """Decisión de fill fija por orderId: no depende del orden de llegada."""
+    return random.Random(f"{settings.seed}:fill:{order_id}").random() * 100 < settings.fill_pct
+
+
+def _match_price(market: _Market, side: str, price_match: str) -> float:
+    levels = int(price_match.rsplit("_", 1)[1]) if price_match[-1].isdigit() else 1
+    if price_match.startswith("OPPONENT"):
+        offset = (levels - 1) * market.tick
+        return market.bid - offset if side == "SELL" else market.ask + offset
+    # QUEUE*: mismo lado del libro, no cruza
+    offset = (levels - 1) * market.tick
+    return market.ask + offset if side == "SELL" else market.bid - offset
+
+
+def _marketable(market: _Market, side: str, price: float) -> bool:
+    return price >= market.ask if side == "BUY" else price <= market.bid
+
+
+def _triggered(order_type: str, side: str, trigger: float, price: float) -> bool:
+    # STOP compra por encima / vende por debajo; TAKE_PROFIT al revés
+    if order_type.startswith("STOP"):
+        return price >= trigger if side == "BUY" else price <= trigger
+    return price <= trigger if side == "BUY" else price >= trigger
+
+
+def _bump(window: Tuple[int, int], key: int) -> Tuple[int, int]:
+    return (key, window[1] + 1) if window[0] == key else (key, 1)
+
+
+def _public(order: dict) -> dict:
+    return {k: v for k, v in order.items() if not k.startswith("_")}
+
+
+def _true(value: Any) -> bool:
+    return str(value).lower() == "true"
+
+
+def _fmt(value: float) -> str:
+    text = f"{value:.8f}".rstrip("0").rstrip(".")
+    return "0" if text in ("", "-0") else text
+
+
+def _parse_error(value: str) -> Tuple[int, float]:
+    code, _, pct = value.partition("=")
+    try:
+        return int(code), float(pct)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"--error espera CODIGO=PCT, p.ej. -2011=5 (recibido {value!r})")
+
+
+def add_settings_args(parser: argparse.ArgumentParser):
+    """Opciones de FakeSettings compartidas con tools/load_test.py."""
+    group = parser.add_argument_group("exchange simulado")
+    group.add_argument("--seed", type=int, default=1)
+    group.add_argument("--symbols", type=int, default=50, help="número de símbolos SIMnnnUSDT")
+    group.add_argument("--latency-ms", type=float, default=0.0, help="latencia fija por petición REST")
+    group.add_argument("--jitter-ms", type=float, default=0.0, help="latencia extra uniforme 0..N ms")
+    group.add_argument("--spike-pct", type=float, default=0.0, help="%% de peticiones con pico de latencia")
+    group.add_argument("--spike-ms", type=float, default=0.0, help="duración del pico")
+    group.add_argument("--ws-delay-ms", type=float, default=0.0, help="retraso de los eventos WS")
+    group.add_argument("--fill-pct", type=float, default=100.0,
+                       help="%% de órdenes LIMIT marcables que llenan")
+    group.add_argument("--fill-delay-ms", type=float, default=0.0, help="retraso hasta el fill")
+    group.add_argument("--tick-ms", type=float, default=100.0, help="periodo del paseo de precios")
+    group.add_argument("--volatility-bps", type=float, default=5.0, help="desviación por tick")
+    group.add_argument("--drift-bps", type=float, default=0.0, help="tendencia por tick")
+    group.add_argument("--error", type=_parse_error, action="append", default=[], metavar="CODIGO=PCT",
+                       help=f"probabilidad de error inyectado; códigos {INJECTABLE_CODES}")
+    group.add_argument("--clock-offset-ms", type=float, default=0.0, help="desfase del reloj del servidor")
+
+
+def settings_from_args(args: argparse.Namespace, api_secret: str = "") -> FakeSettings:
+    return FakeSettings(
+        seed=args.seed,
+        symbols=args.symbols,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        spike_pct=args.spike_pct,
+        spike_ms=args.spike_ms,
+        ws_delay_ms=args.ws_delay_ms,
+        fill_pct=args.fill_pct,
+        fill_delay_ms=args.fill_delay_ms,
+        tick_ms=args.tick_ms,
+        volatility_bps=args.volatility_bps,
+        drift_bps=args.drift_bps,
+        error_pct=dict(args.error),
+        api_secret=api_secret,
+        clock_offset_ms=args.clock_offset_ms,
+    )
+
+
+async def _serve(args: argparse.Namespace):
+    exchange = FakeExchange(settings_from_args(args, api_secret=args.api_secret))
+    await exchange.start(args.host, args.port)
+    print(f"Exchange simulado v{FAKE_EXCHANGE_VERSION} en {exchange.base_url} "
+          f"(WS {exchange.ws_base_url}), {len(exchange.symbols)} símbolos. Ctrl+C para salir.")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await exchange.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--api-secret", default="",
+                        help="si se indica, comprueba la firma HMAC de las peticiones")
+    add_settings_args(parser)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
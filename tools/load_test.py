@@ -0,0 +1,395 @@
+"""
+load_test.py - Carga sintética del motor real contra tools/fake_exchange.py.
+
+Arranca FakeExchange en el mismo proceso y monta StateDB + OrderManager +
+WSManager + TradeEngine (y el WS de mercado si binance.market_stream.enabled)
+igual que gestiona_trades.py, con una base de datos y
+logs temporales. Lanza N señales sintéticas a ritmo fijo (cada una en su
+propia tarea, de modo que un motor lento acumula retraso en vez de frenar la
+carga) y al terminar informa de:
+
+  - throughput: señales aceptadas y trades abiertos por segundo,
+  - latencia por etapa (p50/p95/p99/máx) medida desde el instante previsto de
+    cada señal: orden de entrada enviada, fill de entrada, TP y SL colocados,
+    y cierre por TP/SL si el paseo de precios llega a ellos,
+  - latencia REST por endpoint (http_metrics de OrderManager),
+  - retraso del event loop,
+  - contadores del exchange (peticiones, errores inyectados, fills).
+
+Con --max-p99-ms el proceso sale con código 1 si el p99 de señal → fill de
+entrada lo supera, para usarlo como control antes de desplegar.
+
+Uso (desde la raíz del repo):
+    python tools/load_test.py --signals 2000 --rate 200 --symbols 100
+    python tools/load_test.py --signals 500 --latency-ms 20 --jitter-ms 30 \\
+        --error=-2011=2 --error 429=0.1 --json resultado.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextvars
+import json
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_exchange import FakeExchange, add_settings_args, settings_from_args  # noqa: E402
+from src.config import Config  # noqa: E402
+from src.logger import setup_logging  # noqa: E402
+from src.market_stream import MarketStreamManager  # noqa: E402
+from src.models import Event, EventType, Signal, TradeStatus  # noqa: E402
+from src.order_manager import BinanceError, OrderManager  # noqa: E402
+from src.state import StateDB  # noqa: E402
+from src.trade_engine import TradeEngine  # noqa: E402
+from src.ws_manager import WSManager  # noqa: E402
+
+_ROOT = Path(__file__).resolve().parent.parent
+_API_SECRET = "fake-exchange-secret"
+# Instante previsto de la señal en curso (lo hereda _open_trade)
+_signal_t0: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("signal_t0", default=None)
+
+_STAGES = {
+    EventType.ENTRY_SENT.value: "entrada_enviada",
+    EventType.ENTRY_FILL.value: "entrada_llena",
+    EventType.TP_PLACED.value: "tp_colocado",
+    EventType.SL_PLACED.value: "sl_colocado",
+    EventType.TP_FILL.value: "cierre_tp",
+    EventType.SL_FILL.value: "cierre_sl",
+}
+
+
+class LoadRecorder:
+    """Recibe los eventos del motor y guarda la latencia de cada etapa."""
+
+    def __init__(self, db: StateDB):
+        self._db = db
+        self._t0: Dict[str, float] = {}
+        self._seen: Dict[str, set] = {}
+        self.samples: Dict[str, List[float]] = {stage: [] for stage in _STAGES.values()}
+        self.events: Counter = Counter()
+        self.errors: List[str] = []
+
+    async def on_event(self, event: Event):
+        now = time.perf_counter()
+        self.events[event.event_type] += 1
+        try:
+            await self._db.save_event(event)
+        except Exception as e:
+            self.errors.append(f"save_event: {e}")
+        if event.event_type == EventType.SIGNAL.value:
+            t0 = _signal_t0.get()
+            if t0 is not None and event.trade_id:
+                self._t0[event.trade_id] = t0
+                self._seen[event.trade_id] = set()
+            return
+        if event.event_type == EventType.ERROR.value:
+            self.errors.append(str(event.details)[:200])
+            return
+        stage = _STAGES.get(event.event_type)
+        t0 = self._t0.get(event.trade_id or "")
+        if stage is None or t0 is None or stage in self._seen[event.trade_id]:
+            return
+        # Solo la primera vez por trade (los reintentos de chase no cuentan)
+        self._seen[event.trade_id].add(stage)
+        self.samples[stage].append((now - t0) * 1000.0)
+
+
+class LoopLagProbe:
+    """Mide cuánto se retrasa un sleep corto: síntoma de trabajo bloqueante."""
+
+    def __init__(self, interval_s: float = 0.01):
+        self._interval_s = interval_s
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name="loop_lag_probe")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            t0 = time.perf_counter()
+            await asyncio.sleep(self._interval_s)
+            self.samples.append(max(0.0, (time.perf_counter() - t0 - self._interval_s) * 1000.0))
+
+
+def build_config(args: argparse.Namespace, exchange: FakeExchange, workdir: Path) -> Config:
+    """config base + overrides para que nada frene la carga salvo el propio motor."""
+    with open(args.config, encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    binance = data.setdefault("binance", {})
+    binance.update({
+        "api_key": "fake-key",
+        "api_secret": _API_SECRET,
+        "base_url": exchange.base_url,
+        "ws_base_url": exchange.ws_base_url,
+    })
+    strategy = data.setdefault("strategy", {})
+    strategy.update({
+        "paper_trading": False,
+        "solo_cerrando_trades": False,
+        "capital_per_trade": args.capital,
+        "max_open_trades": args.max_open or args.signals,
+        "max_trades_per_pair": args.signals,
+        "quarantine_hours": 0,
+        "tp_pct": args.tp_pct,
+        "sl_pct": args.sl_pct,
+    })
+    data.setdefault("entry", {}).update({
+        "chase_timeout_seconds": args.chase_timeout_s,
+        "chase_interval_seconds": 0.5,
+        "max_chase_attempts": 3,
+    })
+    # Sin perfil exportado: manda lo que hay en el YAML
+    data["strategy_profile"] = {"path": str(workdir / "sin_perfil.yaml")}
+    data.setdefault("signals", {})["file_path"] = str(workdir / "senales.csv")
+    data.setdefault("database", {}).update({
+        "path": str(workdir / "trades.db"),
+        "archive_after_days": 0,
+    })
+    data.setdefault("dashboard", {})["enabled"] = False
+    data.setdefault("notifications", {})["enabled"] = False
+    data["logging"] = {
+        "level": args.log_level,
+        "file": str(workdir / "load_test.log"),
+        "max_bytes": 50 * 1024 * 1024,
+        "backup_count": 1,
+        "console_level": "CRITICAL",
+    }
+    path = workdir / "config.yaml"
+    with open(path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(data, f, allow_unicode=True)
+    return Config(str(path))
+
+
+def _signal(pair: str, rank: int, close: float) -> Signal:
+    return Signal(
+        fecha_hora=datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+        pair=pair,
+        top=rank,
+        close=close,
+        mom_1h_pct=5.0,
+        mom_pct=5.0,
+        vol_ratio=2.0,
+        trades_ratio=2.0,
+        quintil=1,
+        bp=0.5,
+        categoria="sintetica",
+    )
+
+
+async def _dispatch(engine: TradeEngine, om: OrderManager, configured: set,
+                    sig: Signal, t0: float):
+    _signal_t0.set(t0)
+    # Igual que gestiona_trades._on_signal: margen y leverage la primera vez
+    if sig.pair not in configured:
+        configured.add(sig.pair)
+        try:
+            await om.set_margin_type(sig.pair, "ISOLATED")
+        except BinanceError:
+            pass
+        try:
+            await om.set_leverage(sig.pair, 1)
+        except BinanceError:
+            pass
+    await engine.on_signal(sig)
+
+
+def _settled(engine: TradeEngine) -> bool:
+    for trade in engine.get_active_trades():
+        if trade.status in (TradeStatus.SIGNAL_RECEIVED, TradeStatus.OPENING, TradeStatus.CLOSING):
+            return False
+        if trade.status == TradeStatus.OPEN and not (trade.tp_order_id and trade.sl_order_id):
+            return False
+    return True
+
+
+async def run(args: argparse.Namespace) -> dict:
+    exchange = FakeExchange(settings_from_args(args, api_secret=_API_SECRET))
+    await exchange.start()
+    workdir = Path(tempfile.mkdtemp(prefix="gt_load_"))
+    cfg = build_config(args, exchange, workdir)
+    setup_logging(cfg)
+
+    db = StateDB(cfg)
+    await db.init()
+    om = OrderManager(cfg)
+    await om.init()
+    recorder = LoadRecorder(db)
+    engine: Optional[TradeEngine] = None
+
+    async def _entry(data: dict):
+        await engine.on_entry_fill(data)
+
+    async def _tp(data: dict):
+        await engine.on_tp_fill(data)
+
+    async def _sl(data: dict):
+        await engine.on_sl_fill(data)
+
+    ws_mgr = WSManager(cfg=cfg, order_mgr=om, on_entry_fill=_entry, on_tp_fill=_tp, on_sl_fill=_sl)
+    engine = TradeEngine(cfg=cfg, order_mgr=om, ws_mgr=ws_mgr, db=db, on_event=recorder.on_event)
+    await engine.reconcile([])
+    await ws_mgr.start()
+    for _ in range(100):
+        if ws_mgr.connected:
+            break
+        await asyncio.sleep(0.05)
+    await engine.start()
+    market_ws: Optional[MarketStreamManager] = None
+    if cfg.market_stream_enabled:
+        market_ws = MarketStreamManager(
+            cfg=cfg, prices=om.prices,
+            symbols_provider=lambda: {t.pair for t in engine.get_active_trades()},
+        )
+        await market_ws.start()
+
+    probe = LoopLagProbe()
+    probe.start()
+    symbols = exchange.symbols
+    configured: set = set()
+    tasks = []
+    interval = 1.0 / args.rate if args.rate > 0 else 0.0
+    started = time.perf_counter()
+    for i in range(args.signals):
+        due = started + i * interval
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        pair = symbols[i % len(symbols)]
+        sig = _signal(pair, rank=i % 10 + 1, close=exchange.price(pair))
+        if market_ws:
+            market_ws.watch(pair)
+        tasks.append(asyncio.create_task(_dispatch(engine, om, configured, sig, due)))
+    await asyncio.gather(*tasks, return_exceptions=True)
+    dispatched = time.perf_counter()
+    deadline = dispatched + args.settle_s
+    while time.perf_counter() < deadline and not _settled(engine):
+        await asyncio.sleep(0.05)
+    finished = time.perf_counter()
+    await probe.stop()
+
+    statuses = Counter(t.status.value for t in engine.get_active_trades())
+    report = {
+        "signals": args.signals,
+        "accepted": recorder.events[EventType.SIGNAL.value],
+        "opened": len(recorder.samples["entrada_llena"]),
+        "statuses_at_end": dict(statuses),
+        "settled": _settled(engine),
+        "dispatch_s": round(dispatched - started, 2),
+        "total_s": round(finished - started, 2),
+        "accepted_per_s": round(recorder.events[EventType.SIGNAL.value] / max(dispatched - started, 1e-9), 1),
+        "opened_per_s": round(len(recorder.samples["entrada_llena"]) / max(finished - started, 1e-9), 1),
+        "stages_ms": {stage: summarize(values) for stage, values in recorder.samples.items()},
+        "loop_lag_ms": summarize(probe.samples),
+        "engine_errors": len(recorder.errors),
+        "engine_error_examples": recorder.errors[:5],
+        "http": om.http_metrics(),
+        "rate_limit": om.governor.snapshot(),
+        "circuit_breakers": om.circuits.snapshot(),
+        "market_stream": market_ws.snapshot() if market_ws else None,
+        "exchange": exchange.stats(),
+        "workdir": str(workdir),
+    }
+
+    try:
+        await asyncio.wait_for(engine.stop(), timeout=5.0)
+    except asyncio.TimeoutError:
+        pass
+    await ws_mgr.stop()
+    if market_ws:
+        await market_ws.stop()
+    await om.close()
+    await db.close()
+    await exchange.stop()
+    return report
+
+
+def summarize(values: List[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def pct(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 1)
+
+    return {"count": len(ordered), "p50": pct(0.50), "p95": pct(0.95),
+            "p99": pct(0.99), "max": round(ordered[-1], 1)}
+
+
+def print_report(report: dict):
+    print(f"\nSeñales: {report['signals']}  aceptadas: {report['accepted']}  "
+          f"abiertas: {report['opened']}  errores motor: {report['engine_errors']}")
+    print(f"Envío {report['dispatch_s']}s, total {report['total_s']}s → "
+          f"{report['accepted_per_s']} señales/s aceptadas, {report['opened_per_s']} trades/s abiertos"
+          f"{'' if report['settled'] else '  (SIN ASENTAR al terminar settle_s)'}")
+    print(f"Estado final: {report['statuses_at_end']}")
+    print(f"\n{'etapa (desde la señal)':<24} {'n':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'máx':>9}")
+    for stage, stats in list(report["stages_ms"].items()) + [("lag event loop", report["loop_lag_ms"])]:
+        if not stats.get("count"):
+            continue
+        print(f"{stage:<24} {stats['count']:>6} {stats['p50']:>9.1f} {stats['p95']:>9.1f} "
+              f"{stats['p99']:>9.1f} {stats['max']:>9.1f}")
+    print(f"\n{'endpoint REST':<40} {'n':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'err':>5} {'retry':>5}")
+    for key, stats in sorted(report["http"].items(), key=lambda kv: -kv[1]["count"]):
+        print(f"{key:<40} {stats['count']:>6} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} "
+              f"{stats['p99_ms']:>8.1f} {stats['errors']:>5} {stats['retries']:>5}")
+    ex = report["exchange"]
+    print(f"\nExchange: {ex['requests']} peticiones, {ex['fills']} fills, {ex['ws_events']} eventos WS, "
+          f"errores inyectados {ex['injected_errors'] or '-'}")
+    ms = report.get("market_stream")
+    if ms:
+        print(f"WS mercado: {ms['subscribed']} pares, {ms['messages']} mensajes, "
+              f"precios servidos {ms['hits']} / a REST {ms['misses']}")
+    print(f"Logs y base de datos en {report['workdir']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--signals", type=int, default=1000, help="señales sintéticas a lanzar")
+    parser.add_argument("--rate", type=float, default=100.0, help="señales por segundo (0 = todas de golpe)")
+    parser.add_argument("--max-open", type=int, default=0, help="max_open_trades (0 = tantas como señales)")
+    parser.add_argument("--capital", type=float, default=10.0, help="capital_per_trade en USDT")
+    parser.add_argument("--tp-pct", type=float, default=1.0)
+    parser.add_argument("--sl-pct", type=float, default=2.0)
+    parser.add_argument("--chase-timeout-s", type=float, default=2.0)
+    parser.add_argument("--settle-s", type=float, default=30.0,
+                        help="espera máxima tras la última señal a que todo quede abierto con TP/SL")
+    parser.add_argument("--config", default=str(_ROOT / "config.example.yaml"),
+                        help="YAML base; binance, límites y rutas se sobrescriben")
+    parser.add_argument("--log-level", default="INFO", help="nivel del log del motor (fichero temporal)")
+    parser.add_argument("--json", help="guarda el informe completo en este fichero")
+    parser.add_argument("--max-p99-ms", type=float, default=0.0,
+                        help="sale con código 1 si el p99 señal → fill de entrada lo supera")
+    add_settings_args(parser)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    p99 = report["stages_ms"]["entrada_llena"].get("p99")
+    if args.max_p99_ms > 0 and (p99 is None or p99 > args.max_p99_ms):
+        print(f"\nREGRESIÓN: p99 señal → fill de entrada = {p99} ms > {args.max_p99_ms} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()